@@ -6,13 +6,21 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 
+from app import sqlite_profile
+
 
 app = Flask(__name__)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
+sqlite_profile.configure(app)
+db = SQLAlchemy(app, session_options={'class_': sqlite_profile.RoutingSession})
 migrate = Migrate(app, db)
 login = LoginManager(app)
 login.login_view = 'login'
 
 
-from app import routes, models
\ No newline at end of file
+from app import routes, models, commands, sql_stats, user_cache, api, metrics
+
+app.register_blueprint(api.bp)
+sql_stats.init_app(app)
+metrics.init_app(app)
+sqlite_profile.init_app(app, db)
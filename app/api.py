@@ -0,0 +1,213 @@
+import json
+from datetime import date, time
+
+from flask import Blueprint, abort, request
+from flask_login import current_user, login_required
+from sqlalchemy import case, desc, func, select, union_all
+from werkzeug.exceptions import HTTPException
+
+from app import app, db, login, timetable
+from app.forms import DAY_CHOICES
+from app.models import (ArchivedCourse, ArchivedEnrollment, Course, Enrollment, StudentStats, StudentTermStats, Term,
+                        User, archived_prerequisites, prerequisites)
+from app.pagination import keyset_paginate
+from app.sql_stats import query_budget
+from app.sqlite_profile import read_only
+
+try:
+    import orjson
+except ImportError:  # The standard library encoder gives the same output, only slower.
+    orjson = None
+
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Answer 401 instead of redirecting API clients to the login page.
+login.blueprint_login_views[bp.name] = None
+
+MAX_PER_PAGE = 100
+
+# Output name -> column, for every field a course listing can return.
+# Only the requested ones are selected; rows never become ORM objects.
+COURSE_FIELDS = {
+    'id': Course.id,
+    'title': Course.title,
+    'credits': Course.credits,
+    'day_of_week': Course.day_of_week,
+    'start_time': Course.start_time,
+    'end_time': Course.end_time,
+    'capacity': Course.capacity,
+    'seats_taken': Course.seats_taken,
+    'seats_left': func.coalesce(Course.capacity, 0) - Course.seats_taken,
+    'instructor_id': Course.instructor_id,
+    'instructor': User.username,
+}
+DETAIL_FIELDS = dict(COURSE_FIELDS, description=Course.description, term_id=Course.term_id, term=Term.name)
+TRANSCRIPT_FIELDS = {
+    'course_id': Course.id,
+    'title': Course.title,
+    'term_id': Term.id,
+    'term': Term.name,
+    'credits': Course.credits,
+    'grade': Enrollment.grade,
+    'status': Enrollment.status,
+}
+# The same fields for grades in archived terms (app/retention.py).
+ARCHIVED_TRANSCRIPT_FIELDS = dict(TRANSCRIPT_FIELDS, course_id=ArchivedCourse.id, title=ArchivedCourse.title,
+                                  credits=ArchivedCourse.credits, grade=ArchivedEnrollment.grade,
+                                  status=ArchivedEnrollment.status)
+
+DEFAULT_COURSE_FIELDS = ['id', 'title', 'credits', 'day_of_week', 'start_time', 'end_time', 'seats_left', 'instructor']
+DEFAULT_SCHEDULE_FIELDS = ['id', 'title', 'day_of_week', 'start_time', 'end_time', 'instructor']
+
+_DAY_ORDER = case({day: index for index, (day, _) in enumerate(DAY_CHOICES)}, value=Course.day_of_week)
+
+
+def _isoformat(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_isoformat).encode('utf-8')
+
+
+def _json(payload, status=200):
+    return app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+@bp.errorhandler(HTTPException)
+def _error(e):
+    return _json({'error': e.description}, e.code)
+
+
+def _fields(available, default):
+    """Names from the comma-separated ``fields`` argument, or ``default``; 400 on unknown names."""
+    names = [name.strip() for name in request.args.get('fields', '').split(',') if name.strip()] or default
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        abort(400, f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(available)}.')
+    return list(dict.fromkeys(names))
+
+
+def _select(names, fields, *extra):
+    """Column-only query for ``names``, joining the instructor or term only when one is asked for."""
+    query = db.session.query(*(fields[name].label(name) for name in names), *extra).select_from(Course)
+    if 'instructor' in names:
+        query = query.outerjoin(User, User.id == Course.instructor_id)
+    if 'term' in names:
+        query = query.join(Term, Term.id == Course.term_id)
+    return query
+
+
+def _items(rows, names):
+    return [dict(zip(names, row)) for row in rows]
+
+
+@bp.route('/courses')
+@read_only
+@query_budget(3)
+def courses():
+    """Courses of the active term by title, ``per_page`` at a time; ``cursor`` comes from the previous page."""
+    names = _fields(COURSE_FIELDS, DEFAULT_COURSE_FIELDS)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PER_PAGE)
+    term = db.session.query(Term.id, Term.name).filter_by(is_active=True).first()
+    if term is None:
+        return _json({'term': None, 'items': [], 'next_cursor': None, 'prev_cursor': None})
+    # The sort key rides along under its own labels, whatever fields were picked.
+    query = _select(names, COURSE_FIELDS, Course.title.label('sort_title'), Course.id.label('sort_id')).filter(
+        Course.term_id == term.id)
+    page = keyset_paginate(query, [(Course.title, False), (Course.id, False)],
+                           key=lambda row: (row.sort_title, row.sort_id),
+                           cursor=request.args.get('cursor'), per_page=per_page)
+    return _json({'term': {'id': term.id, 'name': term.name}, 'items': _items(page.items, names),
+                  'next_cursor': page.next_cursor, 'prev_cursor': page.prev_cursor})
+
+
+@bp.route('/courses/<int:course_id>')
+@read_only
+@query_budget(3)
+def course_detail(course_id):
+    """One course; ``prereqs`` lists the ``id`` and ``title`` of each prerequisite, archived ones included."""
+    names = _fields(list(DETAIL_FIELDS) + ['prereqs'], list(DETAIL_FIELDS) + ['prereqs'])
+    columns = [name for name in names if name != 'prereqs']
+    row = _select(columns, DETAIL_FIELDS, Course.id.label('course_id')).filter(Course.id == course_id).first()
+    if row is None:
+        abort(404, 'No such course.')
+    course = dict(zip(columns, row))
+    if 'prereqs' in names:
+        live = select(Course.id, Course.title).join(
+            prerequisites, prerequisites.c.prerequisite_id == Course.id).where(prerequisites.c.course_id == course_id)
+        archived = select(ArchivedCourse.id, ArchivedCourse.title).join(
+            archived_prerequisites, archived_prerequisites.c.prerequisite_id == ArchivedCourse.id).where(
+            archived_prerequisites.c.course_id == course_id)
+        course['prereqs'] = _items(db.session.execute(union_all(live, archived).order_by('title')), ['id', 'title'])
+    return _json({name: course[name] for name in names})
+
+
+@bp.route('/me/schedule')
+@read_only
+@login_required
+@query_budget(4)
+def schedule():
+    """The signed-in student's courses in ``term_id``, by default the active term, in weekly order."""
+    if current_user.role != 'student':
+        abort(403, 'Only students have a schedule.')
+    names = _fields(COURSE_FIELDS, DEFAULT_SCHEDULE_FIELDS)
+    term_id = request.args.get('term_id', type=int)
+    if term_id is None:
+        term_id = db.session.query(Term.id).filter_by(is_active=True).scalar()
+    rows = _select(names, COURSE_FIELDS).join(Enrollment, Enrollment.course_id == Course.id).filter(
+        Enrollment.user_id == current_user.id, Course.term_id == term_id).order_by(_DAY_ORDER, Course.start_time)
+    return _json({'term_id': term_id, 'items': _items(rows, names)})
+
+
+@bp.route('/me/transcript')
+@read_only
+@login_required
+@query_budget(5)
+def transcript():
+    """The signed-in student's grades, archived terms included, with overall and per-term credits and GPA."""
+    if current_user.role != 'student':
+        abort(403, 'Only students have a transcript.')
+    names = _fields(TRANSCRIPT_FIELDS, list(TRANSCRIPT_FIELDS))
+    live = select(*(TRANSCRIPT_FIELDS[name].label(name) for name in names), Term.name.label('sort_term'),
+                  Course.title.label('sort_title')).select_from(Enrollment).join(
+        Course, Course.id == Enrollment.course_id).join(Term, Term.id == Course.term_id).where(
+        Enrollment.user_id == current_user.id)
+    archived = select(*(ARCHIVED_TRANSCRIPT_FIELDS[name].label(name) for name in names), Term.name,
+                      ArchivedCourse.title).select_from(ArchivedEnrollment).join(
+        ArchivedCourse, ArchivedCourse.id == ArchivedEnrollment.course_id).join(
+        Term, Term.id == ArchivedCourse.term_id).where(ArchivedEnrollment.user_id == current_user.id)
+    # The sort key rides along under its own labels; _items only keeps ``names``.
+    rows = db.session.execute(union_all(live, archived).order_by(desc('sort_term'), 'sort_title'))
+    totals = db.session.query(StudentStats.total_credits, StudentStats.gpa).filter_by(user_id=current_user.id).first()
+    terms = db.session.query(Term.id, Term.name, StudentTermStats.total_credits, StudentTermStats.gpa).join(
+        StudentTermStats).filter(StudentTermStats.user_id == current_user.id,
+                                 StudentTermStats.total_credits > 0).order_by(Term.name.desc())
+    total_credits, gpa = tuple(totals) if totals else (0, 0.0)
+    return _json({'total_credits': total_credits, 'gpa': gpa,
+                  'terms': _items(terms, ['term_id', 'term', 'total_credits', 'gpa']),
+                  'items': _items(rows, names)})
+
+
+@bp.route('/me/timetable')
+@read_only
+@login_required
+@query_budget(10)
+def plan_timetable():
+    """The ``top`` best clash-free schedules from the ``course_ids`` wishlist, comma-separated or repeated."""
+    if current_user.role != 'student':
+        abort(403, 'Only students can plan a timetable.')
+    try:
+        course_ids = [int(value) for values in request.args.getlist('course_ids') for value in values.split(',')
+                      if value.strip()]
+    except ValueError:
+        abort(400, 'course_ids must be integers.')
+    if not course_ids or len(course_ids) > timetable.MAX_WISHLIST:
+        abort(400, f'Pass between 1 and {timetable.MAX_WISHLIST} course_ids.')
+    top = min(max(request.args.get('top', 5, type=int), 1), timetable.MAX_SCHEDULES)
+    return _json(timetable.build(current_user.id, course_ids, top=top).to_dict())
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+
+from app import app
+from app.models import CacheVersion
+
+
+CATALOG_KEY = 'catalog'
+
+
+class LRUCache:
+    """Thread-safe mapping that keeps at most ``maxsize`` entries, evicting the least recently used.
+
+    With ``ttl`` (seconds) entries also expire that long after being set;
+    an expired entry counts as a miss.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            value, expires = self._entries[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+fragments = LRUCache(app.config['FRAGMENT_CACHE_SIZE'])
+
+
+def catalog_stamp():
+    """``(version, updated_at)`` of everything course pages show besides the course rows themselves."""
+    return CacheVersion.stamp(CATALOG_KEY)
+
+
+def latest(*stamps):
+    """The most recent of the given ``updated_at`` values, ignoring missing ones."""
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+def catalog_changed():
+    """Invalidate cached course fragments; call before committing.
+
+    Needed for writes that change what course pages show without updating
+    the course row: prerequisites, terms, instructor names. Seat counts need
+    nothing, since the counter update touches ``Course.updated_at``.
+    """
+    CacheVersion.bump(CATALOG_KEY)
+
+
+def cached_fragment(key, render):
+    """Return the HTML cached under ``key``, calling ``render()`` to produce it on a miss.
+
+    Keys must change whenever the output would: include the course's
+    ``updated_at`` and the catalog version. Only shared markup belongs
+    here; per-user parts are rendered around it on every request.
+    """
+    html = fragments.get(key)
+    if html is None:
+        html = Markup(render())
+        fragments.set(key, html)
+    return html
+
+
+def page_etag(*parts):
+    """Hash ``parts`` together with who is asking; the navigation bar differs per user."""
+    if current_user.is_authenticated:
+        parts += (current_user.id, current_user.username, current_user.role)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """True if the client's cached copy, as described by its conditional headers, is still current.
+
+    Pages with pending flash messages are never reported unmodified:
+    showing the message is the point of the next render.
+    """
+    if '_flashes' in session:
+        return False
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def conditional_page(etag, last_modified, render):
+    """Answer with 304 if the client's copy is current, otherwise with ``render()``.
+
+    ``etag`` must cover everything the page shows, per-user parts included.
+    ``Last-Modified`` is only sent to anonymous visitors: for a signed-in
+    user the page also depends on their own enrollments, which no
+    timestamp tracks, so only the ETag can validate it.
+    """
+    if current_user.is_authenticated:
+        last_modified = None
+    if not_modified(etag, last_modified):
+        response = app.response_class(status=304)
+    else:
+        response = make_response(render())
+    return set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach ``ETag``/``Last-Modified`` and make browsers revalidate before reusing the page."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
@@ -0,0 +1,179 @@
+import time
+
+import click
+
+from app import app, db
+from app import exports
+from app import gpa as gpa_stats
+from app import reports, retention, rollover
+from app.models import Term, User
+from app.query_plans import collect_plans
+from app.registration import recount_seats
+from app.search import rebuild_index
+from app.seed import seed
+from app.user_import import import_users, rows_from_csv, rows_from_json
+
+
+@app.cli.command('recount-seats')
+def recount_seats_command():
+    """Rebuild every course's seat counter from its enrollments."""
+    updated = recount_seats()
+    click.echo(f'Recounted seats for {updated} courses.')
+
+
+@app.cli.command('rebuild-gpa')
+def rebuild_gpa_command():
+    """Recompute every student's credit and GPA aggregates from their grades."""
+    gpa_stats.rebuild()
+    db.session.commit()
+    click.echo('Rebuilt student GPA aggregates.')
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-read every course into the full-text search index."""
+    rebuild_index()
+    db.session.commit()
+    click.echo('Rebuilt the course search index.')
+
+
+@app.cli.command('refresh-reports')
+@click.option('--full', is_flag=True, help='Recompute every course, not only those changed since the last refresh.')
+def refresh_reports_command(full):
+    """Bring the precomputed report rollups up to date."""
+    refreshed = reports.refresh(full=full)
+    db.session.commit()
+    click.echo(f'Refreshed report rollups for {refreshed} courses.')
+
+
+@app.cli.command('explain-queries')
+@click.option('--strict', is_flag=True, help='Exit with an error if any query fully scans a large table.')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query, not only the offending ones.')
+def explain_queries_command(strict, verbose):
+    """Run EXPLAIN QUERY PLAN on every SELECT the GET routes issue and report full table scans."""
+    plans = collect_plans()
+    offenders = [plan for plan in plans.values() if plan.full_scans]
+    for plan in plans.values():
+        if verbose or plan.full_scans:
+            label = 'SCAN ' + ', '.join(plan.full_scans) if plan.full_scans else 'ok'
+            click.echo(f'[{label}] {", ".join(sorted(plan.endpoints))}')
+            click.echo('    ' + ' '.join(plan.statement.split()))
+            for detail in plan.plan:
+                click.echo(f'      {detail}')
+    click.echo(f'{len(plans)} distinct queries explained, {len(offenders)} with full scans of large tables.')
+    if strict and offenders:
+        raise SystemExit(1)
+
+
+@app.cli.command('seed')
+@click.option('--terms', default=8, show_default=True)
+@click.option('--students', default=100000, show_default=True)
+@click.option('--instructors', default=500, show_default=True)
+@click.option('--courses', default=10000, show_default=True, help='Spread evenly over the terms.')
+@click.option('--courses-per-term', default=4, show_default=True, help='Courses each student takes per term.')
+@click.option('--terms-per-student', default=4, show_default=True)
+@click.option('--chain-length', default=3, show_default=True, help='Levels per subject, each requiring the previous one.')
+@click.option('--password', default='password', show_default=True, help='Password of every generated user.')
+@click.option('--random-seed', default=0, show_default=True)
+def seed_command(**options):
+    """Fill an empty database with synthetic terms, users, courses and graded enrollments."""
+    if db.session.query(User.id).first() is not None:
+        raise click.ClickException('The database already has users; seed an empty one.')
+    start = time.perf_counter()
+    counts = seed(**options)
+    elapsed = time.perf_counter() - start
+    click.echo(', '.join(f'{count} {name}' for name, count in counts.items()) + f' in {elapsed:.1f}s.')
+
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Rows inserted per transaction.')
+@click.option('--workers', type=int, help='Password hashing processes; defaults to PASSWORD_HASH_WORKERS.')
+def import_users_command(path, batch_size, workers):
+    """Create accounts from a CSV or JSON file with username, email, password and role."""
+    with open(path, 'rb') as stream:
+        try:
+            rows = rows_from_json(stream) if path.lower().endswith('.json') else rows_from_csv(stream)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    result = import_users(rows, batch_size=batch_size, workers=workers)
+    for label, message in result.rejects:
+        click.echo(f'{label}: {message}', err=True)
+    click.echo(f'Created {result.created} users, rejected {len(result.rejects)} rows in {result.elapsed:.1f}s '
+               f'({result.rows_per_second:.0f} rows/s).')
+
+
+@app.cli.command('rollover-term')
+@click.argument('source')
+@click.argument('name')
+@click.option('--mapping', 'mapping_path', type=click.Path(exists=True, dir_okay=False),
+              help='CSV or JSON file moving instructors and time slots in the copies.')
+@click.option('--activate', is_flag=True, help='Make the new term the active one.')
+def rollover_term_command(source, name, mapping_path, activate):
+    """Copy every course and prerequisite of the SOURCE term into a new term called NAME."""
+    term = Term.query.filter_by(name=source).first()
+    if term is None:
+        raise click.ClickException(f'No term named {source!r}.')
+    mapping = None
+    try:
+        if mapping_path:
+            with open(mapping_path, 'rb') as stream:
+                mapping = (rollover.mapping_from_json if mapping_path.lower().endswith('.json')
+                           else rollover.mapping_from_csv)(stream)
+        result = rollover.rollover(term.id, name, mapping, activate=activate)
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'Copied {result.courses} courses and {result.prerequisites} prerequisites into {name!r} '
+               f'in {result.elapsed:.2f}s.')
+
+
+@app.cli.command('archive-terms')
+@click.option('--before', required=True, help='Archive every inactive term whose name sorts before this one.')
+def archive_terms_command(before):
+    """Move the courses, enrollments and grades of past terms into the archive tables."""
+    terms = Term.query.filter(Term.name < before, Term.archived_at.is_(None), Term.is_active.is_(False)).all()
+    if not terms:
+        raise click.ClickException(f'No unarchived terms before {before!r}.')
+    try:
+        result = retention.archive_terms([term.id for term in terms])
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'Archived {result.courses} courses and {result.enrollments} enrollments of '
+               f'{", ".join(term.name for term in terms)}; kept {result.prerequisites} prerequisites of later courses '
+               f'in {result.elapsed:.2f}s.')
+
+
+@app.cli.command('delete-term')
+@click.argument('name')
+@click.confirmation_option(prompt='Delete the term with all its courses, enrollments and grades?')
+def delete_term_command(name):
+    """Delete the term called NAME and everything in it."""
+    term = Term.query.filter_by(name=name).first()
+    if term is None:
+        raise click.ClickException(f'No term named {name!r}.')
+    try:
+        result = retention.delete_term(term.id)
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'Deleted {name!r} with {result.courses} courses and {result.enrollments} enrollments '
+               f'in {result.elapsed:.2f}s.')
+
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['roster', 'transcript', 'term']))
+@click.argument('id', type=int)
+@click.option('--format', 'fmt', type=click.Choice(exports.FORMATS), default='csv', show_default=True)
+@click.option('--output', type=click.Path(dir_okay=False, writable=True, allow_dash=True), default='-',
+              help='File to write; defaults to standard output.')
+def export_command(kind, id, fmt, output):
+    """Write a course roster, a student's transcript or a term's enrollments, by course, user or term id."""
+    export = {'roster': exports.roster, 'transcript': exports.transcript, 'term': exports.term_enrollments}[kind](id)
+    with click.open_file(output, 'wb') as stream:
+        for chunk in exports.chunks(export, fmt):
+            stream.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
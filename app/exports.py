@@ -0,0 +1,142 @@
+import csv
+import io
+import tempfile
+
+from flask import abort, stream_with_context
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import aliased
+
+from app import app, db
+from app.models import ArchivedCourse, ArchivedEnrollment, Course, Enrollment, Term, User
+
+try:
+    import openpyxl
+except ImportError:  # XLSX export is optional; CSV always works.
+    openpyxl = None
+
+
+FORMATS = ('csv', 'xlsx') if openpyxl is not None else ('csv',)
+
+MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Rows fetched from the cursor at a time; together with the chunk size,
+# all an export ever holds in memory, however many rows it has.
+BATCH_SIZE = 1000
+
+# Bytes of output gathered before handing a chunk to the response.
+_CHUNK_SIZE = 64 * 1024
+
+
+class Export:
+    """A table to download: a file name, its header row and the statement that yields the rows."""
+
+    def __init__(self, name, header, statement):
+        self.name = name
+        self.header = header
+        self.statement = statement
+
+    def filename(self, fmt):
+        return f'{self.name}.{fmt}'
+
+    def rows(self):
+        """Stream the rows off the cursor ``BATCH_SIZE`` at a time, as plain tuples."""
+        result = db.session.execute(self.statement.execution_options(yield_per=BATCH_SIZE))
+        for partition in result.partitions():
+            yield from partition
+
+
+def roster(course_id):
+    """Students of one course; ``username`` and ``grade`` are what the grade upload reads back."""
+    return Export(f'roster-{course_id}', ['username', 'email', 'status', 'grade'],
+                  select(User.username, User.email, Enrollment.status, Enrollment.grade)
+                  .join(Enrollment, Enrollment.user_id == User.id)
+                  .where(Enrollment.course_id == course_id)
+                  .order_by(User.username))
+
+
+def transcript(user_id):
+    """Every grade of one student, archived terms included."""
+    live = (select(Term.name.label('term'), Course.title.label('course'), Course.credits, Enrollment.grade,
+                   Enrollment.status)
+            .join(Course, Course.id == Enrollment.course_id)
+            .join(Term, Term.id == Course.term_id)
+            .where(Enrollment.user_id == user_id))
+    archived = (select(Term.name, ArchivedCourse.title, ArchivedCourse.credits, ArchivedEnrollment.grade,
+                       ArchivedEnrollment.status)
+                .join(ArchivedCourse, ArchivedCourse.id == ArchivedEnrollment.course_id)
+                .join(Term, Term.id == ArchivedCourse.term_id)
+                .where(ArchivedEnrollment.user_id == user_id))
+    return Export(f'transcript-{user_id}', ['term', 'course', 'credits', 'grade', 'status'],
+                  union_all(live, archived).order_by('term', 'course'))
+
+
+def term_enrollments(term_id):
+    """Every enrollment of a term, course by course.
+
+    Ordered the way ``ix_course_term_title`` and ``ix_enrollment_course_user``
+    already are, so SQLite walks the indexes instead of sorting a million
+    rows before the first one comes out.
+    """
+    instructor = aliased(User)
+    return Export(f'enrollments-term-{term_id}',
+                  ['course_id', 'course', 'instructor', 'username', 'email', 'status', 'grade'],
+                  select(Course.id, Course.title, instructor.username, User.username, User.email,
+                         Enrollment.status, Enrollment.grade)
+                  .join(Enrollment, Enrollment.course_id == Course.id)
+                  .join(User, User.id == Enrollment.user_id)
+                  .outerjoin(instructor, instructor.id == Course.instructor_id)
+                  .where(Course.term_id == term_id)
+                  .order_by(Course.title, Course.id, Enrollment.user_id))
+
+
+def csv_chunks(export):
+    """The export as CSV text, in chunks of about 64 KiB."""
+    buffer = io.StringIO()
+    # The byte order mark makes Excel read the file as UTF-8 rather than the local code page.
+    buffer.write('\ufeff')
+    writer = csv.writer(buffer)
+    writer.writerow(export.header)
+    for row in export.rows():
+        writer.writerow(row)
+        if buffer.tell() >= _CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_chunks(export):
+    """The export as an XLSX workbook, in chunks of 64 KiB.
+
+    A workbook is a zip archive that can only be read once it is complete,
+    so the rows go to a write-only sheet, which keeps them on disk, then
+    the finished file is streamed from a temporary file.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(export.name[:31])
+    sheet.append(export.header)
+    for row in export.rows():
+        sheet.append(list(row))
+    with tempfile.TemporaryFile() as stream:
+        workbook.save(stream)
+        stream.seek(0)
+        while chunk := stream.read(_CHUNK_SIZE):
+            yield chunk
+
+
+def chunks(export, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported export format: {fmt}')
+    return csv_chunks(export) if fmt == 'csv' else xlsx_chunks(export)
+
+
+def response(export, fmt):
+    """Download response that streams the export while the request context, and its session, stay open."""
+    if fmt not in FORMATS:
+        abort(404)
+    response = app.response_class(stream_with_context(chunks(export, fmt)), mimetype=MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename(fmt)}"'
+    return response
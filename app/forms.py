@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import (StringField, PasswordField, BooleanField,
                      SubmitField, SelectField, TextAreaField,
-                     IntegerField, TimeField)
+                     IntegerField, TimeField, SelectMultipleField)
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Optional, InputRequired, NumberRange
 from wtforms_sqlalchemy.fields import QuerySelectField, QuerySelectMultipleField
 from app.models import User, Term, Course
@@ -43,11 +44,16 @@ def instructor_query():
     return User.query.filter_by(role='instructor').order_by(User.username)
 
 def term_query():
-    return Term.query.order_by(Term.name.desc())
+    return Term.query.filter(Term.archived_at.is_(None)).order_by(Term.name.desc())
 
 def course_query():
     return Course.query.order_by(Course.title)
 
+DAY_CHOICES = [
+    ('Saturday', 'شنبه'), ('Sunday', 'یکشنبه'), ('Monday', 'دوشنبه'),
+    ('Tuesday', 'سه‌شنبه'), ('Wednesday', 'چهارشنبه'), ('Thursday', 'پنج‌شنبه')
+]
+
 class CourseForm(FlaskForm):
     title = StringField('عنوان دوره', validators=[DataRequired()])
     description = TextAreaField('توضیحات', validators=[DataRequired()])
@@ -60,10 +66,7 @@ class CourseForm(FlaskForm):
         allow_blank=True
     )
     credits = IntegerField('تعداد واحد', validators=[DataRequired(), NumberRange(min=1, max=4)])
-    day_of_week = SelectField('روز هفته', choices=[
-        ('Saturday', 'شنبه'), ('Sunday', 'یکشنبه'), ('Monday', 'دوشنبه'),
-        ('Tuesday', 'سه‌شنبه'), ('Wednesday', 'چهارشنبه'), ('Thursday', 'پنج‌شنبه')
-    ], validators=[DataRequired()])
+    day_of_week = SelectField('روز هفته', choices=DAY_CHOICES, validators=[DataRequired()])
     start_time = TimeField('ساعت شروع', validators=[DataRequired()])
     end_time = TimeField('ساعت پایان', validators=[DataRequired()])
     capacity = IntegerField('ظرفیت', validators=[DataRequired()])
@@ -74,11 +77,22 @@ class TermForm(FlaskForm):
     is_active = BooleanField('آیا این ترم فعال برای ثبت‌نام است؟')
     submit = SubmitField('ذخیره ترم')
 
-class AdminCreateUserForm(FlaskForm):
+class TermRolloverForm(FlaskForm):
+    source = QuerySelectField('ترم مبدأ', query_factory=term_query, get_label='name', allow_blank=False)
+    name = StringField('نام ترم جدید', validators=[DataRequired()])
+    mapping_file = FileField('فایل CSV یا JSON جابجایی استادان و زمان‌ها (اختیاری)', validators=[
+        Optional(), FileAllowed(['csv', 'json'], 'فقط فایل CSV یا JSON مجاز است.')])
+    activate = BooleanField('ترم جدید فعال شود')
+    submit_rollover = SubmitField('کپی دوره‌ها')
+
+class NewUserFields(FlaskForm):
+    """Fields of a new account; bulk import validates each row with these, without CSRF."""
     username = StringField('نام کاربری', validators=[DataRequired()])
     email = StringField('ایمیل', validators=[DataRequired(), Email()])
     password = PasswordField('رمز عبور موقت', validators=[DataRequired()])
     role = SelectField('نقش', choices=[('student', 'دانشجو'), ('instructor', 'استاد')], validators=[DataRequired()])
+
+class AdminCreateUserForm(NewUserFields):
     submit_create = SubmitField('ایجاد کاربر')
 
     def validate_username(self, username):
@@ -91,6 +105,11 @@ class AdminCreateUserForm(FlaskForm):
         if user:
             raise ValidationError('این ایمیل قبلاً ثبت شده است.')
 
+class UserImportForm(FlaskForm):
+    users_file = FileField('فایل CSV یا JSON کاربران (username، email، password و role)', validators=[
+        FileRequired(), FileAllowed(['csv', 'json'], 'فقط فایل CSV یا JSON مجاز است.')])
+    submit_import = SubmitField('ورود گروهی')
+
 class ChangeRoleForm(FlaskForm):
     role = SelectField('نقش جدید', choices=[('student', 'دانشجو'), ('instructor', 'استاد')])
     submit_change = SubmitField('ذخیره')
@@ -102,4 +121,29 @@ class GradeForm(FlaskForm):
             NumberRange(min=0, max=20, message='نمره باید بین ۰ و ۲۰ باشد')
         ]
     )
-    submit = SubmitField('ثبت')
\ No newline at end of file
+    submit = SubmitField('ثبت')
+
+class BulkGradeForm(FlaskForm):
+    submit_grid = SubmitField('ثبت همه نمره‌ها')
+
+
+class GradeUploadForm(FlaskForm):
+    grades_file = FileField('فایل CSV نمرات (ستون‌های username و grade)', validators=[
+        FileRequired(), FileAllowed(['csv'], 'فقط فایل CSV مجاز است.')])
+    submit_upload = SubmitField('بارگذاری')
+
+
+class CourseSearchForm(FlaskForm):
+    class Meta:
+        csrf = False
+
+    q = StringField('جستجو', validators=[Optional()])
+    days = SelectMultipleField('روز هفته', choices=DAY_CHOICES, validators=[Optional()])
+    credits = SelectMultipleField('تعداد واحد', choices=[(n, str(n)) for n in range(1, 5)], coerce=int,
+                                  validators=[Optional()])
+    starts_after = TimeField('شروع از ساعت', validators=[Optional()])
+    ends_before = TimeField('پایان تا ساعت', validators=[Optional()])
+    instructor = QuerySelectField('استاد', query_factory=instructor_query, get_label='username',
+                                  allow_blank=True, blank_text='همه استادان')
+    free_seats = BooleanField('فقط دوره‌های دارای ظرفیت خالی')
+    submit = SubmitField('جستجو')
@@ -0,0 +1,110 @@
+from sqlalchemy import case, delete, func, insert, select, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models import (ArchivedCourse, ArchivedEnrollment, Course, Enrollment, StudentStats, StudentTermStats,
+                        User)
+
+
+def _gpa(grade_points, total_credits):
+    return case((total_credits > 0, grade_points * 1.0 / total_credits), else_=0.0)
+
+
+def _apply(table, key, credits, points):
+    stmt = sqlite_insert(table).values(**key, total_credits=credits, grade_points=points,
+                                       gpa=points / credits if credits > 0 else 0.0)
+    new_credits = table.total_credits + stmt.excluded.total_credits
+    new_points = table.grade_points + stmt.excluded.grade_points
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=list(key),
+        set_={'total_credits': new_credits, 'grade_points': new_points, 'gpa': _gpa(new_points, new_credits)}))
+
+
+def record_grade(user_id, term_id, credits, old_grade, new_grade):
+    """Apply one grade change to the student's aggregates, without committing.
+
+    ``old_grade``/``new_grade`` may be None (not graded yet, or enrollment
+    removed). Credits are those of the course the grade belongs to.
+    """
+    delta_credits = delta_points = 0
+    if old_grade is not None:
+        delta_credits -= credits
+        delta_points -= old_grade * credits
+    if new_grade is not None:
+        delta_credits += credits
+        delta_points += new_grade * credits
+    if delta_credits == 0 and delta_points == 0:
+        return
+    _apply(StudentTermStats, {'user_id': user_id, 'term_id': term_id}, delta_credits, delta_points)
+    _apply(StudentStats, {'user_id': user_id}, delta_credits, delta_points)
+
+
+def graded_students(course_id):
+    """Ids of students with a grade in a course, i.e. whose aggregates depend on it."""
+    return [user_id for (user_id,) in db.session.query(Enrollment.user_id).filter(
+        Enrollment.course_id == course_id, Enrollment.grade.isnot(None))]
+
+
+def forget_term(term_id):
+    """Take a term's grades out of the overall aggregates before the term is deleted, without committing.
+
+    The term's own rows go with it (ON DELETE CASCADE); every other term
+    of the students involved is left as it is.
+    """
+    credits = StudentStats.total_credits - StudentTermStats.total_credits
+    points = StudentStats.grade_points - StudentTermStats.grade_points
+    db.session.execute(
+        update(StudentStats)
+        .values(total_credits=credits, grade_points=points, gpa=_gpa(points, credits))
+        .where(StudentStats.user_id == StudentTermStats.user_id, StudentTermStats.term_id == term_id)
+        .execution_options(synchronize_session=False))
+
+
+def rebuild(user_ids=None):
+    """Recompute aggregates from the enrollment tables, archived grades included, without committing.
+
+    With ``user_ids`` only those students are rebuilt, which is what the
+    write paths use after changes that touch many grades at once (deleting
+    a course, changing its credits or term). Without it everything is
+    rebuilt; that is the backfill behind ``flask rebuild-gpa``.
+    """
+    if user_ids is not None and not user_ids:
+        return
+    graded = union_all(
+        select(Enrollment.user_id, Course.term_id, Course.credits, Enrollment.grade).join(
+            Course, Course.id == Enrollment.course_id).where(Enrollment.grade.isnot(None)),
+        select(ArchivedEnrollment.user_id, ArchivedCourse.term_id, ArchivedCourse.credits,
+               ArchivedEnrollment.grade).join(ArchivedCourse, ArchivedCourse.id == ArchivedEnrollment.course_id).where(
+            ArchivedEnrollment.grade.isnot(None)),
+    ).subquery()
+    per_term = select(
+        graded.c.user_id, graded.c.term_id,
+        func.sum(graded.c.credits), func.sum(graded.c.grade * graded.c.credits),
+        func.sum(graded.c.grade * graded.c.credits) * 1.0 / func.sum(graded.c.credits),
+    ).group_by(graded.c.user_id, graded.c.term_id)
+    overall = select(
+        StudentTermStats.user_id, func.sum(StudentTermStats.total_credits), func.sum(StudentTermStats.grade_points),
+        func.sum(StudentTermStats.grade_points) * 1.0 / func.sum(StudentTermStats.total_credits),
+    ).group_by(StudentTermStats.user_id)
+    clear_term, clear_overall = delete(StudentTermStats), delete(StudentStats)
+    if user_ids is not None:
+        per_term = per_term.where(graded.c.user_id.in_(user_ids))
+        overall = overall.where(StudentTermStats.user_id.in_(user_ids))
+        clear_term = clear_term.where(StudentTermStats.user_id.in_(user_ids))
+        clear_overall = clear_overall.where(StudentStats.user_id.in_(user_ids))
+
+    columns = ['user_id', 'total_credits', 'grade_points', 'gpa']
+    db.session.execute(clear_term)
+    db.session.execute(insert(StudentTermStats).from_select(columns[:1] + ['term_id'] + columns[1:], per_term))
+    db.session.execute(clear_overall)
+    db.session.execute(insert(StudentStats).from_select(columns, overall))
+
+
+def ranking(term_id=None, limit=50):
+    """Top students by GPA, overall or for one term: (username, total_credits, gpa) rows."""
+    table = StudentStats if term_id is None else StudentTermStats
+    query = db.session.query(User.username, table.total_credits, table.gpa).join(
+        User, User.id == table.user_id).filter(table.total_credits > 0)
+    if term_id is not None:
+        query = query.filter(StudentTermStats.term_id == term_id)
+    return query.order_by(table.gpa.desc(), table.user_id).limit(limit).all()
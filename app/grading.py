@@ -0,0 +1,90 @@
+import csv
+import io
+
+from sqlalchemy import update
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from app import gpa as gpa_stats
+from app.forms import GradeForm
+from app.models import Enrollment, User
+
+
+class GradeRow:
+    """One submitted grade: where it came from, whose it is and the raw value."""
+
+    def __init__(self, label, raw_grade, enrollment_id=None, username=None):
+        self.label = label
+        self.raw_grade = raw_grade
+        self.enrollment_id = enrollment_id
+        self.username = username
+
+
+def rows_from_grid(formdata):
+    """Grade inputs of the roster grid are named ``grade-<enrollment_id>``; blanks are skipped."""
+    rows = []
+    for key, value in formdata.items():
+        if key.startswith('grade-') and value.strip():
+            try:
+                enrollment_id = int(key[len('grade-'):])
+            except ValueError:
+                continue
+            rows.append(GradeRow(key, value.strip(), enrollment_id=enrollment_id))
+    return rows
+
+
+def rows_from_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames or not {'username', 'grade'} <= {name.strip() for name in reader.fieldnames}:
+        raise ValueError('فایل باید ستون‌های username و grade را داشته باشد.')
+    return [GradeRow(f'سطر {line}', (row.get('grade') or '').strip(), username=(row.get('username') or '').strip())
+            for line, row in enumerate(reader, start=2)]
+
+
+def _validate_grade(raw_grade):
+    form = GradeForm(formdata=MultiDict({'grade': raw_grade}), meta={'csrf': False})
+    if form.validate():
+        return form.grade.data, None
+    return None, form.grade.errors[0]
+
+
+def apply_grades(course, rows):
+    """Validate every row, then write all grades in one transaction.
+
+    Each value goes through ``GradeForm`` so the 0-20 rule is the same one
+    the single-grade form enforces. If any row is invalid nothing is
+    written and ``(0, errors)`` is returned, where errors are
+    ``(label, message)`` pairs; otherwise grades are applied with a single
+    executemany, the affected students' GPA aggregates are rebuilt, and
+    ``(count, [])`` is returned.
+    """
+    enrollments = {}
+    by_username = {}
+    for enrollment_id, user_id, username in db.session.query(Enrollment.id, Enrollment.user_id, User.username).join(
+            User, User.id == Enrollment.user_id).filter(Enrollment.course_id == course.id):
+        enrollments[enrollment_id] = user_id
+        by_username[username] = enrollment_id
+
+    errors, grades = [], {}
+    for row in rows:
+        enrollment_id = row.enrollment_id if row.enrollment_id is not None else by_username.get(row.username)
+        if enrollment_id not in enrollments:
+            errors.append((row.label, f'دانشجوی «{row.username or row.enrollment_id}» در این دوره ثبت‌نام نکرده است.'))
+            continue
+        if enrollment_id in grades:
+            errors.append((row.label, 'برای این دانشجو بیش از یک نمره ارسال شده است.'))
+            continue
+        grade, error = _validate_grade(row.raw_grade)
+        if error:
+            errors.append((row.label, error))
+        else:
+            grades[enrollment_id] = grade
+    if errors or not grades:
+        return 0, errors
+
+    db.session.execute(update(Enrollment), [
+        {'id': enrollment_id, 'grade': grade, 'status': 'completed'} for enrollment_id, grade in grades.items()])
+    gpa_stats.rebuild({enrollments[enrollment_id] for enrollment_id in grades})
+    db.session.commit()
+    return len(grades), []
@@ -0,0 +1,323 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from time import perf_counter
+
+from flask import g, request
+from flask.signals import before_render_template, template_rendered
+
+
+# Upper bounds, in seconds, of the request latency histogram buckets; +Inf is implied.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENVIRON_KEY = 'course_portal.metrics'
+
+# Slots of an endpoint row after the bucket counts (the last bucket is +Inf).
+_SECONDS, _QUERIES, _DB_SECONDS, _TEMPLATE_SECONDS = range(len(LATENCY_BUCKETS) + 1, len(LATENCY_BUCKETS) + 5)
+_ROW = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0, 0.0, 0.0]
+
+
+class RequestMetrics:
+    """One request as the middleware records it; the Flask side fills it in through the WSGI environ."""
+
+    __slots__ = ('start_response', 'status', 'endpoint', 'queries', 'db_seconds', 'template_seconds',
+                 'template_started')
+
+    def __init__(self, start_response):
+        self.start_response = start_response
+        self.status = 500
+        self.endpoint = None
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_started = None
+
+    def capture(self, status, headers, exc_info=None):
+        """``start_response`` for the wrapped app, noting the status code on the way."""
+        self.status = int(status[:3])
+        return self.start_response(status, headers, exc_info)
+
+
+class _Shard:
+    """One thread's counters. Only that thread writes to it, so recording takes no lock."""
+
+    def __init__(self, thread=None):
+        self.requests = {}   # (endpoint, method, status) -> count
+        self.endpoints = {}  # endpoint -> bucket counts, then seconds, queries, db and template seconds
+        self.thread = weakref.ref(thread) if thread is not None else None
+
+    def is_retired(self):
+        """Whether the owning thread has exited, so nothing writes to the shard any more."""
+        thread = self.thread()
+        return thread is None or not thread.is_alive()
+
+    def add(self, other):
+        for key, count in list(other.requests.items()):
+            self.requests[key] = self.requests.get(key, 0) + count
+        for endpoint, row in list(other.endpoints.items()):
+            _add(self.endpoints.setdefault(endpoint, list(_ROW)), list(row))
+
+
+class Registry:
+    """Per-process request metrics, kept in per-thread shards and summed when read.
+
+    Shards of exited threads are folded into one retired total when read
+    and as new threads arrive, so a thread-per-request server keeps about
+    as many shards as it has live threads.
+
+    With ``directory`` set, the process writes its totals to a file of its
+    own there at most every ``flush_interval`` seconds, after a request,
+    and on exit; ``collect`` merges every process's file, so any worker
+    can answer for all of them. Files of exited workers are kept, so
+    counters do not go backwards; clear the directory when deploying.
+    """
+
+    # Fold the shards of exited threads once there are this many shards, or twice as many as last time.
+    PRUNE_AT = 64
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.created = time.time()
+        self.flushed_at = time.monotonic()
+        self._shards = []
+        self._retired = _Shard()
+        self._prune_at = self.PRUNE_AT
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _new_shard(self):
+        shard = self._local.shard = _Shard(threading.current_thread())
+        with self._lock:
+            self._shards.append(shard)
+            if len(self._shards) >= self._prune_at:
+                self._prune()
+                self._prune_at = max(self.PRUNE_AT, 2 * len(self._shards))
+        return shard
+
+    def _prune(self):
+        """Fold the shards of exited threads into the retired totals; call holding the lock.
+
+        Under a thread-per-request server every request brings a new
+        thread, so this keeps the shards, and the cost of a snapshot, to
+        about the number of live threads.
+        """
+        live = []
+        for shard in self._shards:
+            if shard.is_retired():
+                self._retired.add(shard)
+            else:
+                live.append(shard)
+        self._shards = live
+
+    def observe(self, method, seconds, current):
+        """Record a finished request: its ``RequestMetrics`` and how long it took."""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        endpoint = current.endpoint or 'unmatched'
+        key = (endpoint, method, current.status)
+        requests = shard.requests
+        requests[key] = requests.get(key, 0) + 1
+        row = shard.endpoints.get(endpoint)
+        if row is None:
+            row = shard.endpoints[endpoint] = list(_ROW)
+        row[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        row[_SECONDS] += seconds
+        row[_QUERIES] += current.queries
+        row[_DB_SECONDS] += current.db_seconds
+        row[_TEMPLATE_SECONDS] += current.template_seconds
+
+    def snapshot(self):
+        """This process's totals as plain JSON-ready data."""
+        total = _Shard()
+        with self._lock:
+            self._prune()
+            total.add(self._retired)
+            shards = list(self._shards)
+        for shard in shards:
+            # Copying a dict or list is atomic under the GIL, so the owning thread can keep writing.
+            total.add(shard)
+        return {'requests': [[*key, count] for key, count in total.requests.items()], 'endpoints': total.endpoints,
+                'caches': _cache_counts()}
+
+    def _path(self):
+        return os.path.join(self.directory, f'{os.getpid()}-{int(self.created * 1000)}.json')
+
+    def flush(self):
+        """Write this process's totals to its file, atomically; a no-op without a directory."""
+        self.flushed_at = time.monotonic()
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path()
+        with open(path + '.tmp', 'w') as stream:
+            json.dump(self.snapshot(), stream)
+        os.replace(path + '.tmp', path)
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def collect(self):
+        """Totals of every process sharing the directory, this one up to date; ``(snapshot, processes)``."""
+        if not self.directory:
+            return self.snapshot(), 1
+        self.flush()
+        merged, processes = {'requests': [], 'endpoints': {}, 'caches': {}}, 0
+        requests = {}
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as stream:
+                    snapshot = json.load(stream)
+            except (OSError, ValueError):
+                continue
+            processes += 1
+            for *key, count in snapshot['requests']:
+                requests[tuple(key)] = requests.get(tuple(key), 0) + count
+            for endpoint, row in snapshot['endpoints'].items():
+                _add(merged['endpoints'].setdefault(endpoint, list(_ROW)), row)
+            for name, counts in snapshot['caches'].items():
+                _add(merged['caches'].setdefault(name, [0, 0]), counts)
+        merged['requests'] = [[*key, count] for key, count in requests.items()]
+        return merged, processes
+
+
+def _add(total, row):
+    for index, value in enumerate(row):
+        total[index] += value
+
+
+def _cache_counts():
+    from app.caching import fragments
+    from app.schedule import _schedules
+    from app.user_cache import users
+    return {'fragments': [fragments.hits, fragments.misses], 'users': [users.hits, users.misses],
+            'schedules': [_schedules.hits, _schedules.misses]}
+
+
+class MetricsMiddleware:
+    """WSGI middleware timing every request from the call until the response starts.
+
+    The endpoint, query counts and template time come from the Flask
+    hooks in ``init_app`` through the environ. Streamed bodies, such as
+    exports, are timed to their first byte.
+    """
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        started = perf_counter()
+        current = environ[ENVIRON_KEY] = RequestMetrics(start_response)
+        try:
+            return self.wsgi_app(environ, current.capture)
+        finally:
+            registry = self.registry
+            registry.observe(environ.get('REQUEST_METHOD', ''), perf_counter() - started, current)
+            if registry.directory:
+                registry.maybe_flush()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def prometheus(snapshot, processes):
+    """Render merged totals in the Prometheus text exposition format, version 0.0.4."""
+    lines = []
+
+    def family(name, kind, help_text):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    family('portal_http_requests_total', 'counter', 'Requests handled, by endpoint, method and status.')
+    for endpoint, method, status, count in sorted(snapshot['requests']):
+        lines.append(f'portal_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    endpoints = sorted(snapshot['endpoints'].items())
+    family('portal_http_request_duration_seconds', 'histogram', 'Time from receiving a request to starting the response.')
+    for endpoint, row in endpoints:
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), row):
+            cumulative += count
+            lines.append(f'portal_http_request_duration_seconds_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}')
+        lines.append(f'portal_http_request_duration_seconds_sum{_labels(endpoint=endpoint)} {row[_SECONDS]!r}')
+        lines.append(f'portal_http_request_duration_seconds_count{_labels(endpoint=endpoint)} {cumulative}')
+
+    for name, slot, help_text in [
+            ('portal_db_queries_total', _QUERIES, 'SQL statements run while handling requests, by endpoint.'),
+            ('portal_db_seconds_total', _DB_SECONDS, 'Time spent in SQL statements, by endpoint.'),
+            ('portal_template_seconds_total', _TEMPLATE_SECONDS, 'Time spent rendering templates, by endpoint.')]:
+        family(name, 'counter', help_text)
+        for endpoint, row in endpoints:
+            lines.append(f'{name}{_labels(endpoint=endpoint)} {row[slot]!r}')
+
+    caches = sorted(snapshot['caches'].items())
+    for name, index, help_text in [('portal_cache_hits_total', 0, 'In-process cache lookups that found an entry.'),
+                                   ('portal_cache_misses_total', 1, 'In-process cache lookups that missed.')]:
+        family(name, 'counter', help_text)
+        for cache, counts in caches:
+            lines.append(f'{name}{_labels(cache=cache)} {counts[index]}')
+
+    family('portal_metrics_processes', 'gauge', 'Worker processes whose metrics are included.')
+    lines.append(f'portal_metrics_processes {processes}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = None
+
+
+def init_app(app):
+    """Wrap ``app.wsgi_app`` in the metrics middleware and hook the Flask side of each request.
+
+    Call after ``sql_stats.init_app``: ``after_request`` functions run in
+    reverse order, so this one reads the request's query stats before
+    they are dropped.
+    """
+    global registry
+    if not app.config['METRICS_ENABLED']:
+        return
+    registry = Registry(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, registry)
+    atexit.register(registry.flush)
+
+    @app.before_request
+    def note_endpoint():
+        current = request.environ.get(ENVIRON_KEY)
+        if current is not None:
+            current.endpoint = request.endpoint
+
+    @app.after_request
+    def note_queries(response):
+        current = request.environ.get(ENVIRON_KEY)
+        stats = g.get('sql_stats')
+        if current is not None and stats is not None:
+            current.queries, current.db_seconds = stats.count, stats.total_time
+        return response
+
+    def start_template(sender, template, context, **extra):
+        current = request.environ.get(ENVIRON_KEY) if request else None
+        if current is not None:
+            current.template_started = time.perf_counter()
+
+    def end_template(sender, template, context, **extra):
+        current = request.environ.get(ENVIRON_KEY) if request else None
+        if current is not None and current.template_started is not None:
+            current.template_seconds += time.perf_counter() - current.template_started
+            current.template_started = None
+
+    # Signals hold receivers weakly; these would be gone once init_app returns.
+    before_render_template.connect(start_template, app, weak=False)
+    template_rendered.connect(end_template, app, weak=False)
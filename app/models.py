@@ -1,11 +1,15 @@
-from app import db, login
-from werkzeug.security import generate_password_hash, check_password_hash
+from app import db
+from app.passwords import hash_password, verifier
 from flask_login import UserMixin
-from datetime import time
+from datetime import datetime, time
 
 prerequisites = db.Table('prerequisites',
-                         db.Column('course_id', db.Integer, db.ForeignKey('course.id'), primary_key=True),
-                         db.Column('prerequisite_id', db.Integer, db.ForeignKey('course.id'), primary_key=True)
+                         db.Column('course_id', db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'),
+                                   primary_key=True),
+                         db.Column('prerequisite_id', db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'),
+                                   primary_key=True),
+                         # Reverse lookups (what a course is a prerequisite for).
+                         db.Index('ix_prerequisites_prerequisite_id', 'prerequisite_id')
                          )
 
 
@@ -13,7 +17,10 @@ class Term(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(140), nullable=False, unique=True)
     is_active = db.Column(db.Boolean, default=False, nullable=False)
-    courses = db.relationship('Course', backref='term', lazy='dynamic')
+    # Set once the term's courses and enrollments moved to the archive tables (app/retention.py).
+    archived_at = db.Column(db.DateTime)
+    # Deleting a term or course cascades in the database (ON DELETE CASCADE, foreign_keys enforced).
+    courses = db.relationship('Course', backref='term', lazy='dynamic', passive_deletes=True)
 
     def __repr__(self):
         return f'<Term {self.name}>'
@@ -24,16 +31,17 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True, nullable=False)
     email = db.Column(db.String(120), index=True, unique=True, nullable=False)
     password_hash = db.Column(db.String(128))
-    role = db.Column(db.String(20), nullable=False, default='student')
+    role = db.Column(db.String(20), index=True, nullable=False, default='student')
     enrollments = db.relationship('Enrollment', backref='student', lazy='dynamic', foreign_keys='Enrollment.user_id')
     taught_courses = db.relationship('Course', backref='instructor', lazy='dynamic',
                                      foreign_keys='Course.instructor_id')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Verify on the bounded verification pool; raises ``HashingBusy`` when it is full."""
+        return verifier.check(self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -48,9 +56,24 @@ class Course(db.Model):
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time, nullable=False)
     capacity = db.Column(db.Integer, default=20)
+    seats_taken = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Touched by every UPDATE of the row, seat counter included; versions
+    # the cached course fragments and drives Last-Modified (app/caching.py).
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     instructor_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    term_id = db.Column(db.Integer, db.ForeignKey('term.id'), nullable=False)
-    enrollments = db.relationship('Enrollment', backref='course', lazy='dynamic', foreign_keys='Enrollment.course_id')
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id', ondelete='CASCADE'), nullable=False)
+    enrollments = db.relationship('Enrollment', backref='course', lazy='dynamic', foreign_keys='Enrollment.course_id',
+                                  passive_deletes=True)
+
+    __table_args__ = (
+        # Serves the catalog (term_id = ? ORDER BY title, id) and the
+        # management list (ORDER BY term_id DESC, title, id) as keyset scans.
+        db.Index('ix_course_term_title', term_id.desc(), title, id),
+        # Same listing restricted to one instructor's courses.
+        db.Index('ix_course_instructor_term_title', instructor_id, term_id.desc(), title, id),
+        # Ids are never reused: archived courses keep theirs (app/retention.py).
+        {'sqlite_autoincrement': True},
+    )
 
     prereqs = db.relationship(
         'Course', secondary=prerequisites,
@@ -59,15 +82,27 @@ class Course(db.Model):
         backref=db.backref('is_prereq_for', lazy='dynamic'),
         lazy='dynamic'
     )
+    # Prerequisites in archived terms; written by app/retention.py and app/rollover.py only.
+    archived_prereqs = db.relationship('ArchivedCourse', secondary='archived_prerequisites', lazy='dynamic',
+                                       viewonly=True)
 
     def __repr__(self):
         return f'<Course {self.title}>'
 
 
 class Enrollment(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='uq_enrollment_user_course'),
+        # The unique constraint serves lookups by student; rosters, seat
+        # counts and grading look enrollments up by course.
+        db.Index('ix_enrollment_course_user', 'course_id', 'user_id'),
+        # Ids are never reused: archived enrollments keep theirs (app/retention.py).
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    course_id = db.Column(db.Integer, db.ForeignKey('course.id'))
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'))
     status = db.Column(db.String(20), default='enrolled', nullable=False)
     grade = db.Column(db.Integer, nullable=True)
 
@@ -75,6 +110,217 @@ class Enrollment(db.Model):
         return f'<Enrollment user_id={self.user_id} course_id={self.course_id}>'
 
 
-@login.user_loader
-def load_user(id):
-    return User.query.get(int(id))
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist_entry'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'course_id', name='uq_waitlist_user_course'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WaitlistEntry user_id={self.user_id} course_id={self.course_id}>'
+
+
+class StudentStats(db.Model):
+    __tablename__ = 'student_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_credits = db.Column(db.Integer, nullable=False, default=0)
+    grade_points = db.Column(db.Integer, nullable=False, default=0)
+    gpa = db.Column(db.Float, nullable=False, default=0.0, index=True)
+
+    def __repr__(self):
+        return f'<StudentStats user_id={self.user_id} gpa={self.gpa:.2f}>'
+
+
+class StudentTermStats(db.Model):
+    __tablename__ = 'student_term_stats'
+    __table_args__ = (
+        db.Index('ix_student_term_stats_term_gpa', 'term_id', 'gpa'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id', ondelete='CASCADE'), primary_key=True)
+    total_credits = db.Column(db.Integer, nullable=False, default=0)
+    grade_points = db.Column(db.Integer, nullable=False, default=0)
+    gpa = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<StudentTermStats user_id={self.user_id} term_id={self.term_id} gpa={self.gpa:.2f}>'
+
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def bump(name):
+        """Increment a version stamp in the current transaction and return it."""
+        updated = db.session.execute(
+            db.update(CacheVersion).where(CacheVersion.name == name)
+            .values(version=CacheVersion.version + 1)
+            .execution_options(synchronize_session=False))
+        if updated.rowcount == 0:
+            db.session.add(CacheVersion(name=name, version=1))
+            db.session.flush()
+        return CacheVersion.current(name)
+
+    @staticmethod
+    def current(name):
+        return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+
+    @staticmethod
+    def stamp(name):
+        """Return ``(version, updated_at)``; ``(0, None)`` if the stamp was never bumped."""
+        row = db.session.query(CacheVersion.version, CacheVersion.updated_at).filter_by(name=name).first()
+        return tuple(row) if row else (0, None)
+
+
+class RollupTotals:
+    """Counters shared by the report rollups; ``app.reports`` fills them in.
+
+    ``band_0`` to ``band_4`` count grades per ``app.reports.GRADE_BANDS``.
+    """
+    enrolled = db.Column(db.Integer, nullable=False, default=0)
+    capacity = db.Column(db.Integer, nullable=False, default=0)
+    graded = db.Column(db.Integer, nullable=False, default=0)
+    passed = db.Column(db.Integer, nullable=False, default=0)
+    grade_total = db.Column(db.Integer, nullable=False, default=0)
+    drops = db.Column(db.Integer, nullable=False, default=0)
+    band_0 = db.Column(db.Integer, nullable=False, default=0)
+    band_1 = db.Column(db.Integer, nullable=False, default=0)
+    band_2 = db.Column(db.Integer, nullable=False, default=0)
+    band_3 = db.Column(db.Integer, nullable=False, default=0)
+    band_4 = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def fill_rate(self):
+        return self.enrolled / self.capacity if self.capacity else 0.0
+
+    @property
+    def pass_rate(self):
+        return self.passed / self.graded if self.graded else 0.0
+
+    @property
+    def average_grade(self):
+        return self.grade_total / self.graded if self.graded else None
+
+    @property
+    def drop_rate(self):
+        """Drops per seat ever taken: current enrollments plus the drops themselves."""
+        return self.drops / (self.enrolled + self.drops) if self.enrolled + self.drops else 0.0
+
+    @property
+    def bands(self):
+        return [self.band_0, self.band_1, self.band_2, self.band_3, self.band_4]
+
+
+class CourseRollup(RollupTotals, db.Model):
+    __tablename__ = 'course_rollup'
+    __table_args__ = (
+        db.Index('ix_course_rollup_term_enrolled', 'term_id', 'enrolled'),
+    )
+
+    # No foreign keys: a row outlives its course until the next refresh,
+    # and `drops` is only ever recorded here.
+    course_id = db.Column(db.Integer, primary_key=True)
+    term_id = db.Column(db.Integer, nullable=False)
+    instructor_id = db.Column(db.Integer)
+    day_of_week = db.Column(db.String(20))
+    start_time = db.Column(db.Time)
+
+    def __repr__(self):
+        return f'<CourseRollup course_id={self.course_id} enrolled={self.enrolled}>'
+
+
+class InstructorRollup(RollupTotals, db.Model):
+    __tablename__ = 'instructor_rollup'
+
+    term_id = db.Column(db.Integer, primary_key=True)
+    instructor_id = db.Column(db.Integer, primary_key=True)
+    courses = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<InstructorRollup term_id={self.term_id} instructor_id={self.instructor_id}>'
+
+
+class SlotRollup(RollupTotals, db.Model):
+    __tablename__ = 'slot_rollup'
+
+    term_id = db.Column(db.Integer, primary_key=True)
+    day_of_week = db.Column(db.String(20), primary_key=True)
+    start_time = db.Column(db.Time, primary_key=True)
+    courses = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SlotRollup term_id={self.term_id} {self.day_of_week} {self.start_time}>'
+
+
+class TermRollup(RollupTotals, db.Model):
+    __tablename__ = 'term_rollup'
+
+    term_id = db.Column(db.Integer, primary_key=True)
+    courses = db.Column(db.Integer, nullable=False, default=0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TermRollup term_id={self.term_id}>'
+
+
+class RollupStale(db.Model):
+    """Courses whose rollups are out of date; triggers on `course` and `enrollment` add them."""
+    __tablename__ = 'rollup_stale'
+
+    course_id = db.Column(db.Integer, primary_key=True)
+
+
+class ArchivedCourse(db.Model):
+    """A course of an archived term, as it was when archived; keeps its original id."""
+    __tablename__ = 'archived_course'
+
+    id = db.Column(db.Integer, primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('term.id', ondelete='CASCADE'), nullable=False, index=True)
+    title = db.Column(db.String(140), nullable=False)
+    description = db.Column(db.Text)
+    credits = db.Column(db.Integer, nullable=False)
+    day_of_week = db.Column(db.String(20), nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    capacity = db.Column(db.Integer)
+    instructor_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    def __repr__(self):
+        return f'<ArchivedCourse {self.title}>'
+
+
+# Links from live courses to prerequisites whose term was archived, moved
+# out of `prerequisites` when the term was (app/retention.py).
+archived_prerequisites = db.Table('archived_prerequisites',
+                                  db.Column('course_id', db.Integer, db.ForeignKey('course.id', ondelete='CASCADE'),
+                                            primary_key=True),
+                                  db.Column('prerequisite_id', db.Integer,
+                                            db.ForeignKey('archived_course.id', ondelete='CASCADE'), primary_key=True),
+                                  db.Index('ix_archived_prerequisites_prerequisite_id', 'prerequisite_id')
+                                  )
+
+
+class ArchivedEnrollment(db.Model):
+    """An enrollment, and its grade, in an archived course; transcripts and GPA rebuilds read it."""
+    __tablename__ = 'archived_enrollment'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('archived_course.id', ondelete='CASCADE'), nullable=False,
+                          index=True)
+    status = db.Column(db.String(20), nullable=False)
+    grade = db.Column(db.Integer)
+
+    def __repr__(self):
+        return f'<ArchivedEnrollment user_id={self.user_id} course_id={self.course_id}>'
@@ -0,0 +1,93 @@
+import base64
+import binascii
+import json
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class KeysetPage:
+    """One page of a keyset-paginated listing.
+
+    ``next_cursor``/``prev_cursor`` are opaque strings to pass back as the
+    ``cursor`` argument; ``cursor`` is the one this page was loaded with.
+    """
+
+    def __init__(self, items, cursor, next_cursor, prev_cursor):
+        self.items = items
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps([1 if backwards else 0] + list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, backwards)``, or ``(None, False)`` for a missing or mangled cursor."""
+    if not cursor:
+        return None, False
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return payload[1:], bool(payload[0])
+    except (ValueError, TypeError, IndexError, binascii.Error):
+        return None, False
+
+
+def _seek(order, values, backwards):
+    """WHERE clause selecting rows strictly after ``values`` in ``order`` (before, if backwards)."""
+    def after(column, descending, value):
+        return column < value if descending != backwards else column > value
+
+    directions = {descending for _, descending in order}
+    if len(directions) == 1:
+        columns = tuple_(*(column for column, _ in order))
+        return after(columns, directions.pop(), tuple_(*values))
+    # Mixed directions cannot use a row-value comparison; expand it instead
+    # and repeat a bound on the leading column so the index range still applies.
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        equal = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, after(column, descending, values[i])))
+    first, descending = order[0]
+    lead = first <= values[0] if descending != backwards else first >= values[0]
+    return and_(lead, or_(*clauses))
+
+
+def keyset_paginate(query, order, key, cursor=None, per_page=20):
+    """Paginate ``query`` by seeking past the last row seen instead of using OFFSET.
+
+    ``order`` is a list of ``(column, descending)`` pairs that must end in a
+    unique column; ``key(item)`` returns an item's values for those columns.
+    Every page, however deep, costs one indexed range scan of ``per_page + 1``
+    rows and no ``COUNT(*)``.
+    """
+    values, backwards = decode_cursor(cursor)
+    if values is not None and len(values) != len(order):
+        values, backwards = None, False
+    if values is not None:
+        query = query.filter(_seek(order, values, backwards))
+    query = query.order_by(*((column.asc() if descending == backwards else column.desc())
+                             for column, descending in order))
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if more or backwards:
+            next_cursor = encode_cursor(key(items[-1]))
+        if values is not None and (more or not backwards):
+            prev_cursor = encode_cursor(key(items[0]), backwards=True)
+    return KeysetPage(items, cursor if values is not None else None, next_cursor, prev_cursor)
@@ -0,0 +1,77 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import app
+
+
+# Below this many passwords starting worker processes costs more than it saves.
+_POOL_THRESHOLD = 8
+
+
+class HashingBusy(Exception):
+    """Raised instead of queueing when every password verification slot is taken."""
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=app.config['PASSWORD_HASH_METHOD'])
+
+
+def hash_passwords(passwords, workers=None):
+    """Hash many passwords at once, in parallel worker processes; returns hashes in input order.
+
+    Each hash is deliberately slow; a large import is spread over
+    ``workers`` processes, by default ``PASSWORD_HASH_WORKERS`` or one per
+    CPU, instead of tying up the calling thread for the whole run.
+    """
+    passwords = list(passwords)
+    workers = workers or app.config['PASSWORD_HASH_WORKERS'] or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < _POOL_THRESHOLD:
+        return [hash_password(password) for password in passwords]
+    method = partial(generate_password_hash, method=app.config['PASSWORD_HASH_METHOD'])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(method, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+_current_method = {}
+
+
+def needs_rehash(password_hash):
+    """True if ``password_hash`` was made with another method or cost than ``PASSWORD_HASH_METHOD``."""
+    configured = app.config['PASSWORD_HASH_METHOD']
+    if configured not in _current_method:
+        # Werkzeug fills in default parameters ("scrypt" -> "scrypt:32768:8:1");
+        # a throwaway hash tells what stored hashes should start with.
+        _current_method[configured] = generate_password_hash('', method=configured).split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _current_method[configured]
+
+
+class VerifyPool:
+    """Runs password checks on a fixed number of threads, refusing work beyond a short queue.
+
+    The hash functions release the GIL, so ``workers`` threads use up to
+    that many cores whatever the number of logins arriving; other requests
+    keep the rest. At most ``queue`` more checks wait for a thread, and
+    callers past that get ``HashingBusy`` at once rather than piling up.
+    """
+
+    def __init__(self, workers, queue):
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-verify')
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def check(self, password_hash, password):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy()
+        try:
+            return self._executor.submit(check_password_hash, password_hash, password).result()
+        finally:
+            self._slots.release()
+
+
+verifier = VerifyPool(app.config['PASSWORD_VERIFY_WORKERS'] or os.cpu_count() or 1,
+                      app.config['PASSWORD_VERIFY_QUEUE'])
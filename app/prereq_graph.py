@@ -0,0 +1,194 @@
+import threading
+from collections import defaultdict
+
+from sqlalchemy import literal, select, union_all
+
+from app import db
+from app.models import ArchivedCourse, ArchivedEnrollment, CacheVersion, Course, archived_prerequisites, prerequisites
+
+
+VERSION_KEY = 'prereqs'
+
+
+class PrereqCycleError(ValueError):
+    pass
+
+
+class PrereqGraph:
+    """In-memory view of the ``prerequisites`` and ``archived_prerequisites`` tables.
+
+    Keeps direct prerequisites and dependents per course and memoizes the
+    transitive closure. ``set_prereqs`` only drops the memoized closures of
+    the course being changed and of the courses that depend on it.
+    """
+
+    def __init__(self, edges=(), version=0):
+        self.version = version
+        self._prereqs = defaultdict(set)
+        self._dependents = defaultdict(set)
+        self._closure = {}
+        self._lock = threading.RLock()
+        for course_id, prereq_id in edges:
+            self._prereqs[course_id].add(prereq_id)
+            self._dependents[prereq_id].add(course_id)
+
+    @classmethod
+    def load(cls):
+        version = CacheVersion.current(VERSION_KEY)
+        edges = db.session.execute(union_all(
+            select(prerequisites.c.course_id, prerequisites.c.prerequisite_id),
+            select(archived_prerequisites.c.course_id, archived_prerequisites.c.prerequisite_id))).all()
+        return cls(edges, version)
+
+    def direct_prereqs(self, course_id):
+        return frozenset(self._prereqs.get(course_id, ()))
+
+    def all_prereqs(self, course_id):
+        """Every course that must be passed, directly or transitively, before ``course_id``."""
+        closure = self._closure.get(course_id)
+        if closure is None:
+            with self._lock:
+                seen, stack = set(), list(self._prereqs.get(course_id, ()))
+                while stack:
+                    node = stack.pop()
+                    if node in seen:
+                        continue
+                    seen.add(node)
+                    cached = self._closure.get(node)
+                    if cached is not None:
+                        seen |= cached
+                    else:
+                        stack.extend(self._prereqs.get(node, ()))
+                closure = self._closure[course_id] = frozenset(seen)
+        return closure
+
+    def would_create_cycle(self, course_id, prereq_ids):
+        prereq_ids = set(prereq_ids)
+        return course_id in prereq_ids or any(course_id in self.all_prereqs(p) for p in prereq_ids)
+
+    def levels(self, nodes=None):
+        """Topological level of every course: 0 for no prerequisites, else 1 + the deepest prerequisite.
+
+        ``nodes`` limits the walk to those courses; it must hold every
+        prerequisite of each of them, as a transitive closure does.
+        """
+        with self._lock:
+            nodes = set(self._prereqs) | set(self._dependents) if nodes is None else set(nodes)
+            remaining = {node: len(self._prereqs.get(node, ())) for node in nodes}
+            frontier = [node for node, count in remaining.items() if count == 0]
+            levels = dict.fromkeys(frontier, 0)
+            while frontier:
+                next_frontier = []
+                for node in frontier:
+                    for dependent in self._dependents.get(node, ()):
+                        if dependent not in remaining:
+                            continue
+                        levels[dependent] = max(levels.get(dependent, 0), levels[node] + 1)
+                        remaining[dependent] -= 1
+                        if remaining[dependent] == 0:
+                            next_frontier.append(dependent)
+                frontier = next_frontier
+            if len(levels) != len(nodes):
+                raise PrereqCycleError('prerequisite graph contains a cycle')
+            return levels
+
+    def _invalidate(self, course_id):
+        seen, stack = set(), [course_id]
+        while stack:
+            node = stack.pop()
+            if node not in seen:
+                seen.add(node)
+                self._closure.pop(node, None)
+                stack.extend(self._dependents.get(node, ()))
+
+    def set_prereqs(self, course_id, prereq_ids):
+        with self._lock:
+            self._invalidate(course_id)
+            for old in self._prereqs.pop(course_id, ()):
+                self._dependents[old].discard(course_id)
+            for prereq_id in prereq_ids:
+                self._prereqs[course_id].add(prereq_id)
+                self._dependents[prereq_id].add(course_id)
+
+    def remove_course(self, course_id):
+        with self._lock:
+            self.set_prereqs(course_id, ())
+            for dependent in self._dependents.pop(course_id, ()):
+                self._prereqs[dependent].discard(course_id)
+
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def prereq_graph():
+    """Return the process-wide graph, reloading it if another worker changed prerequisites."""
+    global _graph
+    version = CacheVersion.current(VERSION_KEY)
+    if _graph is None or _graph.version != version:
+        with _graph_lock:
+            if _graph is None or _graph.version != version:
+                _graph = PrereqGraph.load()
+    return _graph
+
+
+def archived_passes(user_ids, course_ids):
+    """``(user_id, course_id)`` of every archived course among ``course_ids`` that one of the students passed.
+
+    Archived courses keep their ids, so prerequisites in archived terms
+    are checked against the grades the archive kept.
+    """
+    return db.session.query(ArchivedEnrollment.user_id, ArchivedEnrollment.course_id).filter(
+        ArchivedEnrollment.user_id.in_(user_ids), ArchivedEnrollment.course_id.in_(course_ids),
+        ArchivedEnrollment.grade >= 10).all()
+
+
+def course_titles(course_ids):
+    """Titles of courses by id, archived courses included."""
+    course_ids = list(course_ids)
+    return dict(db.session.execute(union_all(
+        select(Course.id, Course.title).where(Course.id.in_(course_ids)),
+        select(ArchivedCourse.id, ArchivedCourse.title).where(ArchivedCourse.id.in_(course_ids)))).all())
+
+
+def prereq_chain(course_id):
+    """Every course to pass before ``course_id``, directly or not, in the order to take them.
+
+    Returns ``(id, title, level, archived)`` tuples sorted by topological
+    level, then title; level 0 courses have no prerequisites of their own.
+    """
+    graph = prereq_graph()
+    chain = graph.all_prereqs(course_id)
+    if not chain:
+        return []
+    levels = graph.levels(chain)
+    rows = db.session.execute(union_all(
+        select(Course.id, Course.title, literal(False)).where(Course.id.in_(chain)),
+        select(ArchivedCourse.id, ArchivedCourse.title, literal(True)).where(ArchivedCourse.id.in_(chain))))
+    return sorted(((id_, title, levels[id_], archived) for id_, title, archived in rows), key=lambda row: (row[2], row[1]))
+
+
+def check_prereqs(course_id, prereq_ids):
+    """Raise ``PrereqCycleError`` if giving ``course_id`` these prerequisites would form a cycle."""
+    if course_id is not None and prereq_graph().would_create_cycle(course_id, prereq_ids):
+        raise PrereqCycleError('prerequisites would form a cycle')
+
+
+def prereqs_changed(course_id, prereq_ids):
+    """Record a prerequisite change made in the current transaction.
+
+    Call before committing; the version stamp is bumped in the same
+    transaction and this process's graph is patched in place. Pass
+    ``prereq_ids=None`` when the course itself was deleted.
+    """
+    version = CacheVersion.bump(VERSION_KEY)
+    graph = _graph
+    if graph is None:
+        return
+    with graph._lock:
+        if graph.version == version - 1:
+            if prereq_ids is None:
+                graph.remove_course(course_id)
+            else:
+                graph.set_prereqs(course_id, prereq_ids)
+            graph.version = version
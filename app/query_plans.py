@@ -0,0 +1,152 @@
+import re
+import threading
+from contextlib import contextmanager
+
+from flask import url_for
+from flask_login import FlaskLoginClient
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from app import app, db
+from app.models import Course, Enrollment, Term, User
+from app.sql_stats import statement_shape
+
+
+# Tables that grow with the number of students, courses or terms. A plain
+# SCAN of one of these in a request is a missing index; lookup tables such
+# as `term` stay small enough to scan.
+LARGE_TABLES = {'user', 'course', 'enrollment', 'prerequisites', 'archived_prerequisites', 'waitlist_entry',
+                'student_stats', 'student_term_stats'}
+
+# "SCAN course" is a full table scan; "SCAN course USING INDEX ..." walks an
+# index in order (a LIMITed listing) and virtual tables plan their own access.
+_FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+# GET endpoints that only redirect or end the session.
+SKIP_ENDPOINTS = {'static', 'logout', 'index'}
+
+# Scans that are the point of the page, per endpoint: the prerequisite
+# picker on the course forms lists every course, and the course page loads
+# the whole prerequisite graph once per process and version.
+ALLOWED_SCANS = {
+    'create_course': {'course'},
+    'edit_course': {'course'},
+    'course_detail': {'prerequisites', 'archived_prerequisites'},
+}
+
+_LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+class QueryPlan:
+    """``EXPLAIN QUERY PLAN`` output for one statement shape, and where it was issued from."""
+
+    def __init__(self, statement, plan):
+        self.statement = statement
+        self.plan = plan
+        self.endpoints = set()
+
+    @property
+    def full_scans(self):
+        """Large tables this statement reads without an index.
+
+        A scan in rowid order under a LIMIT stops after a page of rows and is
+        not counted; one followed by a sort has to read the whole table first.
+        """
+        if _LIMIT.search(self.statement) and not any(detail.startswith('USE TEMP B-TREE') for detail in self.plan):
+            return []
+        allowed = set.intersection(*(ALLOWED_SCANS.get(endpoint, set()) for endpoint in self.endpoints)) \
+            if self.endpoints else set()
+        scans = []
+        for detail in self.plan:
+            match = _FULL_SCAN.match(detail)
+            if match and match.group(1) in LARGE_TABLES and match.group(1) not in allowed:
+                scans.append(match.group(1))
+        return scans
+
+
+@contextmanager
+def capture_statements():
+    """Collect ``(statement, parameters)`` for every SELECT run inside the block, on any engine."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            seen.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield seen
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+
+def explain(statement, parameters):
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+    return [row[3] for row in rows]
+
+
+def _sample_arguments():
+    """One existing id per URL argument name, so parametrized routes can be visited."""
+    return {
+        'course_id': db.session.query(func.min(Course.id)).scalar(),
+        'term_id': db.session.query(func.min(Term.id)).scalar(),
+        'user_id': db.session.query(func.min(User.id)).scalar(),
+        'enrollment_id': db.session.query(func.min(Enrollment.id)).scalar(),
+    }
+
+
+def _get_urls():
+    arguments = _sample_arguments()
+    urls = []
+    with app.test_request_context():
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+                continue
+            values = {name: arguments.get(name) for name in rule.arguments}
+            if None in values.values():
+                continue
+            urls.append((rule.endpoint, url_for(rule.endpoint, **values)))
+    return urls
+
+
+def _crawl(urls, visitors):
+    """Request every URL as every visitor; returns ``(endpoint, statement, parameters)`` triples."""
+    issued = []
+    test_client_class = app.test_client_class
+    app.test_client_class = FlaskLoginClient
+    try:
+        for visitor in visitors:
+            client = app.test_client(user=visitor) if visitor is not None else app.test_client()
+            for endpoint, url in urls:
+                with capture_statements() as statements:
+                    client.get(url)
+                issued += [(endpoint, statement, parameters) for statement, parameters in statements]
+    finally:
+        app.test_client_class = test_client_class
+    return issued
+
+
+def collect_plans():
+    """Visit every GET route as each role and explain each distinct SELECT the routes run.
+
+    Uses whatever database the app is configured with; point ``DATABASE_URL``
+    at a copy with realistic data. Only reads are issued. Returns
+    ``QueryPlan`` objects keyed by statement shape.
+    """
+    visitors = [None] + [user for user in (User.query.filter_by(role=role).first()
+                                           for role in ('student', 'instructor', 'admin')) if user is not None]
+    urls = _get_urls()
+    # Requests reuse an app context that is already pushed, and with it
+    # `g` and the logged-in user; crawl from a thread that has none.
+    issued = []
+    crawler = threading.Thread(target=lambda: issued.extend(_crawl(urls, visitors)))
+    crawler.start()
+    crawler.join()
+
+    plans = {}
+    for endpoint, statement, parameters in issued:
+        shape = statement_shape(statement)
+        if shape not in plans:
+            plans[shape] = QueryPlan(statement, explain(statement, parameters))
+        plans[shape].endpoints.add(endpoint)
+    return plans
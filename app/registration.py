@@ -0,0 +1,265 @@
+import random
+import time
+
+from sqlalchemy import delete, insert, select, union_all, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app import db
+from app.models import ArchivedEnrollment, Course, Enrollment, WaitlistEntry
+from app.reports import record_drop
+from app.prereq_graph import archived_passes, course_titles, prereq_graph
+
+
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 0.01
+MAX_CART_SIZE = 10
+
+
+class EnrollmentError(Exception):
+    """A student-facing reason why an enrollment was refused."""
+
+    def __init__(self, message, category='danger'):
+        super().__init__(message)
+        self.message = message
+        self.category = category
+
+
+def _is_busy(exc):
+    return 'database is locked' in str(exc.orig) or 'database is busy' in str(exc.orig)
+
+
+def _passed_course_ids(user_id):
+    """Courses the student passed, in archived terms too."""
+    return set(db.session.scalars(union_all(
+        select(Enrollment.course_id).where(Enrollment.user_id == user_id, Enrollment.grade >= 10),
+        select(ArchivedEnrollment.course_id).where(ArchivedEnrollment.user_id == user_id,
+                                                   ArchivedEnrollment.grade >= 10))))
+
+
+def _check_eligibility(user_id, course):
+    if not course.term.is_active:
+        raise EnrollmentError('ثبت‌نام برای این ترم بسته است.', 'warning')
+
+    required = prereq_graph().direct_prereqs(course.id)
+    if required:
+        missing = required - _passed_course_ids(user_id)
+        if missing:
+            title = min(course_titles(missing).values())
+            raise EnrollmentError(f'شما باید ابتدا درس پیشنیاز «{title}» را بگذرانید.')
+
+    clash = Course.query.join(Enrollment).filter(
+        Enrollment.user_id == user_id,
+        Course.term_id == course.term_id,
+        Course.day_of_week == course.day_of_week,
+        Course.start_time < course.end_time,
+        Course.end_time > course.start_time).first()
+    if clash is not None:
+        raise EnrollmentError(f'تداخل زمانی با درس: {clash.title}')
+
+
+def reserve_seat(user_id, course_id):
+    """Enroll a student, taking a seat with a conditional counter update.
+
+    The capacity check and the seat increment are a single
+    ``UPDATE ... WHERE seats_taken < capacity`` so concurrent requests can
+    never oversell, and the unique (user_id, course_id) constraint catches
+    double submissions. The student's waitlist entry for the course, if
+    any, is deleted in the same transaction. The transaction is retried
+    when SQLite reports the database as locked. Returns the course on success and
+    raises ``EnrollmentError`` otherwise.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            course = db.session.get(Course, course_id)
+            if course is None:
+                raise EnrollmentError('دوره مورد نظر یافت نشد.', 'warning')
+            if db.session.query(Enrollment.id).filter_by(user_id=user_id, course_id=course_id).first():
+                raise EnrollmentError('شما قبلاً در این دوره ثبت‌نام کرده‌اید.', 'info')
+            _check_eligibility(user_id, course)
+
+            taken = db.session.execute(
+                update(Course)
+                .where(Course.id == course_id, Course.seats_taken < Course.capacity)
+                .values(seats_taken=Course.seats_taken + 1)
+                .execution_options(synchronize_session=False))
+            if taken.rowcount == 0:
+                raise EnrollmentError('ظرفیت این دوره تکمیل است.')
+            db.session.add(Enrollment(user_id=user_id, course_id=course_id))
+            db.session.execute(delete(WaitlistEntry).where(
+                WaitlistEntry.user_id == user_id, WaitlistEntry.course_id == course_id))
+            db.session.commit()
+            return course
+        except EnrollmentError:
+            db.session.rollback()
+            raise
+        except IntegrityError:
+            db.session.rollback()
+            raise EnrollmentError('شما قبلاً در این دوره ثبت‌نام کرده‌اید.', 'info')
+        except OperationalError as exc:
+            db.session.rollback()
+            if not _is_busy(exc) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def _overlaps(a, b):
+    return a.day_of_week == b.day_of_week and a.start_time < b.end_time and b.start_time < a.end_time
+
+
+class CartItem:
+    """Outcome of one course in a registration cart.
+
+    ``status`` is ``'enrolled'``, ``'failed'`` (this course was refused) or
+    ``'blocked'`` (it was fine, but another course in the cart failed).
+    """
+
+    def __init__(self, course_id, title=None):
+        self.course_id = course_id
+        self.title = title
+        self.status = 'blocked'
+        self.message = None
+
+    def fail(self, message):
+        self.status = 'failed'
+        self.message = message
+
+    def to_dict(self):
+        return {'course_id': self.course_id, 'title': self.title,
+                'status': self.status, 'message': self.message}
+
+
+def _validate_cart(user_id, course_ids):
+    items = [CartItem(course_id) for course_id in course_ids]
+    courses = {c.id: c for c in Course.query.options(db.joinedload(Course.term)).filter(Course.id.in_(course_ids))}
+
+    graph = prereq_graph()
+    required = {course_id: graph.direct_prereqs(course_id) for course_id in courses}
+
+    enrolled_ids, passed_ids, schedule = set(), set(), []
+    for course, grade in db.session.query(Course, Enrollment.grade).join(
+            Enrollment, Enrollment.course_id == Course.id).filter(Enrollment.user_id == user_id):
+        enrolled_ids.add(course.id)
+        if grade is not None and grade >= 10:
+            passed_ids.add(course.id)
+        schedule.append(course)
+    # Grades of prerequisites in archived terms are in the archive.
+    unpassed = set().union(*required.values()) - passed_ids
+    if unpassed:
+        passed_ids.update(course_id for _, course_id in archived_passes([user_id], unpassed))
+
+    accepted, unmet = [], {}
+    for item in items:
+        course = courses.get(item.course_id)
+        if course is None:
+            item.fail('دوره مورد نظر یافت نشد.')
+            continue
+        item.title = course.title
+        if any(other.id == course.id for other in accepted):
+            item.fail('این دوره بیش از یک بار در سبد انتخاب شده است.')
+        elif not course.term.is_active:
+            item.fail('ثبت‌نام برای این ترم بسته است.')
+        elif course.id in enrolled_ids:
+            item.fail('شما قبلاً در این دوره ثبت‌نام کرده‌اید.')
+        elif course.capacity is None or course.seats_taken >= course.capacity:
+            item.fail('ظرفیت این دوره تکمیل است.')
+        else:
+            missing = required[course.id] - passed_ids
+            clash = next((other for other in schedule + accepted
+                          if other.term_id == course.term_id and _overlaps(other, course)), None)
+            if missing:
+                item.fail(None)
+                unmet[item] = missing
+            elif clash is not None:
+                item.fail(f'تداخل زمانی با درس: {clash.title}')
+            else:
+                accepted.append(course)
+
+    if unmet:
+        titles = course_titles(set().union(*unmet.values()))
+        for item, missing in unmet.items():
+            item.fail(f'شما باید ابتدا درس پیشنیاز «{min(titles[i] for i in missing)}» را بگذرانید.')
+    return items
+
+
+def enroll_cart(user_id, course_ids):
+    """Enroll a student in several courses at once, all or nothing.
+
+    Courses and the student's existing enrollments are loaded in a fixed
+    number of queries whatever the cart size, prerequisites come from the
+    in-memory graph, and eligibility,
+    including time conflicts between courses in the cart, is checked in
+    memory. Seats for the whole cart are then taken with one conditional
+    ``UPDATE``, the enrollments inserted with one ``executemany`` and the
+    student's waitlist entries for those courses deleted with one DELETE.
+    Returns a list of ``CartItem`` in the order the ids were given.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            items = _validate_cart(user_id, course_ids)
+            if any(item.status == 'failed' for item in items):
+                db.session.rollback()
+                return items
+
+            taken = db.session.execute(
+                update(Course)
+                .where(Course.id.in_(course_ids), Course.seats_taken < Course.capacity)
+                .values(seats_taken=Course.seats_taken + 1)
+                .execution_options(synchronize_session=False))
+            if taken.rowcount != len(course_ids):
+                # Give back the seats this cart did take before reading which courses are full;
+                # the read opens no write transaction, so nothing is left to roll back after it.
+                db.session.rollback()
+                full = {course_id for (course_id,) in db.session.query(Course.id).filter(
+                    Course.id.in_(course_ids), Course.seats_taken >= Course.capacity)}
+                for item in items:
+                    if item.course_id in full:
+                        item.fail('ظرفیت این دوره تکمیل است.')
+                return items
+
+            db.session.execute(insert(Enrollment), [
+                {'user_id': user_id, 'course_id': course_id, 'status': 'enrolled'} for course_id in course_ids])
+            db.session.execute(delete(WaitlistEntry).where(
+                WaitlistEntry.user_id == user_id, WaitlistEntry.course_id.in_(course_ids)))
+            db.session.commit()
+            for item in items:
+                item.status = 'enrolled'
+            return items
+        except IntegrityError:
+            db.session.rollback()
+            items = [CartItem(course_id) for course_id in course_ids]
+            for item in items:
+                item.fail('شما قبلاً در یکی از این دوره‌ها ثبت‌نام کرده‌اید.')
+            return items
+        except OperationalError as exc:
+            db.session.rollback()
+            if not _is_busy(exc) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def release_seat(enrollment):
+    """Delete an enrollment and give its seat back, without committing; counts as a drop in the reports."""
+    record_drop(enrollment.course_id)
+    db.session.execute(
+        update(Course)
+        .where(Course.id == enrollment.course_id, Course.seats_taken > 0)
+        .values(seats_taken=Course.seats_taken - 1)
+        .execution_options(synchronize_session=False))
+    db.session.delete(enrollment)
+
+
+def recount_seats(course_ids=None):
+    """Rebuild ``seats_taken`` from the enrollment table and commit.
+
+    The counter is kept up to date by ``reserve_seat`` and ``release_seat``;
+    this is only needed after enrollments are changed behind their back
+    (manual SQL, imports). Returns the number of courses updated.
+    """
+    enrolled = db.session.query(db.func.count(Enrollment.id)).filter(
+        Enrollment.course_id == Course.id).scalar_subquery()
+    stmt = update(Course).values(seats_taken=enrolled).execution_options(synchronize_session=False)
+    if course_ids is not None:
+        stmt = stmt.where(Course.id.in_(course_ids))
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
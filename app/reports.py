@@ -0,0 +1,179 @@
+from sqlalchemy import case, delete, event, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.forms import DAY_CHOICES
+from app.models import (ArchivedCourse, Course, CourseRollup, Enrollment, InstructorRollup, RollupStale, SlotRollup,
+                        Term, TermRollup, User)
+
+
+# Inclusive grade ranges counted by `band_0` .. `band_4`; 10 is the pass mark.
+GRADE_BANDS = [(0, 9), (10, 11), (12, 13), (14, 16), (17, 20)]
+PASSING_GRADE = 10
+
+# Every write that can change a rollup marks the course stale, whichever
+# code path or bulk statement it comes from. Seat counter updates are left
+# out: they always come with an enrollment insert or delete. Migration
+# 4f8d2c6a9e31 installs the same triggers on existing databases.
+SCHEMA = (
+    "CREATE TRIGGER rollup_enrollment_ai AFTER INSERT ON enrollment BEGIN "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.course_id); END",
+    "CREATE TRIGGER rollup_enrollment_ad AFTER DELETE ON enrollment BEGIN "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.course_id); END",
+    "CREATE TRIGGER rollup_enrollment_au AFTER UPDATE OF grade, course_id ON enrollment BEGIN "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.course_id); "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.course_id); END",
+    "CREATE TRIGGER rollup_course_ai AFTER INSERT ON course BEGIN "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.id); END",
+    "CREATE TRIGGER rollup_course_ad AFTER DELETE ON course BEGIN "
+    "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.id); END",
+    "CREATE TRIGGER rollup_course_au AFTER UPDATE OF term_id, instructor_id, capacity, day_of_week, start_time "
+    "ON course BEGIN INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.id); END",
+)
+
+# Course ids per statement when refreshing; keeps IN lists well below SQLite's parameter limit.
+_CHUNK = 500
+
+_DAY_ORDER = {day: index for index, (day, _) in enumerate(DAY_CHOICES)}
+
+_TOTALS = ['enrolled', 'capacity', 'graded', 'passed', 'grade_total', 'drops'] + [
+    f'band_{i}' for i in range(len(GRADE_BANDS))]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_triggers(target, connection, **kw):
+    # After every table exists; lets db.create_all() install the triggers too.
+    if connection.dialect.name == 'sqlite':
+        for statement in SCHEMA:
+            connection.exec_driver_sql(statement)
+
+
+def record_drop(course_id):
+    """Count a student dropping a course, without committing; drops leave no other trace."""
+    term_id = select(Course.term_id).where(Course.id == course_id).scalar_subquery()
+    stmt = sqlite_insert(CourseRollup).values(course_id=course_id, term_id=term_id, drops=1)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['course_id'], set_={'drops': CourseRollup.drops + 1}))
+
+
+def _refresh_courses(course_ids):
+    """Recompute the course rollups of ``course_ids`` from the course and enrollment tables.
+
+    Rollups of archived courses are left as they were when the term was
+    archived (app/retention.py); their drops exist nowhere else.
+    """
+    db.session.execute(delete(CourseRollup).where(
+        CourseRollup.course_id.in_(course_ids), CourseRollup.course_id.not_in(select(Course.id)),
+        CourseRollup.course_id.not_in(select(ArchivedCourse.id))))
+    db.session.execute(insert(CourseRollup).prefix_with('OR IGNORE').from_select(
+        ['course_id', 'term_id'], select(Course.id, Course.term_id).where(Course.id.in_(course_ids))))
+    db.session.execute(
+        update(CourseRollup)
+        .values(term_id=Course.term_id, instructor_id=Course.instructor_id, day_of_week=Course.day_of_week,
+                start_time=Course.start_time, capacity=func.coalesce(Course.capacity, 0),
+                **{column: 0 for column in _TOTALS if column not in ('capacity', 'drops')})
+        .where(CourseRollup.course_id == Course.id, Course.id.in_(course_ids))
+        .execution_options(synchronize_session=False))
+
+    grade = Enrollment.grade
+    totals = select(
+        Enrollment.course_id.label('course_id'),
+        func.count().label('enrolled'),
+        func.count(grade).label('graded'),
+        func.coalesce(func.sum(case((grade >= PASSING_GRADE, 1), else_=0)), 0).label('passed'),
+        func.coalesce(func.sum(grade), 0).label('grade_total'),
+        *(func.coalesce(func.sum(case((grade.between(low, high), 1), else_=0)), 0).label(f'band_{i}')
+          for i, (low, high) in enumerate(GRADE_BANDS)),
+    ).where(Enrollment.course_id.in_(course_ids)).group_by(Enrollment.course_id).subquery()
+    columns = [column for column in _TOTALS if column not in ('capacity', 'drops')]
+    db.session.execute(
+        update(CourseRollup)
+        .values(**{column: totals.c[column] for column in columns})
+        .where(CourseRollup.course_id == totals.c.course_id)
+        .execution_options(synchronize_session=False))
+
+
+def _summed(*keys):
+    return [*keys, func.count(), *(func.sum(getattr(CourseRollup, column)) for column in _TOTALS)]
+
+
+def _refresh_terms(term_ids):
+    """Rebuild the instructor, slot and term rollups of ``term_ids`` from the course rollups."""
+    columns = ['courses'] + _TOTALS
+    for model, keys in [(InstructorRollup, ['instructor_id']), (SlotRollup, ['day_of_week', 'start_time']),
+                        (TermRollup, [])]:
+        db.session.execute(delete(model).where(model.term_id.in_(term_ids)))
+        group = [CourseRollup.term_id] + [getattr(CourseRollup, key) for key in keys]
+        query = select(*_summed(*group)).where(CourseRollup.term_id.in_(term_ids)).group_by(*group)
+        if model is InstructorRollup:
+            query = query.where(CourseRollup.instructor_id.isnot(None))
+        db.session.execute(insert(model).from_select(['term_id'] + keys + columns, query))
+
+
+def refresh(full=False):
+    """Bring the rollups up to date, without committing; returns the number of courses recomputed.
+
+    Normally only the courses the triggers marked stale are recomputed,
+    with a handful of set-based statements per 500 courses, and then the
+    per-term rollups of the terms they belong to. ``full`` recomputes
+    every live course; drop counts survive either way, they cannot be
+    derived, and archived courses keep their rollups.
+    """
+    if full:
+        course_ids = sorted({course_id for (course_id,) in db.session.query(Course.id)}
+                            | {course_id for (course_id,) in db.session.query(CourseRollup.course_id)})
+    else:
+        course_ids = [course_id for (course_id,) in db.session.query(RollupStale.course_id)]
+    if not course_ids:
+        return 0
+
+    term_ids = set()
+    for start in range(0, len(course_ids), _CHUNK):
+        chunk = course_ids[start:start + _CHUNK]
+        # Old terms too: a course moved to another term or deleted changes both.
+        term_ids.update(term_id for (term_id,) in db.session.query(CourseRollup.term_id).filter(
+            CourseRollup.course_id.in_(chunk)).distinct())
+        _refresh_courses(chunk)
+        term_ids.update(term_id for (term_id,) in db.session.query(CourseRollup.term_id).filter(
+            CourseRollup.course_id.in_(chunk)).distinct())
+        db.session.execute(delete(RollupStale).where(RollupStale.course_id.in_(chunk)))
+    if full:
+        term_ids.update(term_id for (term_id,) in db.session.query(Term.id))
+    _refresh_terms(sorted(term_ids))
+    return len(course_ids)
+
+
+def pending():
+    """Number of courses changed since the last refresh."""
+    return db.session.query(func.count(RollupStale.course_id)).scalar()
+
+
+def term_report(term_id, top=10):
+    """Everything the reports page shows for one term, read from the rollups only; archived terms included."""
+    courses = db.session.query(CourseRollup, func.coalesce(Course.title, ArchivedCourse.title)).outerjoin(
+        Course, Course.id == CourseRollup.course_id).outerjoin(
+        ArchivedCourse, ArchivedCourse.id == CourseRollup.course_id)
+    return {
+        'term': db.session.get(TermRollup, term_id),
+        'slots': sorted(SlotRollup.query.filter_by(term_id=term_id),
+                        key=lambda slot: (_DAY_ORDER.get(slot.day_of_week, len(_DAY_ORDER)), slot.start_time)),
+        'instructors': db.session.query(InstructorRollup, User.username).join(
+            User, User.id == InstructorRollup.instructor_id).filter(InstructorRollup.term_id == term_id).order_by(
+            InstructorRollup.enrolled.desc()).limit(top).all(),
+        'popular': courses.filter(CourseRollup.term_id == term_id).order_by(CourseRollup.enrolled.desc()).limit(top).all(),
+        'lowest_pass': courses.filter(CourseRollup.term_id == term_id, CourseRollup.graded > 0).order_by(
+            CourseRollup.passed * 1.0 / CourseRollup.graded).limit(top).all(),
+    }
+
+
+def headline_counts():
+    """Students, instructors, courses and terms, in one statement."""
+    def count(query):
+        return query.with_only_columns(func.count()).scalar_subquery()
+    row = db.session.query(
+        count(select(User.id).where(User.role == 'student')),
+        count(select(User.id).where(User.role == 'instructor')),
+        count(select(Course.id)),
+        count(select(Term.id)),
+    ).one()
+    return dict(zip(('student_count', 'instructor_count', 'course_count', 'term_count'), row))
@@ -0,0 +1,120 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app import db
+from app import gpa as gpa_stats
+from app import reports
+from app.caching import catalog_changed
+from app.models import (ArchivedCourse, ArchivedEnrollment, CacheVersion, Course, Enrollment, RollupStale, Term,
+                        archived_prerequisites, prerequisites)
+from app.prereq_graph import VERSION_KEY as PREREQS_KEY, prereqs_changed
+
+
+class RetentionResult:
+    def __init__(self, terms, courses, enrollments, prerequisites, elapsed):
+        self.terms = terms
+        self.courses = courses
+        self.enrollments = enrollments
+        self.prerequisites = prerequisites
+        self.elapsed = elapsed
+
+
+def _counts(courses):
+    """Courses and enrollments selected by the ``courses`` id query."""
+    return (db.session.query(func.count()).select_from(Course).filter(Course.id.in_(courses)).scalar(),
+            db.session.query(func.count()).select_from(Enrollment).filter(Enrollment.course_id.in_(courses)).scalar())
+
+
+def delete_course(course_id):
+    """Delete a course with its enrollments, waitlist and prerequisite links, without committing.
+
+    One DELETE; the rest goes with it through ON DELETE CASCADE, and the
+    triggers on the cascaded rows keep the search index and report rollups
+    in step. The aggregates of the students who had a grade in it are
+    rebuilt.
+    """
+    graded = gpa_stats.graded_students(course_id)
+    db.session.execute(delete(Course).where(Course.id == course_id))
+    gpa_stats.rebuild(graded)
+    prereqs_changed(course_id, None)
+    catalog_changed()
+
+
+def delete_term(term_id):
+    """Delete a term and everything in it, archived courses included, without committing.
+
+    Its grades are first taken out of the students' overall aggregates;
+    then one DELETE of the term cascades to its courses and, from there,
+    to their enrollments, waitlists and prerequisite links, links from
+    other terms' courses included. The active term cannot be deleted, nor
+    a term that courses of the active term still need as prerequisites.
+    Raises ``ValueError`` with a user-facing message. Returns a
+    ``RetentionResult``.
+    """
+    started = time.perf_counter()
+    term = db.session.get(Term, term_id)
+    if term.is_active:
+        raise ValueError('ترم فعال را نمی‌توان حذف کرد؛ ابتدا آن را غیرفعال کنید.')
+    active = select(Course.id).join(Term, Term.id == Course.term_id).where(Term.is_active).correlate(None)
+    needed = sum(db.session.query(func.count()).select_from(links).join(
+        course, course.id == links.c.prerequisite_id).filter(
+        course.term_id == term_id, links.c.course_id.in_(active)).scalar()
+        for links, course in [(prerequisites, Course), (archived_prerequisites, ArchivedCourse)])
+    if needed:
+        raise ValueError(f'دوره‌های ترم فعال هنوز {needed} پیشنیاز در این ترم دارند.')
+    courses, enrollments = _counts(select(Course.id).where(Course.term_id == term_id))
+    archived = db.session.query(func.count(ArchivedCourse.id.distinct()), func.count(ArchivedEnrollment.id)).outerjoin(
+        ArchivedEnrollment, ArchivedEnrollment.course_id == ArchivedCourse.id).filter(
+        ArchivedCourse.term_id == term_id).one()
+    gpa_stats.forget_term(term_id)
+    # The next report refresh drops the rollups archiving kept; the cascade below marks the live courses.
+    db.session.execute(insert(RollupStale).prefix_with('OR IGNORE').from_select(
+        ['course_id'], select(ArchivedCourse.id).where(ArchivedCourse.term_id == term_id)))
+    db.session.execute(delete(Term).where(Term.id == term_id))
+    CacheVersion.bump(PREREQS_KEY)
+    catalog_changed()
+    return RetentionResult(1, courses + archived[0], enrollments + archived[1], 0, time.perf_counter() - started)
+
+
+def archive_terms(term_ids):
+    """Move past terms' courses and enrollments, grades included, to the archive tables, without committing.
+
+    ``INSERT ... SELECT`` statements copy them out, with the prerequisite
+    links courses of other terms have to them, and one DELETE removes
+    them from the hot tables, cascading to waitlists and the old links;
+    the terms stay, stamped ``archived_at``. Archived courses keep their
+    ids, so the kept links and the archived grades go on deciding who may
+    enroll. Report rollups are brought up to date first and then kept as
+    they are. Per-term and overall GPAs do not change, and transcripts
+    read the archive alongside. Archiving refuses the active term. Raises
+    ``ValueError`` with a user-facing message. Returns a
+    ``RetentionResult``.
+    """
+    started = time.perf_counter()
+    term_ids = list(term_ids)
+    if db.session.query(Term.id).filter(Term.id.in_(term_ids), Term.is_active).first() is not None:
+        raise ValueError('ترم فعال را نمی‌توان بایگانی کرد.')
+    courses = select(Course.id).where(Course.term_id.in_(term_ids))
+    course_count, enrollment_count = _counts(courses)
+    reports.refresh()
+
+    columns = ['id', 'term_id', 'title', 'description', 'credits', 'day_of_week', 'start_time', 'end_time',
+               'capacity', 'instructor_id']
+    db.session.execute(insert(ArchivedCourse).from_select(
+        columns, select(*(getattr(Course, column) for column in columns)).where(Course.term_id.in_(term_ids))))
+    columns = ['id', 'user_id', 'course_id', 'status', 'grade']
+    db.session.execute(insert(ArchivedEnrollment).from_select(
+        columns, select(*(getattr(Enrollment, column) for column in columns)).where(
+            Enrollment.course_id.in_(courses))))
+    kept = db.session.execute(insert(archived_prerequisites).from_select(
+        ['course_id', 'prerequisite_id'],
+        select(prerequisites.c.course_id, prerequisites.c.prerequisite_id).where(
+            prerequisites.c.prerequisite_id.in_(courses), prerequisites.c.course_id.not_in(courses)))).rowcount
+    db.session.execute(delete(Course).where(Course.term_id.in_(term_ids)))
+    db.session.execute(update(Term).where(Term.id.in_(term_ids)).values(archived_at=datetime.utcnow()))
+
+    CacheVersion.bump(PREREQS_KEY)
+    catalog_changed()
+    return RetentionResult(len(term_ids), course_count, enrollment_count, kept, time.perf_counter() - started)
@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, insert, literal, select, text
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.caching import catalog_changed
+from app.forms import DAY_CHOICES
+from app.models import ArchivedCourse, CacheVersion, Course, Term, User, archived_prerequisites, prerequisites
+from app.prereq_graph import VERSION_KEY as PREREQS_KEY
+
+
+_DAYS = {day for day, _ in DAY_CHOICES}
+
+
+class RolloverMapping:
+    """Changes applied to the copies: instructor usernames, and time slots by day and start time.
+
+    ``instructors`` maps a username to the one taking over their courses;
+    ``slots`` maps ``(day, start_time)`` to the new ``(day, start_time)``,
+    and moved meetings keep their length.
+    """
+
+    def __init__(self, instructors=None, slots=None):
+        self.instructors = instructors or {}
+        self.slots = slots or {}
+
+
+class RolloverResult:
+    def __init__(self, term, courses, prerequisites, elapsed):
+        self.term = term
+        self.courses = courses
+        self.prerequisites = prerequisites
+        self.elapsed = elapsed
+
+
+def _slot(label, value):
+    """``"Saturday 08:00"`` as ``('Saturday', time(8, 0))``."""
+    try:
+        day, start = str(value).split()
+        start = datetime.strptime(start, '%H:%M').time()
+    except ValueError:
+        raise ValueError(f'{label}: زمان باید به شکل «Saturday 08:00» باشد.')
+    if day not in _DAYS:
+        raise ValueError(f'{label}: روز «{day}» معتبر نیست.')
+    return day, start
+
+
+def _mapping(entries):
+    """Build a mapping from ``(label, kind, old, new)`` entries; ``kind`` is ``instructor`` or ``slot``."""
+    mapping = RolloverMapping()
+    for label, kind, old, new in entries:
+        if kind == 'instructor':
+            mapping.instructors[old] = new
+        elif kind == 'slot':
+            mapping.slots[_slot(label, old)] = _slot(label, new)
+        else:
+            raise ValueError(f'{label}: نوع «{kind}» باید instructor یا slot باشد.')
+    return mapping
+
+
+def mapping_from_csv(stream):
+    """Rows of ``kind,from,to``: ``instructor,alice,bob`` or ``slot,Saturday 08:00,Sunday 10:00``."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames or not {'kind', 'from', 'to'} <= {name.strip() for name in reader.fieldnames}:
+        raise ValueError('فایل باید ستون‌های kind، from و to را داشته باشد.')
+    return _mapping((f'سطر {line}', (row.get('kind') or '').strip(), (row.get('from') or '').strip(),
+                     (row.get('to') or '').strip()) for line, row in enumerate(reader, start=2))
+
+
+def mapping_from_json(stream):
+    """``{"instructors": {"alice": "bob"}, "slots": {"Saturday 08:00": "Sunday 10:00"}}``."""
+    data = json.load(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    if not isinstance(data, dict) or not all(isinstance(data.get(key, {}), dict) for key in ('instructors', 'slots')):
+        raise ValueError('فایل JSON باید شیئی با کلیدهای instructors و slots باشد.')
+    return _mapping([(f'استاد {old}', 'instructor', old, new) for old, new in data.get('instructors', {}).items()]
+                    + [(f'زمان {old}', 'slot', old, new) for old, new in data.get('slots', {}).items()])
+
+
+def mapping_from_file(storage):
+    """Parse an uploaded or opened file by its extension."""
+    if storage.filename.lower().endswith('.json'):
+        return mapping_from_json(storage.stream)
+    return mapping_from_csv(storage.stream)
+
+
+def _instructor_ids(usernames):
+    found = dict(db.session.query(User.username, User.id).filter(
+        User.username.in_(usernames), User.role == 'instructor'))
+    missing = sorted(set(usernames) - set(found))
+    if missing:
+        raise ValueError(f'استادی با نام کاربری {"، ".join(missing)} وجود ندارد.')
+    return found
+
+
+def _shifted(end, start, new_start):
+    """``end`` moved by as much as ``start`` moves to ``new_start``."""
+    day = datetime(2000, 1, 1)
+    return (datetime.combine(day, new_start) + (datetime.combine(day, end) - datetime.combine(day, start))).time()
+
+
+def rollover(source_term_id, name, mapping=None, activate=False):
+    """Copy every course of a term, with its prerequisites, into a new term named ``name``; does not commit.
+
+    Courses are copied with one ``INSERT ... SELECT`` that numbers each
+    copy as its original's id plus a fixed offset past every id handed
+    out, deleted and archived courses included, so two more
+    ``INSERT ... SELECT`` statements remap the prerequisite links by
+    adding the same offset: links between courses of the source term
+    point to the copies, links to courses of other terms, archived ones
+    included, are kept. Seats start empty. Instructor and time slot
+    changes from ``mapping`` become ``CASE`` expressions in the copy.
+    Raises ``ValueError`` with a user-facing message before writing
+    anything if the name is taken or the mapping names unknown
+    instructors. Returns a ``RolloverResult``.
+    """
+    started = time.perf_counter()
+    mapping = mapping or RolloverMapping()
+    if db.session.query(Term.id).filter_by(name=name).first() is not None:
+        raise ValueError(f'ترمی با نام «{name}» وجود دارد.')
+    ids = _instructor_ids(set(mapping.instructors) | set(mapping.instructors.values()))
+
+    instructor_id = Course.instructor_id
+    if mapping.instructors:
+        instructor_id = case({ids[old]: ids[new] for old, new in mapping.instructors.items()},
+                             value=Course.instructor_id, else_=Course.instructor_id)
+    day, start_time, end_time = Course.day_of_week, Course.start_time, Course.end_time
+    days, starts, ends = [], [], []
+    for old_day, old_start, old_end in db.session.query(
+            Course.day_of_week, Course.start_time, Course.end_time).filter_by(term_id=source_term_id).distinct():
+        if (old_day, old_start) in mapping.slots:
+            new_day, new_start = mapping.slots[old_day, old_start]
+            match = and_(Course.day_of_week == old_day, Course.start_time == old_start, Course.end_time == old_end)
+            days.append((match, literal(new_day)))
+            starts.append((match, literal(new_start, Course.start_time.type)))
+            ends.append((match, literal(_shifted(old_end, old_start, new_start), Course.end_time.type)))
+    if days:
+        day = case(*days, else_=Course.day_of_week)
+        start_time = case(*starts, else_=Course.start_time)
+        end_time = case(*ends, else_=Course.end_time)
+
+    if activate:
+        Term.query.update({'is_active': False}, synchronize_session=False)
+    term = Term(name=name, is_active=activate)
+    db.session.add(term)
+    db.session.flush()
+
+    # Every copy gets its original's id plus one offset, past the largest id ever handed out: explicit
+    # ids bypass AUTOINCREMENT, so take archived courses and the sequence, which remembers deleted ones.
+    first = db.session.query(func.min(Course.id)).filter(Course.term_id == source_term_id).scalar()
+    offset = 0
+    if first is not None:
+        last = max(db.session.query(func.max(Course.id)).scalar(),
+                   db.session.query(func.max(ArchivedCourse.id)).scalar() or 0,
+                   db.session.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'course'")).scalar() or 0)
+        offset = last - first + 1
+    columns = {
+        'id': Course.id + offset, 'title': Course.title, 'description': Course.description,
+        'credits': Course.credits, 'day_of_week': day, 'start_time': start_time, 'end_time': end_time,
+        'capacity': Course.capacity, 'seats_taken': literal(0),
+        'updated_at': literal(datetime.utcnow(), Course.updated_at.type),
+        'instructor_id': instructor_id, 'term_id': literal(term.id),
+    }
+    copied = db.session.execute(insert(Course).from_select(
+        list(columns), select(*columns.values()).where(Course.term_id == source_term_id))).rowcount
+
+    prereq = aliased(Course)
+    linked = db.session.execute(insert(prerequisites).from_select(
+        ['course_id', 'prerequisite_id'],
+        select(prerequisites.c.course_id + offset,
+               case((prereq.term_id == source_term_id, prerequisites.c.prerequisite_id + offset),
+                    else_=prerequisites.c.prerequisite_id)).select_from(Course).join(
+            prerequisites, prerequisites.c.course_id == Course.id).join(
+            prereq, prereq.id == prerequisites.c.prerequisite_id).where(
+            Course.term_id == source_term_id))).rowcount
+    linked += db.session.execute(insert(archived_prerequisites).from_select(
+        ['course_id', 'prerequisite_id'],
+        select(archived_prerequisites.c.course_id + offset, archived_prerequisites.c.prerequisite_id).select_from(
+            Course).join(archived_prerequisites, archived_prerequisites.c.course_id == Course.id).where(
+            Course.term_id == source_term_id))).rowcount
+
+    CacheVersion.bump(PREREQS_KEY)
+    catalog_changed()
+    return RolloverResult(term, copied, linked, time.perf_counter() - started)
@@ -1,13 +1,30 @@
-from flask import render_template, flash, redirect, url_for, request, abort
+from flask import render_template, flash, redirect, url_for, request, abort, jsonify, make_response
 from flask_login import current_user, login_user, logout_user, login_required
 from datetime import timedelta
+import hmac
 import re
-from sqlalchemy import func, desc
 
 from app import app, db
-from app.forms import (LoginForm, CourseForm, EditProfileForm, TermForm,
-                       GradeForm, AdminCreateUserForm, ChangeRoleForm)
-from app.models import User, Course, Enrollment, Term
+from app.forms import (LoginForm, CourseForm, EditProfileForm, TermForm, TermRolloverForm,
+                       GradeForm, AdminCreateUserForm, ChangeRoleForm, UserImportForm,
+                       BulkGradeForm, GradeUploadForm, CourseSearchForm, DAY_CHOICES)
+from app.caching import cached_fragment, catalog_changed, catalog_stamp, conditional_page, latest, page_etag
+from app.grading import apply_grades, rows_from_csv, rows_from_grid
+from app.models import (User, Course, Enrollment, Term, StudentStats, StudentTermStats, ArchivedCourse,
+                        ArchivedEnrollment)
+from app import gpa as gpa_stats
+from app import exports, metrics, reports, retention, rollover
+from app.prereq_graph import PrereqCycleError, check_prereqs, prereq_chain, prereqs_changed
+from app.search import CourseSearch
+from app.registration import EnrollmentError, MAX_CART_SIZE, reserve_seat, release_seat, enroll_cart
+from app.schedule import ics, week_schedule
+from app.pagination import keyset_paginate
+from app.passwords import HashingBusy, needs_rehash
+from app.sql_stats import query_budget
+from app.sqlite_profile import read_only
+from app.user_cache import users_changed
+from app.user_import import MAX_REJECTS_SHOWN, import_users, rows_from_file
+from app.waitlist import join_waitlist, leave_waitlist, waitlist_position, promotion_worker
 
 
 @app.route('/')
@@ -22,26 +39,81 @@ def home():
     return render_template('home.html', title='خوش آمدید')
 
 @app.route('/courses')
+@read_only
+@query_budget(6)
 def courses():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     active_term = Term.query.filter_by(is_active=True).first()
-    pagination = None
     if not active_term:
         flash('در حال حاضر هیچ ترم فعالی برای ثبت‌نام وجود ندارد.', 'warning')
-        all_courses = []
-    else:
-        pagination = Course.query.filter_by(term_id=active_term.id).options(db.joinedload(Course.instructor)).order_by(Course.title).paginate(page=page, per_page=6, error_out=False)
-        all_courses = pagination.items
-    enrollment_counts = {e.course_id: e.count for e in db.session.query(Enrollment.course_id, func.count(Enrollment.course_id).label('count')).group_by(Enrollment.course_id).all()}
-    student_enrollments_ids = {e.course_id for e in current_user.enrollments} if current_user.is_authenticated and current_user.role == 'student' else set()
-    return render_template('courses.html', title='لیست دوره‌ها', pagination=pagination, courses=all_courses, enrollment_counts=enrollment_counts, student_enrollments_ids=student_enrollments_ids, active_term=active_term)
+        return render_template('courses.html', title='لیست دوره‌ها', pagination=None, courses=[], cards={},
+                               student_enrollments_ids=set(), active_term=None)
+    version, catalog_modified = catalog_stamp()
+    pagination = keyset_paginate(
+        Course.query.filter_by(term_id=active_term.id).options(db.joinedload(Course.instructor)),
+        [(Course.title, False), (Course.id, False)], key=lambda c: (c.title, c.id), cursor=cursor, per_page=6)
+    all_courses = pagination.items
+    student_enrollments_ids = set()
+    if all_courses and current_user.is_authenticated and current_user.role == 'student':
+        student_enrollments_ids = {course_id for (course_id,) in db.session.query(Enrollment.course_id).filter(Enrollment.user_id == current_user.id, Enrollment.course_id.in_([course.id for course in all_courses]))}
+
+    etag = page_etag(version, active_term.id, cursor, [(course.id, course.updated_at) for course in all_courses],
+                     sorted(student_enrollments_ids))
+    last_modified = latest(catalog_modified, *(course.updated_at for course in all_courses))
+
+    def render():
+        cards = {course.id: cached_fragment(('card', course.id, course.updated_at, version, active_term.id),
+                                            lambda course=course: render_template('_course_card.html', course=course))
+                 for course in all_courses}
+        return render_template('courses.html', title='لیست دوره‌ها', pagination=pagination, courses=all_courses, cards=cards,
+                               student_enrollments_ids=student_enrollments_ids, active_term=active_term)
+    return conditional_page(etag, last_modified, render)
+
+@app.route('/courses/search')
+@read_only
+@query_budget(8)
+def course_search():
+    form = CourseSearchForm(request.args)
+    active_term = Term.query.filter_by(is_active=True).first()
+    pagination = facets = None
+    if not active_term:
+        flash('در حال حاضر هیچ ترم فعالی برای ثبت‌نام وجود ندارد.', 'warning')
+    elif form.validate():
+        search = CourseSearch(
+            active_term.id, text=form.q.data, days=form.days.data, credits=form.credits.data,
+            starts_after=form.starts_after.data, ends_before=form.ends_before.data,
+            instructor_id=form.instructor.data.id if form.instructor.data else None,
+            free_seats=form.free_seats.data)
+        pagination = search.results(cursor=request.args.get('cursor'), per_page=12)
+        facets = search.facets()
+    search_args = {key: values for key, values in request.args.lists() if key != 'cursor'}
+    return render_template('search.html', title='جستجوی دوره‌ها', form=form, pagination=pagination,
+                           courses=pagination.items if pagination else [], facets=facets,
+                           day_labels=dict(DAY_CHOICES), search_args=search_args, active_term=active_term)
 
 @app.route('/course/<int:course_id>')
+@read_only
+@query_budget(9)
 def course_detail(course_id):
-    course = Course.query.get_or_404(course_id)
-    enrollment_count = Enrollment.query.filter_by(course_id=course.id).count()
-    remaining_capacity = course.capacity - enrollment_count
-    return render_template('course_detail.html', title=course.title, course=course, remaining_capacity=remaining_capacity)
+    course = Course.query.options(db.joinedload(Course.instructor), db.joinedload(Course.term)).get_or_404(course_id)
+    version, catalog_modified = catalog_stamp()
+    remaining_capacity = course.capacity - course.seats_taken
+    position = None
+    if current_user.is_authenticated and current_user.role == 'student':
+        position = waitlist_position(current_user.id, course.id)
+
+    etag = page_etag(version, course.id, course.updated_at, position)
+    last_modified = latest(catalog_modified, course.updated_at)
+
+    def render():
+        key = (course.id, course.updated_at, version)
+        detail_main = cached_fragment(('detail', *key), lambda: render_template(
+            '_course_detail_main.html', course=course, prereqs=prereq_chain(course.id)))
+        detail_facts = cached_fragment(('facts', *key), lambda: render_template(
+            '_course_detail_facts.html', course=course, remaining_capacity=remaining_capacity))
+        return render_template('course_detail.html', title=course.title, course=course, remaining_capacity=remaining_capacity,
+                               waitlist_position=position, detail_main=detail_main, detail_facts=detail_facts)
+    return conditional_page(etag, last_modified, render)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -51,9 +123,19 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            flash('سرور در حال حاضر شلوغ است؛ چند ثانیه دیگر دوباره تلاش کنید.', 'warning')
+            response = make_response(render_template('login.html', title='ورود', form=form), 503)
+            response.headers['Retry-After'] = '5'
+            return response
+        if not valid:
             flash('نام کاربری یا رمز عبور نامعتبر است.', 'danger')
             return redirect(url_for('login'))
+        if needs_rehash(user.password_hash):
+            user.set_password(form.password.data)
+            db.session.commit()
         login_user(user, remember=form.remember_me.data)
         flash('شما با موفقیت وارد شدید!', 'success')
         return redirect(url_for('index'))
@@ -71,10 +153,14 @@ def logout():
 def profile():
     form = EditProfileForm(current_user.username, current_user.email)
     if form.validate_on_submit():
-        current_user.username = form.username.data
-        current_user.email = form.email.data
+        user = db.session.get(User, current_user.id)
+        if user.role == 'instructor' and form.username.data != user.username:
+            catalog_changed()
+        user.username = form.username.data
+        user.email = form.email.data
         if form.password.data:
-            current_user.set_password(form.password.data)
+            user.set_password(form.password.data)
+        users_changed(user.id)
         db.session.commit()
         flash('تغییرات شما با موفقیت ذخیره شد.', 'success')
         return redirect(url_for('profile'))
@@ -85,31 +171,58 @@ def profile():
 
 
 @app.route('/my_dashboard')
+@read_only
 @login_required
+@query_budget(4)
 def my_dashboard():
     if current_user.role == 'student':
-        enrolled_courses = Course.query.join(Enrollment).filter(Enrollment.user_id == current_user.id).join(Term).order_by(Term.name.desc(), Course.start_time).all()
-        return render_template('dashboard.html', title='داشبورد من', courses=enrolled_courses)
+        return render_template('dashboard.html', title='داشبورد من', schedule=week_schedule(current_user.id))
     elif current_user.role == 'admin':
         return redirect(url_for('admin_dashboard'))
     elif current_user.role == 'instructor':
         return redirect(url_for('manage_courses'))
     return redirect(url_for('index'))
 
+@app.route('/my_dashboard.ics')
+@read_only
+@login_required
+@query_budget(4)
+def export_schedule():
+    if current_user.role != 'student':
+        abort(403)
+    schedule = week_schedule(current_user.id)
+    if schedule is None:
+        abort(404)
+    response = app.response_class(ics(schedule), mimetype='text/calendar')
+    response.headers['Content-Disposition'] = f'attachment; filename="schedule-{schedule.term_id}.ics"'
+    return response
+
 @app.route('/transcript')
+@read_only
 @login_required
+@query_budget(6)
 def transcript():
     if current_user.role != 'student':
         abort(403)
-    student_enrollments = Enrollment.query.filter_by(user_id=current_user.id).join(Course).join(Term).order_by(Term.name.desc(), Course.title).all()
-    total_grade_points, total_credits, gpa = 0, 0, 0.0
-    for enrollment in student_enrollments:
-        if enrollment.grade is not None and enrollment.course.credits is not None:
-            total_grade_points += enrollment.grade * enrollment.course.credits
-            total_credits += enrollment.course.credits
-    if total_credits > 0:
-        gpa = total_grade_points / total_credits
-    return render_template('transcript.html', title='کارنامه تحصیلی', enrollments=student_enrollments, total_credits=total_credits, gpa=gpa)
+    student_enrollments = Enrollment.query.filter_by(user_id=current_user.id).join(Course).join(Term).options(db.contains_eager(Enrollment.course).contains_eager(Course.term), db.contains_eager(Enrollment.course).joinedload(Course.instructor)).order_by(Term.name.desc(), Course.title).all()
+    archived = db.session.query(Term.name, ArchivedCourse.title, ArchivedCourse.credits, User.username,
+                                ArchivedEnrollment.grade).select_from(ArchivedEnrollment).join(
+        ArchivedCourse, ArchivedCourse.id == ArchivedEnrollment.course_id).join(
+        Term, Term.id == ArchivedCourse.term_id).outerjoin(User, User.id == ArchivedCourse.instructor_id).filter(
+        ArchivedEnrollment.user_id == current_user.id).order_by(Term.name.desc(), ArchivedCourse.title).all()
+    stats = db.session.get(StudentStats, current_user.id)
+    term_stats = db.session.query(Term.name, StudentTermStats.total_credits, StudentTermStats.gpa).join(StudentTermStats).filter(StudentTermStats.user_id == current_user.id, StudentTermStats.total_credits > 0).order_by(Term.name.desc()).all()
+    total_credits, gpa = (stats.total_credits, stats.gpa) if stats else (0, 0.0)
+    return render_template('transcript.html', title='کارنامه تحصیلی', enrollments=student_enrollments, archived=archived, total_credits=total_credits, gpa=gpa, term_stats=term_stats, export_formats=exports.FORMATS)
+
+@app.route('/transcript.<any(csv, xlsx):fmt>')
+@read_only
+@login_required
+@query_budget(3)
+def export_transcript(fmt):
+    if current_user.role != 'student':
+        abort(403)
+    return exports.response(exports.transcript(current_user.id), fmt)
 
 @app.route('/enroll/<int:course_id>', methods=['POST'])
 @login_required
@@ -118,55 +231,97 @@ def enroll(course_id):
         flash('فقط دانشجویان می‌توانند در دوره‌ها ثبت‌نام کنند.', 'warning')
         return redirect(url_for('courses'))
     course_to_enroll = Course.query.get_or_404(course_id)
-    if not course_to_enroll.term.is_active:
-        flash('ثبت‌نام برای این ترم بسته است.', 'warning')
-        return redirect(url_for('courses'))
-    if Enrollment.query.filter_by(user_id=current_user.id, course_id=course_to_enroll.id).first():
-        flash('شما قبلاً در این دوره ثبت‌نام کرده‌اید.', 'info')
-        return redirect(url_for('courses'))
-    if Enrollment.query.filter_by(course_id=course_to_enroll.id).count() >= course_to_enroll.capacity:
-        flash('ظرفیت این دوره تکمیل است.', 'danger')
-        return redirect(url_for('course_detail', course_id=course_id))
-    required_prereqs = course_to_enroll.prereqs.all()
-    if required_prereqs:
-        completed_course_ids = {e.course_id for e in current_user.enrollments if e.grade is not None and e.grade >= 10}
-        for prereq in required_prereqs:
-            if prereq.id not in completed_course_ids:
-                flash(f'شما باید ابتدا درس پیشنیاز «{prereq.title}» را بگذرانید.', 'danger')
-                return redirect(url_for('course_detail', course_id=course_id))
-    student_courses_in_term = Course.query.join(Enrollment).filter(Enrollment.user_id == current_user.id, Course.term_id == course_to_enroll.term_id).all()
-    for enrolled_course in student_courses_in_term:
-        if enrolled_course.day_of_week == course_to_enroll.day_of_week and (enrolled_course.start_time < course_to_enroll.end_time and course_to_enroll.start_time < enrolled_course.end_time):
-            flash(f'تداخل زمانی با درس: {enrolled_course.title}', 'danger')
+    try:
+        reserve_seat(current_user.id, course_to_enroll.id)
+    except EnrollmentError as e:
+        flash(e.message, e.category)
+        if e.category == 'danger':
             return redirect(url_for('course_detail', course_id=course_id))
-    new_enrollment = Enrollment(user_id=current_user.id, course_id=course_to_enroll.id)
-    db.session.add(new_enrollment)
-    db.session.commit()
+        return redirect(url_for('courses'))
     flash(f'شما با موفقیت در دوره {course_to_enroll.title} ثبت‌نام شدید!', 'success')
     return redirect(url_for('courses'))
 
+@app.route('/enroll/cart', methods=['POST'])
+@login_required
+def enroll_in_cart():
+    """ثبت‌نام هم‌زمان در چند دوره؛ یا همه ثبت می‌شوند یا هیچ‌کدام."""
+    wants_json = request.is_json
+    if current_user.role != "student":
+        if wants_json:
+            abort(403)
+        flash('فقط دانشجویان می‌توانند در دوره‌ها ثبت‌نام کنند.', 'warning')
+        return redirect(url_for('courses'))
+    if wants_json:
+        course_ids = (request.get_json(silent=True) or {}).get('course_ids', [])
+    else:
+        course_ids = request.form.getlist('course_ids')
+    try:
+        course_ids = [int(course_id) for course_id in course_ids]
+    except (TypeError, ValueError):
+        abort(400)
+    if not course_ids or len(course_ids) > MAX_CART_SIZE:
+        if wants_json:
+            abort(400)
+        flash(f'لطفاً بین ۱ تا {MAX_CART_SIZE} دوره انتخاب کنید.', 'warning')
+        return redirect(url_for('courses'))
+
+    items = enroll_cart(current_user.id, course_ids)
+    enrolled = all(item.status == 'enrolled' for item in items)
+    if wants_json:
+        return jsonify(enrolled=enrolled, results=[item.to_dict() for item in items]), 200 if enrolled else 409
+    if enrolled:
+        flash('ثبت‌نام در دوره‌های زیر انجام شد: ' + '، '.join(item.title for item in items), 'success')
+    else:
+        for item in items:
+            if item.status == 'failed':
+                flash(f'{item.title or item.course_id}: {item.message}', 'danger')
+        flash('به دلیل خطاهای بالا، ثبت‌نام در هیچ‌کدام از دوره‌های انتخاب‌شده انجام نشد.', 'warning')
+    return redirect(url_for('courses'))
+
 @app.route('/unenroll/<int:course_id>', methods=['POST'])
 @login_required
 def unenroll(course_id):
     enrollment_to_delete = Enrollment.query.filter_by(user_id=current_user.id, course_id=course_id).first_or_404()
     if current_user.role != 'student':
         abort(403)
-    db.session.delete(enrollment_to_delete)
+    if enrollment_to_delete.grade is not None:
+        course = enrollment_to_delete.course
+        gpa_stats.record_grade(current_user.id, course.term_id, course.credits, enrollment_to_delete.grade, None)
+    release_seat(enrollment_to_delete)
     db.session.commit()
+    promotion_worker.notify(course_id)
     flash('ثبت‌نام شما در این دوره با موفقیت لغو شد.', 'success')
     return redirect(url_for('my_dashboard'))
 
+@app.route('/waitlist/<int:course_id>/join', methods=['POST'])
+@login_required
+def join_course_waitlist(course_id):
+    if current_user.role != 'student':
+        abort(403)
+    try:
+        position = join_waitlist(current_user.id, course_id)
+    except EnrollmentError as e:
+        flash(e.message, e.category)
+    else:
+        flash(f'شما در صف انتظار این دوره قرار گرفتید. جایگاه شما: {position}', 'success')
+    return redirect(url_for('course_detail', course_id=course_id))
+
+@app.route('/waitlist/<int:course_id>/leave', methods=['POST'])
+@login_required
+def leave_course_waitlist(course_id):
+    if current_user.role != 'student':
+        abort(403)
+    if leave_waitlist(current_user.id, course_id):
+        flash('شما از صف انتظار این دوره خارج شدید.', 'info')
+    return redirect(url_for('course_detail', course_id=course_id))
+
 
 @app.route('/admin/dashboard')
 @login_required
 def admin_dashboard():
     if current_user.role != 'admin':
         abort(403)
-    student_count = User.query.filter_by(role='student').count()
-    instructor_count = User.query.filter_by(role='instructor').count()
-    course_count = Course.query.count()
-    term_count = Term.query.count()
-    return render_template('admin_dashboard.html', title='داشبورد مدیریت', student_count=student_count, instructor_count=instructor_count, course_count=course_count, term_count=term_count)
+    return render_template('admin_dashboard.html', title='داشبورد مدیریت', **reports.headline_counts())
 
 @app.route('/admin/users', methods=['GET', 'POST'])
 @login_required
@@ -181,9 +336,34 @@ def manage_users():
         db.session.commit()
         flash('کاربر جدید با موفقیت ایجاد شد.', 'success')
         return redirect(url_for('manage_users'))
-    page = request.args.get('page', 1, type=int)
-    users_pagination = User.query.order_by(User.id).paginate(page=page, per_page=10, error_out=False)
-    return render_template('manage_users.html', title='مدیریت کاربران', users_pagination=users_pagination, form=create_form, ChangeRoleForm=ChangeRoleForm)
+    users_pagination = keyset_paginate(User.query, [(User.id, False)], key=lambda u: (u.id,), cursor=request.args.get('cursor'), per_page=10)
+    return render_template('manage_users.html', title='مدیریت کاربران', users_pagination=users_pagination, form=create_form, import_form=UserImportForm(), ChangeRoleForm=ChangeRoleForm)
+
+@app.route('/admin/users/import', methods=['POST'])
+@login_required
+def import_users_upload():
+    """ساخت گروهی کاربران از فایل CSV یا JSON."""
+    if current_user.role != 'admin':
+        abort(403)
+    form = UserImportForm()
+    if not form.validate_on_submit():
+        for messages in form.errors.values():
+            for message in messages:
+                flash(message, 'danger')
+        return redirect(url_for('manage_users'))
+    try:
+        rows = rows_from_file(form.users_file.data)
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(str(e) if isinstance(e, ValueError) else 'فایل باید با کدگذاری UTF-8 ذخیره شده باشد.', 'danger')
+        return redirect(url_for('manage_users'))
+    result = import_users(rows)
+    flash(f'{result.created} کاربر ایجاد شد و {len(result.rejects)} ردیف رد شد '
+          f'({result.rows_per_second:.0f} ردیف در ثانیه).', 'success' if result.created else 'warning')
+    for label, message in result.rejects[:MAX_REJECTS_SHOWN]:
+        flash(f'{label}: {message}', 'danger')
+    if len(result.rejects) > MAX_REJECTS_SHOWN:
+        flash(f'و {len(result.rejects) - MAX_REJECTS_SHOWN} خطای دیگر.', 'danger')
+    return redirect(url_for('manage_users'))
 
 @app.route('/admin/user/<int:user_id>/set_role', methods=['POST'])
 @login_required
@@ -197,9 +377,10 @@ def set_user_role(user_id):
             flash('شما نمی‌توانید نقش خودتان را تغییر دهید.', 'danger')
         else:
             user.role = form.role.data
+            users_changed(user.id)
             db.session.commit()
             flash(f'نقش کاربر «{user.username}» با موفقیت به‌روزرسانی شد.', 'success')
-    return redirect(url_for('manage_users', page=request.args.get('page', 1, type=int)))
+    return redirect(url_for('manage_users', cursor=request.args.get('cursor')))
 
 @app.route('/admin/terms', methods=['GET', 'POST'])
 @login_required
@@ -212,11 +393,37 @@ def manage_terms():
             Term.query.update({'is_active': False}, synchronize_session=False)
         new_term = Term(name=form.name.data, is_active=form.is_active.data)
         db.session.add(new_term)
+        catalog_changed()
         db.session.commit()
         flash('ترم جدید با موفقیت ایجاد شد.', 'success')
         return redirect(url_for('manage_terms'))
     terms = Term.query.order_by(Term.id.desc()).all()
-    return render_template('manage_terms.html', title='مدیریت ترم‌ها', form=form, terms=terms)
+    return render_template('manage_terms.html', title='مدیریت ترم‌ها', form=form, rollover_form=TermRolloverForm(),
+                           terms=terms, export_formats=exports.FORMATS)
+
+@app.route('/admin/terms/rollover', methods=['POST'])
+@login_required
+def rollover_term():
+    """کپی همه دوره‌ها و پیشنیازهای یک ترم در ترمی جدید."""
+    if current_user.role != 'admin':
+        abort(403)
+    form = TermRolloverForm()
+    if not form.validate_on_submit():
+        for messages in form.errors.values():
+            for message in messages:
+                flash(message, 'danger')
+        return redirect(url_for('manage_terms'))
+    try:
+        mapping = rollover.mapping_from_file(form.mapping_file.data) if form.mapping_file.data else None
+        result = rollover.rollover(form.source.data.id, form.name.data.strip(), mapping, activate=form.activate.data)
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        flash(str(e) if isinstance(e, ValueError) else 'فایل باید با کدگذاری UTF-8 ذخیره شده باشد.', 'danger')
+        return redirect(url_for('manage_terms'))
+    db.session.commit()
+    flash(f'ترم «{result.term.name}» با {result.courses} دوره و {result.prerequisites} پیشنیاز '
+          f'در {result.elapsed:.2f} ثانیه ساخته شد.', 'success')
+    return redirect(url_for('manage_terms'))
 
 @app.route('/term/<int:term_id>/activate', methods=['POST'])
 @login_required
@@ -226,6 +433,7 @@ def activate_term(term_id):
     Term.query.update({'is_active': False}, synchronize_session=False)
     term_to_activate = Term.query.get_or_404(term_id)
     term_to_activate.is_active = True
+    catalog_changed()
     db.session.commit()
     flash(f'ترم «{term_to_activate.name}» با موفقیت فعال شد.', 'success')
     return redirect(url_for('manage_terms'))
@@ -237,20 +445,67 @@ def deactivate_term(term_id):
         abort(403)
     term_to_deactivate = Term.query.get_or_404(term_id)
     term_to_deactivate.is_active = False
+    catalog_changed()
     db.session.commit()
     flash(f'ترم «{term_to_deactivate.name}» با موفقیت غیرفعال شد.', 'warning')
     return redirect(url_for('manage_terms'))
 
+@app.route('/term/<int:term_id>/archive', methods=['POST'])
+@login_required
+def archive_term(term_id):
+    if current_user.role != 'admin':
+        abort(403)
+    term = Term.query.get_or_404(term_id)
+    try:
+        result = retention.archive_terms([term.id])
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('manage_terms'))
+    db.session.commit()
+    flash(f'ترم «{term.name}» با {result.courses} دوره و {result.enrollments} ثبت‌نام بایگانی شد.', 'success')
+    return redirect(url_for('manage_terms'))
+
+@app.route('/term/<int:term_id>/delete', methods=['POST'])
+@login_required
+def delete_term(term_id):
+    if current_user.role != 'admin':
+        abort(403)
+    term = Term.query.get_or_404(term_id)
+    name = term.name
+    try:
+        result = retention.delete_term(term.id)
+    except ValueError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('manage_terms'))
+    db.session.commit()
+    flash(f'ترم «{name}» با {result.courses} دوره و {result.enrollments} ثبت‌نام حذف شد.', 'danger')
+    return redirect(url_for('manage_terms'))
+
+@app.route('/term/<int:term_id>/enrollments.<any(csv, xlsx):fmt>')
+@read_only
+@login_required
+@query_budget(4)
+def export_term_enrollments(term_id, fmt):
+    if current_user.role != 'admin':
+        abort(403)
+    term = Term.query.get_or_404(term_id)
+    return exports.response(exports.term_enrollments(term.id), fmt)
+
 @app.route('/manage/courses')
 @login_required
+@query_budget(3)
 def manage_courses():
     if current_user.role not in ['admin', 'instructor']:
         abort(403)
-    if current_user.role == 'admin':
-        courses = Course.query.order_by(Course.term_id.desc(), Course.title).all()
-    else: # Instructor
-        courses = Course.query.filter_by(instructor_id=current_user.id).order_by(Course.term_id.desc(), Course.title).all()
-    return render_template('manage_courses.html', title='مدیریت دوره‌ها', courses=courses)
+    query = Course.query.options(db.joinedload(Course.instructor), db.joinedload(Course.term))
+    if current_user.role != 'admin': # Instructor
+        query = query.filter_by(instructor_id=current_user.id)
+    pagination = keyset_paginate(
+        query, [(Course.term_id, True), (Course.title, False), (Course.id, False)],
+        key=lambda c: (c.term_id, c.title, c.id), cursor=request.args.get('cursor'), per_page=20)
+    return render_template('manage_courses.html', title='مدیریت دوره‌ها', courses=pagination.items, pagination=pagination)
 
 @app.route('/course/new', methods=['GET', 'POST'])
 @login_required
@@ -270,6 +525,9 @@ def create_course():
             capacity=form.capacity.data)
         new_course.prereqs = form.prereqs.data
         db.session.add(new_course)
+        db.session.flush()
+        prereqs_changed(new_course.id, [prereq.id for prereq in form.prereqs.data])
+        catalog_changed()
         db.session.commit()
         flash('دوره جدید با موفقیت ایجاد شد!', 'success')
         return redirect(url_for('manage_courses'))
@@ -305,6 +563,15 @@ def edit_course(course_id):
     form = CourseForm(obj=course)
 
     if form.validate_on_submit():
+        old_capacity, old_credits, old_term_id = course.capacity, course.credits, course.term_id
+        prereq_ids = [prereq.id for prereq in form.prereqs.data]
+        # The form lists live courses only; links to archived ones stay as they are.
+        prereq_ids += [prereq.id for prereq in course.archived_prereqs]
+        try:
+            check_prereqs(course.id, prereq_ids)
+        except PrereqCycleError:
+            flash('این پیشنیازها یک چرخه ایجاد می‌کنند؛ دوره نمی‌تواند به‌طور مستقیم یا غیرمستقیم پیشنیاز خودش باشد.', 'danger')
+            return render_template('course_form.html', title='ویرایش دوره', form=form, legend=f'ویرایش دوره: {course.title}')
 
         course.title = form.title.data
         course.description = form.description.data
@@ -316,9 +583,16 @@ def edit_course(course_id):
         course.start_time = form.start_time.data
         course.end_time = form.end_time.data
         course.capacity = form.capacity.data
+        prereqs_changed(course.id, prereq_ids)
+        catalog_changed()
+        if course.credits != old_credits or course.term_id != old_term_id:
+            db.session.flush()
+            gpa_stats.rebuild(gpa_stats.graded_students(course.id))
 
 
         db.session.commit()
+        if course.capacity > old_capacity:
+            promotion_worker.notify(course.id)
         flash('دوره با موفقیت به‌روزرسانی شد!', 'success')
         return redirect(url_for('manage_courses'))
 
@@ -334,24 +608,62 @@ def delete_course(course_id):
     course = Course.query.get_or_404(course_id)
     if current_user.role != 'admin':
         abort(403)
-    Enrollment.query.filter_by(course_id=course.id).delete()
-    course.prereqs = []
-    course.is_prereq_for = []
-    db.session.commit()
-    db.session.delete(course)
+    retention.delete_course(course.id)
     db.session.commit()
     flash('دوره و تمام ثبت‌نامی‌های آن با موفقیت حذف شد.', 'danger')
     return redirect(url_for('manage_courses'))
 
 @app.route('/course/<int:course_id>/roster')
 @login_required
+@query_budget(4)
 def course_roster(course_id):
-    course = Course.query.get_or_404(course_id)
+    course = Course.query.options(db.joinedload(Course.instructor)).get_or_404(course_id)
     if current_user.role != 'admin' and course.instructor_id != current_user.id:
         abort(403)
-    enrollments = Enrollment.query.filter_by(course_id=course.id).all()
+    enrollments = Enrollment.query.filter_by(course_id=course.id).options(db.joinedload(Enrollment.student)).all()
     grade_form = GradeForm()
-    return render_template('roster.html', title=f'دانشجویان دوره {course.title}', course=course, enrollments=enrollments, grade_form=grade_form)
+    return render_template('roster.html', title=f'دانشجویان دوره {course.title}', course=course, enrollments=enrollments, grade_form=grade_form, bulk_form=BulkGradeForm(), upload_form=GradeUploadForm(), export_formats=exports.FORMATS)
+
+@app.route('/course/<int:course_id>/roster.<any(csv, xlsx):fmt>')
+@read_only
+@login_required
+@query_budget(4)
+def export_roster(course_id, fmt):
+    course = Course.query.get_or_404(course_id)
+    if current_user.role != 'admin' and course.instructor_id != current_user.id:
+        abort(403)
+    return exports.response(exports.roster(course.id), fmt)
+
+@app.route('/course/<int:course_id>/grades', methods=['POST'])
+@login_required
+def bulk_grade(course_id):
+    """ثبت گروهی نمرات یک دوره از جدول یا فایل CSV در یک تراکنش."""
+    course = Course.query.options(db.joinedload(Course.instructor)).get_or_404(course_id)
+    if current_user.role != 'admin' and course.instructor_id != current_user.id:
+        abort(403)
+    bulk_form, upload_form = BulkGradeForm(), GradeUploadForm()
+    errors = []
+    if upload_form.submit_upload.data and upload_form.validate_on_submit():
+        try:
+            rows = rows_from_csv(upload_form.grades_file.data.stream)
+        except (ValueError, UnicodeDecodeError) as e:
+            rows, errors = [], [('CSV', str(e) if isinstance(e, ValueError) else 'فایل باید با کدگذاری UTF-8 ذخیره شده باشد.')]
+    elif bulk_form.submit_grid.data and bulk_form.validate_on_submit():
+        rows = rows_from_grid(request.form)
+    else:
+        rows = []
+        errors = [(upload_form[field].label.text, message) for field, messages in upload_form.errors.items() for message in messages]
+    if rows:
+        applied, errors = apply_grades(course, rows)
+        if not errors:
+            flash(f'{applied} نمره با موفقیت ثبت شد.', 'success')
+            return redirect(url_for('course_roster', course_id=course.id))
+    if errors:
+        flash('هیچ نمره‌ای ثبت نشد؛ خطاهای زیر را برطرف کنید.', 'danger')
+    else:
+        flash('هیچ نمره‌ای وارد نشده است.', 'warning')
+    enrollments = Enrollment.query.filter_by(course_id=course.id).options(db.joinedload(Enrollment.student)).all()
+    return render_template('roster.html', title=f'دانشجویان دوره {course.title}', course=course, enrollments=enrollments, grade_form=GradeForm(), bulk_form=bulk_form, upload_form=upload_form, bulk_errors=errors, export_formats=exports.FORMATS)
 
 @app.route('/enrollment/<int:enrollment_id>/grade', methods=['POST'])
 @login_required
@@ -362,6 +674,7 @@ def grade_enrollment(enrollment_id):
         abort(403)
     form = GradeForm()
     if form.validate_on_submit():
+        gpa_stats.record_grade(enrollment.user_id, course.term_id, course.credits, enrollment.grade, form.grade.data)
         enrollment.grade = form.grade.data
         enrollment.status = 'completed'
         db.session.commit()
@@ -372,13 +685,53 @@ def grade_enrollment(enrollment_id):
     return redirect(url_for('course_roster', course_id=course.id))
 
 @app.route('/admin/reports')
+@read_only
 @login_required
+@query_budget(10)
 def admin_reports():
     if current_user.role != 'admin':
         abort(403)
-    student_count = User.query.filter_by(role='student').count()
-    instructor_count = User.query.filter_by(role='instructor').count()
-    course_count = Course.query.count()
-    term_count = Term.query.count()
-    popular_courses = db.session.query(Course.title, func.count(Enrollment.id).label('enrollment_count')).join(Enrollment).group_by(Course.id).order_by(desc('enrollment_count')).limit(5).all()
-    return render_template('reports.html', title='گزارشات سیستم', student_count=student_count, instructor_count=instructor_count, course_count=course_count, term_count=term_count, popular_courses=popular_courses)
\ No newline at end of file
+    terms = Term.query.order_by(Term.name.desc()).all()
+    term_id = request.args.get('term_id', type=int)
+    if term_id is None and terms:
+        term_id = next((term.id for term in terms if term.is_active), terms[0].id)
+    report = reports.term_report(term_id) if term_id is not None else None
+    return render_template('reports.html', title='گزارشات سیستم', terms=terms, term_id=term_id, report=report,
+                           grade_bands=reports.GRADE_BANDS, day_labels=dict(DAY_CHOICES), pending=reports.pending(),
+                           **reports.headline_counts())
+
+@app.route('/admin/reports/refresh', methods=['POST'])
+@login_required
+def refresh_reports():
+    if current_user.role != 'admin':
+        abort(403)
+    refreshed = reports.refresh()
+    db.session.commit()
+    flash(f'آمار {refreshed} دوره به‌روزرسانی شد.', 'success')
+    return redirect(url_for('admin_reports', term_id=request.args.get('term_id', type=int)))
+
+@app.route('/admin/metrics')
+@query_budget(2)
+def admin_metrics():
+    """Request metrics of every worker in the Prometheus text format, for admins or a scraper holding METRICS_TOKEN."""
+    token = app.config['METRICS_TOKEN']
+    if not (token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')):
+        if not current_user.is_authenticated:
+            return app.login_manager.unauthorized()
+        if current_user.role != 'admin':
+            abort(403)
+    if metrics.registry is None:
+        abort(404)
+    return app.response_class(metrics.prometheus(*metrics.registry.collect()),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/admin/rankings')
+@read_only
+@login_required
+def admin_rankings():
+    if current_user.role != 'admin':
+        abort(403)
+    term_id = request.args.get('term_id', type=int)
+    terms = Term.query.order_by(Term.name.desc()).all()
+    rankings = gpa_stats.ranking(term_id=term_id)
+    return render_template('rankings.html', title='رتبه‌بندی معدل دانشجویان', rankings=rankings, terms=terms, term_id=term_id)
@@ -0,0 +1,135 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+from app import app, db
+from app.caching import CATALOG_KEY, LRUCache
+from app.forms import DAY_CHOICES
+from app.models import CacheVersion, Course, Enrollment, Term, User
+
+
+class Meeting:
+    """One weekly class on a student's schedule."""
+
+    def __init__(self, course_id, title, credits, start_time, end_time, instructor):
+        self.course_id = course_id
+        self.title = title
+        self.credits = credits
+        self.start_time = start_time
+        self.end_time = end_time
+        self.instructor = instructor
+
+
+class WeekSchedule:
+    """A student's classes in one term, as ``(day, label, meetings)`` for each day of the week in order.
+
+    Meetings within a day are sorted by start time. Built once and shared
+    between the dashboard and the calendar export; treat as read-only.
+    """
+
+    def __init__(self, term_id, term_name, rows):
+        self.term_id = term_id
+        self.term_name = term_name
+        by_day = {day: [] for day, _ in DAY_CHOICES}
+        for course_id, title, credits, day, start_time, end_time, instructor in rows:
+            by_day[day].append(Meeting(course_id, title, credits, start_time, end_time, instructor))
+        self.days = [(day, label, by_day[day]) for day, label in DAY_CHOICES]
+        self.courses = sum(len(meetings) for _, _, meetings in self.days)
+        self.credits = sum(meeting.credits for _, _, meetings in self.days for meeting in meetings)
+
+
+_schedules = LRUCache(app.config['SCHEDULE_CACHE_SIZE'])
+
+
+def _stamp(user_id):
+    """``(term id, term name, stamp)`` of the active term, or ``None``; one query.
+
+    The stamp is the number and the largest id of the student's
+    enrollments, with the catalog version. Enrollment ids are never
+    reused, so any enroll or drop, in this worker or another, changes the
+    first two; course edits and deletes, and instructor renames, bump the
+    catalog version.
+    """
+    row = db.session.query(
+        Term.id, Term.name,
+        db.session.query(func.count(Enrollment.id)).filter(Enrollment.user_id == user_id).scalar_subquery(),
+        db.session.query(func.max(Enrollment.id)).filter(Enrollment.user_id == user_id).scalar_subquery(),
+        db.session.query(CacheVersion.version).filter(CacheVersion.name == CATALOG_KEY).scalar_subquery(),
+    ).filter(Term.is_active).first()
+    if row is None:
+        return None
+    term_id, term_name, *stamp = row
+    return term_id, term_name, tuple(stamp)
+
+
+def week_schedule(user_id):
+    """The student's classes in the active term, from the per-student cache when it is current.
+
+    Entries are keyed by student, term and stamp, so a change makes the
+    old entry unreachable and the LRU drops it in time. A hit costs the
+    one stamp query; a miss adds one query for the student's courses with
+    their instructors. Returns ``None`` when no term is active.
+    """
+    found = _stamp(user_id)
+    if found is None:
+        return None
+    term_id, term_name, stamp = found
+    key = (user_id, term_id, stamp)
+    schedule = _schedules.get(key)
+    if schedule is not None:
+        return schedule
+    rows = db.session.query(
+        Course.id, Course.title, Course.credits, Course.day_of_week, Course.start_time, Course.end_time,
+        User.username).join(Enrollment, Enrollment.course_id == Course.id).outerjoin(
+        User, User.id == Course.instructor_id).filter(
+        Enrollment.user_id == user_id, Course.term_id == term_id).order_by(Course.start_time, Course.title).all()
+    schedule = WeekSchedule(term_id, term_name, rows)
+    _schedules.set(key, schedule)
+    return schedule
+
+
+def _escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Split a content line into pieces of at most 75 octets, as RFC 5545 requires, without splitting a character."""
+    pieces, piece = [], ''
+    for char in line:
+        if len((piece + char).encode('utf-8')) > (75 if not pieces else 74):
+            pieces.append(piece)
+            piece = ''
+        piece += char
+    pieces.append(piece)
+    return '\r\n '.join(pieces)
+
+
+def ics(schedule, today=None):
+    """The schedule as an iCalendar file: one event per class, repeating weekly for ``SCHEDULE_ICS_WEEKS`` weeks.
+
+    Terms carry no dates, so the first occurrences fall in the current
+    week, which starts on Saturday. Times are floating local times.
+    Event UIDs are stable per term and course, so importing a newer export
+    updates the same events.
+    """
+    today = today or date.today()
+    saturday = today - timedelta(days=(today.weekday() - 5) % 7)
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//course-portal//schedule//FA', 'CALSCALE:GREGORIAN',
+             f'X-WR-CALNAME:{_escape(schedule.term_name)}']
+    for offset, (_, _, meetings) in enumerate(schedule.days):
+        day = saturday + timedelta(days=offset)
+        for meeting in meetings:
+            lines += [
+                'BEGIN:VEVENT',
+                f'UID:term{schedule.term_id}-course{meeting.course_id}@course-portal',
+                f'DTSTAMP:{stamp}',
+                f'DTSTART:{datetime.combine(day, meeting.start_time):%Y%m%dT%H%M%S}',
+                f'DTEND:{datetime.combine(day, meeting.end_time):%Y%m%dT%H%M%S}',
+                f'RRULE:FREQ=WEEKLY;COUNT={app.config["SCHEDULE_ICS_WEEKS"]}',
+                f'SUMMARY:{_escape(meeting.title)}',
+                f'DESCRIPTION:{_escape(f"استاد: {meeting.instructor}" if meeting.instructor else "")}',
+                'END:VEVENT',
+            ]
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(line) + '\r\n' for line in lines)
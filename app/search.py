@@ -0,0 +1,139 @@
+import re
+
+from sqlalchemy import column, event, func, select, table, text
+
+from app import db
+from app.models import Course, User
+from app.pagination import keyset_paginate
+
+
+# External-content FTS5 index over course titles and descriptions. Triggers
+# keep it in step with every write to `course`, bulk statements included;
+# the UPDATE trigger only fires for the indexed columns, so the seat counter
+# updates on the enrollment path never touch it. Migration 2d5b8e4f6a17
+# installs the same schema on existing databases.
+SCHEMA = (
+    "CREATE VIRTUAL TABLE course_fts USING fts5("
+    "title, description, content='course', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER course_fts_ai AFTER INSERT ON course BEGIN "
+    "INSERT INTO course_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER course_fts_ad AFTER DELETE ON course BEGIN "
+    "INSERT INTO course_fts (course_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER course_fts_au AFTER UPDATE OF title, description ON course BEGIN "
+    "INSERT INTO course_fts (course_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO course_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+)
+
+course_fts = table('course_fts', column('rowid'), column('rank'))
+
+_TOKEN = re.compile(r'\w+')
+
+
+@event.listens_for(Course.__table__, 'after_create')
+def _create_index(target, connection, **kw):
+    # Lets db.create_all() (benchmarks, scratch databases) build the index too.
+    if connection.dialect.name == 'sqlite':
+        for statement in SCHEMA:
+            connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Course.__table__, 'before_drop')
+def _drop_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS course_fts')
+
+
+def rebuild_index():
+    """Re-read every course into the search index, without committing."""
+    db.session.execute(text("INSERT INTO course_fts (course_fts) VALUES ('rebuild')"))
+
+
+def match_expression(query_text):
+    """Turn free text into an FTS5 query: every word must appear, the last one as a prefix.
+
+    Words are quoted, so operators and punctuation typed by users are never
+    parsed as query syntax. Returns None when there is nothing to search for.
+    """
+    words = _TOKEN.findall(query_text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+class CourseSearch:
+    """Ranked full-text search over one term's courses, with facet filters.
+
+    ``days`` and ``credits`` are collections of allowed values; an empty
+    one means no restriction. ``starts_after``/``ends_before`` bound the
+    class time window. Facet counts for each filter are computed with every
+    other filter applied, so picking a day still shows how many matches
+    the other days have.
+    """
+
+    def __init__(self, term_id, text='', days=(), credits=(), starts_after=None, ends_before=None,
+                 instructor_id=None, free_seats=False):
+        self.term_id = term_id
+        self.match = match_expression(text)
+        self.days = set(days)
+        self.credits = set(credits)
+        self.starts_after = starts_after
+        self.ends_before = ends_before
+        self.instructor_id = instructor_id
+        self.free_seats = free_seats
+
+    def _conditions(self, exclude=None):
+        conditions = [Course.term_id == self.term_id]
+        if self.days and exclude != 'days':
+            conditions.append(Course.day_of_week.in_(self.days))
+        if self.credits and exclude != 'credits':
+            conditions.append(Course.credits.in_(self.credits))
+        if self.instructor_id is not None and exclude != 'instructor':
+            conditions.append(Course.instructor_id == self.instructor_id)
+        if self.free_seats and exclude != 'free_seats':
+            conditions.append(Course.seats_taken < Course.capacity)
+        if self.starts_after is not None:
+            conditions.append(Course.start_time >= self.starts_after)
+        if self.ends_before is not None:
+            conditions.append(Course.end_time <= self.ends_before)
+        return conditions
+
+    def _matches(self):
+        return column('course_fts').op('MATCH')(self.match)
+
+    def _query(self, *entities, exclude=None):
+        query = db.session.query(*entities).filter(*self._conditions(exclude))
+        if self.match is not None:
+            # As a subquery the full-text match runs once. Joined, SQLite may
+            # drive from the course index and re-run the match for every row.
+            query = query.filter(Course.id.in_(select(course_fts.c.rowid).where(self._matches())))
+        return query
+
+    def results(self, cursor=None, per_page=12):
+        """A ``KeysetPage`` of courses, best match first, or by title without search text."""
+        if self.match is None:
+            query = self._query(Course).options(db.joinedload(Course.instructor))
+            return keyset_paginate(query, [(Course.title, False), (Course.id, False)],
+                                   key=lambda c: (c.title, c.id), cursor=cursor, per_page=per_page)
+        rank = course_fts.c.rank
+        query = (db.session.query(Course, rank).select_from(course_fts).join(Course, Course.id == course_fts.c.rowid)
+                 .filter(self._matches(), *self._conditions()).options(db.joinedload(Course.instructor)))
+        page = keyset_paginate(query, [(rank, False), (Course.id, False)],
+                               key=lambda row: (row[1], row[0].id), cursor=cursor, per_page=per_page)
+        page.items = [course for course, _ in page.items]
+        return page
+
+    def facets(self):
+        """Match counts per day, per credit value and per instructor, plus courses with free seats."""
+        days = dict(self._query(Course.day_of_week, func.count(Course.id), exclude='days')
+                    .group_by(Course.day_of_week))
+        credits = sorted(self._query(Course.credits, func.count(Course.id), exclude='credits')
+                         .group_by(Course.credits))
+        instructors = (self._query(User.id, User.username, func.count(Course.id), exclude='instructor')
+                       .join(User, User.id == Course.instructor_id)
+                       .group_by(User.id, User.username).order_by(User.username).all())
+        free_seats = self._query(func.count(Course.id), exclude='free_seats').filter(
+            Course.seats_taken < Course.capacity).scalar()
+        return {'days': days, 'credits': credits, 'instructors': instructors, 'free_seats': free_seats}
@@ -0,0 +1,150 @@
+import random
+from datetime import time
+
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app import gpa as gpa_stats
+from app import reports
+from app.caching import catalog_changed
+from app.forms import DAY_CHOICES
+from app.models import CacheVersion, Course, Enrollment, Term, User, prerequisites
+from app.prereq_graph import VERSION_KEY as PREREQS_KEY
+from app.registration import recount_seats
+
+
+SUBJECTS = ['Mathematics', 'Physics', 'Chemistry', 'Biology', 'Computer Science', 'Statistics',
+            'Economics', 'History', 'Literature', 'Philosophy', 'Psychology', 'Electrical Engineering',
+            'Mechanical Engineering', 'Civil Engineering', 'Architecture', 'Persian Literature']
+TOPICS = ['foundations', 'methods', 'theory', 'laboratory', 'seminar', 'analysis', 'design', 'applications',
+          'modelling', 'systems', 'workshop', 'project']
+SLOTS = [(time(8), time(10)), (time(10), time(12)), (time(13), time(15)), (time(15), time(17)), (time(17), time(19))]
+
+CHUNK = 20000
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(insert(table), rows[start:start + CHUNK])
+
+
+def _grade(rng):
+    return max(0, min(20, round(rng.gauss(14, 3.5))))
+
+
+def seed(terms=8, students=100000, instructors=500, courses=10000, courses_per_term=4, terms_per_student=4,
+         chain_length=3, password='password', random_seed=0):
+    """Fill an empty database with a synthetic university, and commit.
+
+    Terms are named so they sort chronologically; the last one is active and
+    ungraded, the others are graded. Courses are split evenly over the
+    terms and come in chains of ``chain_length`` levels of one subject,
+    each level requiring the previous level from the term before. Every
+    student takes ``courses_per_term`` courses without time clashes in
+    each of ``terms_per_student`` consecutive terms, only courses whose
+    prerequisites they passed, and never more than a course's capacity.
+    Everybody shares one password hash, so seeding does not spend its time
+    hashing. Rows go in with bulk inserts; seat counters, GPA aggregates
+    and planner statistics are rebuilt at the end. Returns row counts.
+    """
+    rng = random.Random(random_seed)
+    password_hash = generate_password_hash(password)
+
+    _insert(User.__table__, [{'username': 'admin', 'email': 'admin@example.com', 'role': 'admin',
+                              'password_hash': password_hash}]
+            + [{'username': f'instructor{i}', 'email': f'instructor{i}@example.com', 'role': 'instructor',
+                'password_hash': password_hash} for i in range(instructors)]
+            + [{'username': f'student{i}', 'email': f'student{i}@example.com', 'role': 'student',
+                'password_hash': password_hash} for i in range(students)])
+    instructor_ids = [uid for (uid,) in db.session.query(User.id).filter_by(role='instructor')]
+    student_ids = [uid for (uid,) in db.session.query(User.id).filter_by(role='student').order_by(User.id)]
+
+    _insert(Term.__table__, [{'name': f'{1396 + t // 2}-{t % 2 + 1}', 'is_active': t == terms - 1}
+                             for t in range(terms)])
+    term_ids = [tid for (tid,) in db.session.query(Term.id).order_by(Term.name)]
+
+    # Expected enrollments per course, to size capacities so that some fill up.
+    per_term = max(1, courses // terms)
+    demand = students * min(terms_per_student, terms) / terms * courses_per_term / per_term
+    slots = [(day, start, end) for day, _ in DAY_CHOICES for start, end in SLOTS]
+
+    offerings = []
+    for t, term_id in enumerate(term_ids):
+        rows = []
+        for i in range(per_term):
+            group, level = divmod(i, chain_length)
+            subject = SUBJECTS[group % len(SUBJECTS)]
+            topic = TOPICS[(group // len(SUBJECTS)) % len(TOPICS)]
+            day, start, end = slots[rng.randrange(len(slots))]
+            rows.append({
+                'title': f'{subject} {level + 1}{group // len(SUBJECTS):02d}',
+                'description': f'{subject} {topic}, level {level + 1}. '
+                               f'{rng.choice(TOPICS).capitalize()} and {rng.choice(TOPICS)} for {subject.lower()} students.',
+                'credits': rng.choice((1, 2, 3, 3, 3, 4)),
+                'day_of_week': day, 'start_time': start, 'end_time': end,
+                'capacity': max(10, int(demand * rng.uniform(0.8, 1.5))),
+                'seats_taken': 0,
+                'instructor_id': rng.choice(instructor_ids), 'term_id': term_id,
+            })
+        _insert(Course.__table__, rows)
+        ids = [cid for (cid,) in db.session.query(Course.id).filter_by(term_id=term_id).order_by(Course.id)]
+        offerings.append([(course_id, (row['day_of_week'], row['start_time']), row['capacity'])
+                          for course_id, row in zip(ids, rows)])
+
+    # Level n of a subject requires level n - 1 from the previous term.
+    prereq_of = {}
+    for t in range(1, terms):
+        for i, (course_id, _, _) in enumerate(offerings[t]):
+            if i % chain_length:
+                prereq_of[course_id] = offerings[t - 1][i - 1][0]
+    _insert(prerequisites, [{'course_id': course_id, 'prerequisite_id': prereq_id}
+                            for course_id, prereq_id in prereq_of.items()])
+
+    followups = {}
+    for course_id, prereq_id in prereq_of.items():
+        followups.setdefault(prereq_id, []).append(course_id)
+    by_id = {offering[0]: (t, offering) for t, term in enumerate(offerings) for offering in term}
+
+    starts = {uid: rng.randrange(max(1, terms - terms_per_student + 1)) for uid in student_ids}
+    passed = {}
+    enrollment_count = 0
+    for t, term_id in enumerate(term_ids):
+        graded = t < terms - 1
+        seats = {}
+        rows = []
+        active = [uid for uid in student_ids if starts[uid] <= t < starts[uid] + terms_per_student]
+        for uid in active:
+            taken, busy = 0, set()
+            done = passed.setdefault(uid, set())
+            # Students carry on with the subjects they passed, then fill up at random.
+            candidates = [by_id[course_id][1] for prereq_id in done for course_id in followups.get(prereq_id, ())
+                          if by_id[course_id][0] == t]
+            candidates += rng.sample(offerings[t], min(len(offerings[t]), courses_per_term * 4))
+            for course_id, slot, capacity in candidates:
+                if slot in busy or seats.get(course_id, 0) >= capacity:
+                    continue
+                required = prereq_of.get(course_id)
+                if required is not None and required not in done:
+                    continue
+                grade = _grade(rng) if graded else None
+                rows.append({'user_id': uid, 'course_id': course_id, 'status': 'enrolled', 'grade': grade})
+                if grade is not None and grade >= 10:
+                    done.add(course_id)
+                seats[course_id] = seats.get(course_id, 0) + 1
+                busy.add(slot)
+                taken += 1
+                if taken == courses_per_term:
+                    break
+        _insert(Enrollment.__table__, rows)
+        enrollment_count += len(rows)
+
+    gpa_stats.rebuild()
+    CacheVersion.bump(PREREQS_KEY)
+    catalog_changed()
+    recount_seats()
+    reports.refresh(full=True)
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return {'terms': terms, 'instructors': instructors, 'students': students,
+            'courses': per_term * terms, 'prerequisites': len(prereq_of), 'enrollments': enrollment_count}
@@ -0,0 +1,144 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def statement_shape(statement):
+    """Normalize a statement so calls that differ only in parameters compare equal."""
+    return _NUMBER.sub('N', _IN_LIST.sub('(?)', ' '.join(statement.split())))
+
+
+class QueryStats:
+    """Queries seen while this collector was active on the current thread."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        """Statement shapes run at least ``threshold`` times: the usual sign of an N+1."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def _collectors():
+    stack = getattr(_local, 'collectors', None)
+    if stack is None:
+        stack = _local.collectors = []
+    return stack
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        conn.info.setdefault('sql_stats_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stack = _collectors()
+    if stack:
+        elapsed = time.perf_counter() - conn.info['sql_stats_start'].pop()
+        for stats in stack:
+            stats.record(statement, elapsed)
+
+
+@contextmanager
+def count_queries():
+    """Collect ``QueryStats`` for everything executed inside the block on this thread."""
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail with ``AssertionError`` if the block runs more than ``limit`` queries.
+
+    Works around test-client calls too, since the request runs on the
+    calling thread::
+
+        with assert_max_queries(4):
+            client.get('/transcript')
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        shapes = '\n'.join(f'  {count}x {shape}' for shape, count in stats.shapes.most_common(5))
+        raise AssertionError(f'{stats.count} queries run, budget is {limit}:\n{shapes}')
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a view may run per request.
+
+    Put it directly above the view function, below ``@app.route`` and
+    ``@login_required``. Count the first request after a start, when the
+    in-process caches (signed-in user, fragments, prerequisite graph) are
+    still empty and have to be filled. Overruns are logged; with
+    ``SQL_STATS_ENFORCE_BUDGETS`` set they fail the request instead.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def init_app(app):
+    @app.before_request
+    def start_request_stats():
+        g.sql_stats = QueryStats()
+        _collectors().append(g.sql_stats)
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        if stats in _collectors():
+            _collectors().remove(stats)
+
+        threshold = app.config['SQL_STATS_REPEAT_THRESHOLD']
+        repeated = stats.repeated(threshold)
+        for shape, count in repeated:
+            logger.warning('possible N+1 on %s: %dx %s', request.endpoint, count, shape)
+        if app.config['SQL_STATS_HEADERS']:
+            response.headers['X-DB-Query-Count'] = str(stats.count)
+            response.headers['X-DB-Time-Ms'] = f'{stats.total_time * 1000:.2f}'
+            response.headers['X-DB-Repeated-Queries'] = str(len(repeated))
+
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and stats.count > budget:
+            message = f'{request.endpoint} ran {stats.count} queries, budget is {budget}'
+            if app.config['SQL_STATS_ENFORCE_BUDGETS']:
+                raise AssertionError(message)
+            logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def drop_request_stats(exc):
+        stats = g.pop('sql_stats', None)
+        if stats is not None and stats in _collectors():
+            _collectors().remove(stats)
@@ -0,0 +1,124 @@
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+READER_BIND = 'reader'
+
+# PRAGMAs applied to every new connection, per SQLITE_PROFILE. 'default'
+# leaves SQLite's own settings alone, bar ALWAYS; SQLITE_PRAGMAS overrides
+# single values.
+PROFILES = {
+    'default': {},
+    'production': {
+        # Readers no longer wait for the writer, nor the writer for readers.
+        'journal_mode': 'WAL',
+        # Safe with WAL: a power loss can only drop the last transactions.
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative values are KiB: 64 MiB of page cache per connection.
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+
+# Applied whatever the profile: deleting a course or a term relies on the
+# ON DELETE CASCADE foreign keys (app/retention.py), which SQLite only
+# enforces when asked to, per connection.
+ALWAYS = {'foreign_keys': 'ON'}
+
+# Settings that change the database file itself are the writer's business.
+_WRITER_ONLY = {'journal_mode', 'synchronous'}
+
+
+def pragmas(config):
+    values = dict(ALWAYS)
+    values.update(PROFILES[config['SQLITE_PROFILE']])
+    values.update(config['SQLITE_PRAGMAS'])
+    return values
+
+
+def _is_sqlite_file(uri):
+    return uri.startswith('sqlite:') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:'
+
+
+def configure(app):
+    """Set engine options for the profile; call before ``SQLAlchemy(app)`` creates the engines.
+
+    With ``SQLITE_READ_WRITE_SPLIT`` the default engine keeps a single
+    connection, so writes queue in the pool instead of contending for
+    SQLite's write lock, and a second ``reader`` bind with its own pool
+    serves views marked ``@read_only``. Explicit ``SQLALCHEMY_*`` settings
+    win over these defaults.
+    """
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if not app.config['SQLITE_READ_WRITE_SPLIT'] or not _is_sqlite_file(uri):
+        return
+    writer = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    writer.setdefault('pool_size', app.config['SQLITE_WRITER_POOL_SIZE'])
+    writer.setdefault('max_overflow', 0)
+    writer.setdefault('pool_timeout', 30)
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    binds.setdefault(READER_BIND, {'url': uri, 'pool_size': app.config['SQLITE_READER_POOL_SIZE'], 'max_overflow': 0})
+
+
+def init_app(app, db):
+    """Apply the profile's PRAGMAs on connect, to the writer and to the reader pool."""
+    values = pragmas(app.config)
+    with app.app_context():
+        engines = db.engines
+    for key, engine in engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        if key == READER_BIND:
+            statements = [f'PRAGMA {name} = {value}' for name, value in values.items() if name not in _WRITER_ONLY]
+            statements.append('PRAGMA query_only = ON')
+        else:
+            statements = [f'PRAGMA {name} = {value}' for name, value in values.items()]
+        if statements:
+            event.listen(engine, 'connect', _pragma_listener(statements))
+
+
+def _pragma_listener(statements):
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+    return apply_pragmas
+
+
+class RoutingSession(Session):
+    """Session that sends the queries of ``@read_only`` views to the reader pool.
+
+    Flushes, and everything outside such views, use the default engine.
+    Without a ``reader`` bind configured it behaves like the stock session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('db_read_only'):
+            reader = self._db.engines.get(READER_BIND)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Serve a view's queries from the reader pool.
+
+    The view should not write. ORM flushes still go to the writer, but
+    statements executed directly land on a ``query_only`` connection and fail.
+
+    Put it directly below ``@app.route``, above ``@login_required``, so the
+    current user is loaded from the reader pool too.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,227 @@
+import heapq
+from itertools import count
+
+from app import db
+from app.forms import DAY_CHOICES
+from app.models import Course, Enrollment, Term
+from app.prereq_graph import archived_passes, course_titles, prereq_graph
+from app.registration import MAX_CART_SIZE
+
+
+# Width of one bit of a week mask. Meetings are widened to whole slots,
+# so times off the 5-minute grid can only make a clash look bigger.
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+MAX_WISHLIST = 40
+MAX_SCHEDULES = 20
+
+# Search nodes visited before giving up on proving the best schedules
+# were found; what was found so far is returned, marked incomplete.
+MAX_NODES = 50000
+
+_DAY_INDEX = {day: index for index, (day, _) in enumerate(DAY_CHOICES)}
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def week_mask(day_of_week, start_time, end_time):
+    """Bitmask of the 5-minute slots of the week a meeting occupies; two meetings clash iff their masks intersect."""
+    first = _seconds(start_time) // (SLOT_MINUTES * 60)
+    last = -(-_seconds(end_time) // (SLOT_MINUTES * 60))
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << (_DAY_INDEX[day_of_week] * SLOTS_PER_DAY + first)
+
+
+class Section:
+    """One course of the active term as the builder sees it: a row plus its week mask."""
+
+    def __init__(self, id, title, credits, day_of_week, start_time, end_time, seats_left):
+        self.id = id
+        self.title = title
+        self.credits = credits
+        self.day_of_week = day_of_week
+        self.start_time = start_time
+        self.end_time = end_time
+        self.seats_left = seats_left
+        self.mask = week_mask(day_of_week, start_time, end_time)
+        self.day_bit = 1 << _DAY_INDEX[day_of_week]
+
+    def to_dict(self):
+        return {'id': self.id, 'title': self.title, 'credits': self.credits, 'day_of_week': self.day_of_week,
+                'start_time': self.start_time, 'end_time': self.end_time, 'seats_left': self.seats_left}
+
+
+class Schedule:
+    """A conflict-free choice of sections, at most one per wished course."""
+
+    def __init__(self, sections, days):
+        self.sections = sorted(sections, key=lambda s: (_DAY_INDEX[s.day_of_week], s.start_time))
+        self.credits = sum(section.credits for section in sections)
+        self.days = days
+
+    def to_dict(self):
+        return {'credits': self.credits, 'days': self.days, 'courses': [s.to_dict() for s in self.sections]}
+
+
+class TimetablePlan:
+    """Best schedules first, the wished sections that cannot be taken at all, and whether the search finished.
+
+    ``rejected`` holds ``(section id, title, message)`` triples with the
+    same messages enrollment would give.
+    """
+
+    def __init__(self, schedules, rejected, complete):
+        self.schedules = schedules
+        self.rejected = rejected
+        self.complete = complete
+
+    def to_dict(self):
+        return {'schedules': [schedule.to_dict() for schedule in self.schedules],
+                'rejected': [{'course_id': course_id, 'title': title, 'message': message}
+                             for course_id, title, message in self.rejected],
+                'complete': self.complete}
+
+
+def search(groups, busy=0, top=5, max_courses=MAX_CART_SIZE, max_nodes=MAX_NODES):
+    """The ``top`` best conflict-free schedules taking at most one section from each group.
+
+    Schedules hold at most ``max_courses`` courses, as many as one cart
+    can enroll, and rank by credits, then number of courses, then fewest
+    days on campus; only maximal ones count, a schedule that still has
+    room for a wished section is not offered. Depth-first over the
+    groups, most credits first, with the week as one integer: a
+    section fits when its mask does not intersect the schedule's. A
+    branch is cut as soon as the best sections that still fit could not
+    beat the worst of the ``top`` schedules already held. Returns
+    ``(schedules, complete)``.
+    """
+    # Most credits first, so strong schedules turn up early and tighten the bound.
+    groups = sorted((sorted(group, key=lambda s: -s.credits) for group in groups if group),
+                    key=lambda group: (-group[0].credits, len(group)))
+    # Best credits and courses the groups from i onwards could still add.
+    credits_left, courses_left = [0] * (len(groups) + 1), [0] * (len(groups) + 1)
+    for i in range(len(groups) - 1, -1, -1):
+        credits_left[i] = credits_left[i + 1] + groups[i][0].credits
+        courses_left[i] = courses_left[i + 1] + 1
+
+    best = []  # min-heap of (score, tiebreak, sections, days)
+    tiebreak = count()
+    nodes = 0
+    chosen, skipped = [], []
+
+    def visit(i, mask, day_bits, credits):
+        nonlocal nodes
+        nodes += 1
+        if nodes > max_nodes:
+            return False
+        days = bin(day_bits).count('1')
+        room = max_courses - len(chosen)
+        if len(best) == top:
+            worst = best[0][0]
+            if (credits + credits_left[i], len(chosen) + min(room, courses_left[i]), -days) <= worst:
+                return True
+            # Tighter: only sections that still fit the week count, as many as
+            # there is room for, and taking one on a new day costs a day.
+            same_day, any_day = [], []
+            for group in groups[i:]:
+                fit = next((s for s in group if not s.mask & mask), None)
+                if fit is not None:
+                    any_day.append(fit.credits)
+                    same = next((s for s in group if not s.mask & mask and s.day_bit & day_bits), None)
+                    if same is not None:
+                        same_day.append(same.credits)
+            same_day = sorted(same_day, reverse=True)[:room]
+            any_day = sorted(any_day, reverse=True)[:room]
+            bound = max((credits + sum(same_day), len(chosen) + len(same_day), -days),
+                        (credits + sum(any_day), len(chosen) + len(any_day), -days - 1))
+            if bound <= worst:
+                return True
+        if i == len(groups) or room == 0:
+            if room and any(not section.mask & mask for group in skipped for section in group):
+                return True
+            entry = ((credits, len(chosen), -days), next(tiebreak), list(chosen), days)
+            if len(best) < top:
+                heapq.heappush(best, entry)
+            elif entry[0] > best[0][0]:
+                heapq.heapreplace(best, entry)
+            return True
+        # Sections on days already taken first: schedules on fewer days rank higher.
+        fitting = [section for section in groups[i] if not section.mask & mask]
+        fitting.sort(key=lambda section: (-section.credits, not section.day_bit & day_bits))
+        for section in fitting:
+            chosen.append(section)
+            finished = visit(i + 1, mask | section.mask, day_bits | section.day_bit, credits + section.credits)
+            chosen.pop()
+            if not finished:
+                return False
+        skipped.append(groups[i])
+        finished = visit(i + 1, mask, day_bits, credits)
+        skipped.pop()
+        return finished
+
+    complete = visit(0, busy, 0, 0) if groups else True
+    ranked = sorted(best, reverse=True)
+    return [Schedule(sections, days) for _, _, sections, days in ranked], complete
+
+
+def build(user_id, course_ids, top=5):
+    """Propose the ``top`` best schedules for a student from a wishlist of active-term courses.
+
+    Courses sharing a title in the active term are sections of the same
+    course; wishing for one offers all of them, and a schedule takes at
+    most one. Sections that are full, need a prerequisite the student has
+    not passed, are already taken, or clash with the student's current
+    enrollments are left out up front and reported in ``rejected``; ids
+    outside the active term are ignored. Reads only; nothing is reserved.
+    """
+    term_id = db.session.query(Term.id).filter_by(is_active=True).scalar()
+    if term_id is None or not course_ids:
+        return TimetablePlan([], [], True)
+
+    wished_titles = db.session.query(Course.title).filter(Course.id.in_(course_ids), Course.term_id == term_id)
+    rows = db.session.query(
+        Course.id, Course.title, Course.credits, Course.day_of_week, Course.start_time, Course.end_time,
+        Course.capacity - Course.seats_taken).filter(
+        Course.term_id == term_id, Course.title.in_(wished_titles.scalar_subquery())).order_by(Course.id)
+
+    enrolled, passed, busy = set(), set(), 0
+    for course_id, title, term, grade, day, start, end in db.session.query(
+            Course.id, Course.title, Course.term_id, Enrollment.grade, Course.day_of_week, Course.start_time,
+            Course.end_time).join(Enrollment, Enrollment.course_id == Course.id).filter(Enrollment.user_id == user_id):
+        if term == term_id:
+            enrolled.add(title)
+            busy |= week_mask(day, start, end)
+        if grade is not None and grade >= 10:
+            passed.add(course_id)
+
+    graph = prereq_graph()
+    rows = rows.all()
+    unpassed = set().union(*(graph.direct_prereqs(row[0]) for row in rows)) - passed
+    if unpassed:
+        passed.update(course_id for _, course_id in archived_passes([user_id], unpassed))
+    groups, rejected, missing = {}, [], {}
+    for row in rows:
+        section = Section(*row)
+        unmet = graph.direct_prereqs(section.id) - passed
+        if section.title in enrolled:
+            rejected.append((section.id, section.title, 'شما قبلاً در این دوره ثبت‌نام کرده‌اید.'))
+        elif section.seats_left is None or section.seats_left <= 0:
+            rejected.append((section.id, section.title, 'ظرفیت این دوره تکمیل است.'))
+        elif unmet:
+            missing[section.id, section.title] = unmet
+        elif section.mask & busy:
+            rejected.append((section.id, section.title, 'تداخل زمانی با دروس ثبت‌نام‌شده.'))
+        else:
+            groups.setdefault(section.title, []).append(section)
+
+    if missing:
+        titles = course_titles(set().union(*missing.values()))
+        for (course_id, title), unmet in missing.items():
+            rejected.append((course_id, title, f'شما باید ابتدا درس پیشنیاز «{min(titles[i] for i in unmet)}» را بگذرانید.'))
+
+    schedules, complete = search(groups.values(), busy=busy, top=top)
+    return TimetablePlan(schedules, sorted(rejected, key=lambda r: (r[1], r[0])), complete)
@@ -0,0 +1,129 @@
+import time
+
+from flask_login import UserMixin
+from sqlalchemy import event
+
+from app import app, db, login
+from app.caching import LRUCache
+from app.models import CacheVersion, User
+
+
+VERSION_KEY = 'users'
+
+# Session.info key of the users to evict once the transaction commits.
+_PENDING = 'user_cache.pending'
+
+
+class CachedUser(UserMixin):
+    """The signed-in user as ``current_user`` sees it on most requests.
+
+    Holds the columns views read on every request, copied from the cache.
+    Anything else, relationships and methods included, loads the ``User``
+    row on first use, so it can stand in for the model when reading.
+    Views that change the account must load and modify the row itself.
+    """
+
+    def __init__(self, id, username, email, role):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self._user = None
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == '_user':
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return getattr(self._user, name)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """Per-process cache of user identities, by id.
+
+    Entries expire after ``USER_CACHE_TTL`` seconds. Writes in this
+    process evict their users at once; to notice writes made by other
+    workers, the ``users`` version stamp is read at most once every
+    ``USER_CACHE_CHECK_INTERVAL`` seconds and the cache is cleared when it
+    moved. That interval bounds how long another worker can serve a stale
+    role.
+    """
+
+    def __init__(self, maxsize, ttl, check_interval):
+        self.entries = LRUCache(maxsize, ttl=ttl)
+        self.check_interval = check_interval
+        self.version = None
+        self.checked_at = None
+        # Bumped by every eviction; a load that saw an eviction while it read the row does not cache it.
+        self.generation = 0
+
+    @property
+    def hits(self):
+        return self.entries.hits
+
+    @property
+    def misses(self):
+        return self.entries.misses
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        version = CacheVersion.current(VERSION_KEY)
+        if self.version is not None and version != self.version:
+            self.entries.clear()
+        self.version = version
+
+    def load(self, user_id):
+        self._check_version()
+        fields = self.entries.get(user_id)
+        if fields is None:
+            generation = self.generation
+            row = db.session.query(User.id, User.username, User.email, User.role).filter_by(id=user_id).first()
+            if row is None:
+                return None
+            fields = tuple(row)
+            if generation == self.generation:
+                self.entries.set(user_id, fields)
+        return CachedUser(*fields)
+
+    def evict(self, user_ids):
+        self.generation += 1
+        for user_id in user_ids:
+            self.entries.pop(user_id)
+
+
+users = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'],
+                  app.config['USER_CACHE_CHECK_INTERVAL'])
+
+
+def users_changed(*user_ids):
+    """Drop cached identities after a change to username, email or role; call before committing.
+
+    Bumps the stamp other workers poll in the same transaction, and evicts
+    the users here once it commits: evicting earlier would let a request
+    in this process cache the old row again before the commit.
+    """
+    CacheVersion.bump(VERSION_KEY)
+    db.session.info.setdefault(_PENDING, set()).update(user_ids)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _evict_committed(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        users.evict(pending)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop(_PENDING, None)
+
+
+@login.user_loader
+def load_user(id):
+    return users.load(int(id))
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import time
+
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from app.forms import NewUserFields
+from app.models import User
+from app.passwords import hash_passwords
+
+
+FIELDS = ('username', 'email', 'password', 'role')
+
+# Rejects flashed after an upload; the command line prints all of them.
+MAX_REJECTS_SHOWN = 20
+
+# Rows checked against the user table per query; each row binds two parameters.
+_LOOKUP_CHUNK = 5000
+
+
+class UserRow:
+    """One account to create: where it came from and its submitted fields."""
+
+    def __init__(self, label, username='', email='', password='', role='student'):
+        self.label = label
+        self.username = username
+        self.email = email
+        self.password = password
+        self.role = role
+
+
+class ImportResult:
+    def __init__(self, created, rejects, elapsed):
+        self.created = created
+        self.rejects = rejects
+        self.elapsed = elapsed
+
+    @property
+    def rows_per_second(self):
+        return (self.created + len(self.rejects)) / self.elapsed if self.elapsed else 0.0
+
+
+def _row(label, values):
+    values = {name: str(values.get(name) or '').strip() for name in FIELDS}
+    return UserRow(label, values['username'], values['email'], values['password'], values['role'] or 'student')
+
+
+def rows_from_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames or not {'username', 'email', 'password'} <= {name.strip() for name in reader.fieldnames}:
+        raise ValueError('فایل باید ستون‌های username، email و password را داشته باشد.')
+    return [_row(f'سطر {line}', row) for line, row in enumerate(reader, start=2)]
+
+
+def rows_from_json(stream):
+    """A JSON array of objects with the same keys as the CSV columns."""
+    data = json.load(io.TextIOWrapper(stream, encoding='utf-8-sig'))
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError('فایل JSON باید آرایه‌ای از اشیاء کاربر باشد.')
+    return [_row(f'مورد {index}', item) for index, item in enumerate(data, start=1)]
+
+
+def rows_from_file(storage):
+    """Parse an uploaded or opened file by its extension."""
+    if storage.filename.lower().endswith('.json'):
+        return rows_from_json(storage.stream)
+    return rows_from_csv(storage.stream)
+
+
+def _validate(row):
+    form = NewUserFields(formdata=MultiDict({name: getattr(row, name) for name in FIELDS}), meta={'csrf': False})
+    if form.validate():
+        return None
+    field, messages = next(iter(form.errors.items()))
+    return f'{form[field].label.text}: {messages[0]}'
+
+
+def _taken(rows):
+    """Usernames and emails of ``rows`` that already exist, one query per chunk of rows."""
+    usernames, emails = set(), set()
+    for start in range(0, len(rows), _LOOKUP_CHUNK):
+        chunk = rows[start:start + _LOOKUP_CHUNK]
+        for username, email in db.session.query(User.username, User.email).filter(or_(
+                User.username.in_([row.username for row in chunk]),
+                User.email.in_([row.email for row in chunk]))):
+            usernames.add(username)
+            emails.add(email)
+    return usernames, emails
+
+
+def import_users(rows, batch_size=1000, workers=None):
+    """Validate, hash and insert new accounts; returns an ``ImportResult``.
+
+    Every row is checked with the same rules as the single-user form, then
+    all usernames and emails are checked against the database and against
+    each other set-wise, instead of two lookups per row. Passwords of the
+    valid rows are hashed in a process pool (``app.passwords``) and the
+    rows are inserted ``batch_size`` at a time, one commit per batch.
+    Rejected rows never stop the others; ``rejects`` lists ``(label,
+    message)`` pairs. A batch that still collides with an account created
+    meanwhile is rejected as a whole.
+    """
+    start = time.perf_counter()
+    rows = list(rows)
+    rejects, valid = [], []
+    for row in rows:
+        error = _validate(row)
+        if error:
+            rejects.append((row, error))
+        else:
+            valid.append(row)
+
+    usernames, emails = _taken(valid)
+    accepted = []
+    for row in valid:
+        if row.username in usernames:
+            rejects.append((row, f'نام کاربری «{row.username}» قبلاً استفاده شده است.'))
+        elif row.email in emails:
+            rejects.append((row, f'ایمیل «{row.email}» قبلاً ثبت شده است.'))
+        else:
+            # Later rows with the same username or email are duplicates of this one.
+            usernames.add(row.username)
+            emails.add(row.email)
+            accepted.append(row)
+
+    hashes = hash_passwords([row.password for row in accepted], workers=workers)
+    created = 0
+    for offset in range(0, len(accepted), batch_size):
+        batch = accepted[offset:offset + batch_size]
+        try:
+            db.session.execute(insert(User), [
+                {'username': row.username, 'email': row.email, 'role': row.role, 'password_hash': password_hash}
+                for row, password_hash in zip(batch, hashes[offset:offset + batch_size])])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            rejects += [(row, 'نام کاربری یا ایمیل یکی از ردیف‌های این دسته هم‌زمان ثبت شد؛ این دسته وارد نشد.')
+                        for row in batch]
+        else:
+            created += len(batch)
+    position = {id(row): index for index, row in enumerate(rows)}
+    rejects.sort(key=lambda reject: position[id(reject[0])])
+    return ImportResult(created, [(row.label, message) for row, message in rejects], time.perf_counter() - start)
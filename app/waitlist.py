@@ -0,0 +1,180 @@
+import logging
+import queue
+import threading
+
+from sqlalchemy import delete, insert, update
+
+from app import app, db
+from app.models import Course, Enrollment, WaitlistEntry
+from app.prereq_graph import archived_passes, prereq_graph
+from app.registration import EnrollmentError
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 200
+
+
+def join_waitlist(user_id, course_id):
+    """Queue a student for a full course and return their 1-based position."""
+    course = db.session.get(Course, course_id)
+    if course is None or not course.term.is_active:
+        raise EnrollmentError('ثبت‌نام برای این ترم بسته است.', 'warning')
+    if course.capacity is not None and course.seats_taken < course.capacity:
+        raise EnrollmentError('این دوره هنوز ظرفیت خالی دارد؛ می‌توانید مستقیماً ثبت‌نام کنید.', 'info')
+    if db.session.query(Enrollment.id).filter_by(user_id=user_id, course_id=course_id).first():
+        raise EnrollmentError('شما قبلاً در این دوره ثبت‌نام کرده‌اید.', 'info')
+    if db.session.query(WaitlistEntry.id).filter_by(user_id=user_id, course_id=course_id).first():
+        raise EnrollmentError('شما قبلاً در صف انتظار این دوره هستید.', 'info')
+    db.session.add(WaitlistEntry(user_id=user_id, course_id=course_id))
+    db.session.commit()
+    return waitlist_position(user_id, course_id)
+
+
+def leave_waitlist(user_id, course_id):
+    deleted = db.session.execute(
+        delete(WaitlistEntry).where(WaitlistEntry.user_id == user_id, WaitlistEntry.course_id == course_id))
+    db.session.commit()
+    return deleted.rowcount > 0
+
+
+def waitlist_position(user_id, course_id):
+    """1-based position of a student in a course's queue, or None if not queued."""
+    entry_id = db.session.query(WaitlistEntry.id).filter_by(user_id=user_id, course_id=course_id).scalar()
+    if entry_id is None:
+        return None
+    return WaitlistEntry.query.filter(WaitlistEntry.course_id == course_id, WaitlistEntry.id <= entry_id).count()
+
+
+def _eligible_entries(course, entries):
+    """Split queued entries into (eligible, stale), re-checking every student in bulk.
+
+    Stale entries belong to students already enrolled in the course and can
+    simply be dropped. Students missing a prerequisite or with a time clash
+    are neither: they keep their place in case that changes.
+    """
+    user_ids = [entry.user_id for entry in entries]
+    enrolled = {user_id for (user_id,) in db.session.query(Enrollment.user_id).filter(
+        Enrollment.course_id == course.id, Enrollment.user_id.in_(user_ids))}
+
+    required = prereq_graph().direct_prereqs(course.id)
+    blocked = set()
+    if required:
+        passed = {}
+        for user_id, course_id in db.session.query(Enrollment.user_id, Enrollment.course_id).filter(
+                Enrollment.user_id.in_(user_ids), Enrollment.course_id.in_(required), Enrollment.grade >= 10):
+            passed.setdefault(user_id, set()).add(course_id)
+        blocked = {user_id for user_id in user_ids if not required <= passed.get(user_id, set())}
+        if blocked:
+            for user_id, course_id in archived_passes(blocked, required):
+                passed.setdefault(user_id, set()).add(course_id)
+            blocked = {user_id for user_id in blocked if not required <= passed.get(user_id, set())}
+
+    clashing = {user_id for (user_id,) in db.session.query(Enrollment.user_id).join(Course).filter(
+        Enrollment.user_id.in_(user_ids),
+        Course.term_id == course.term_id,
+        Course.day_of_week == course.day_of_week,
+        Course.start_time < course.end_time,
+        Course.end_time > course.start_time)}
+
+    eligible, stale = [], []
+    for entry in entries:
+        if entry.user_id in enrolled:
+            stale.append(entry)
+        elif entry.user_id not in blocked and entry.user_id not in clashing:
+            eligible.append(entry)
+    return eligible, stale
+
+
+def promote(course_id):
+    """Move eligible students from the waitlist into free seats, in batches.
+
+    Each batch re-validates prerequisites and time conflicts for the head of
+    the queue with a few set-based queries, takes all the seats it needs
+    with one conditional ``UPDATE`` and commits the new enrollments and the
+    removed queue entries together. Returns the number of students promoted.
+    """
+    promoted = 0
+    last_seen = 0
+    while True:
+        course = db.session.get(Course, course_id, populate_existing=True)
+        if course is None or not course.term.is_active:
+            return promoted
+        if course.capacity is None:
+            # No capacity set means no free seats, as in registration.
+            return promoted
+        free = course.capacity - course.seats_taken
+        if free <= 0:
+            return promoted
+        entries = WaitlistEntry.query.filter(
+            WaitlistEntry.course_id == course_id, WaitlistEntry.id > last_seen
+        ).order_by(WaitlistEntry.id).limit(max(free, BATCH_SIZE)).all()
+        if not entries:
+            return promoted
+
+        eligible, stale = _eligible_entries(course, entries)
+        eligible = eligible[:free]
+        last_seen = eligible[-1].id if len(eligible) == free else entries[-1].id
+        taken = db.session.execute(
+            update(Course)
+            .where(Course.id == course_id, Course.seats_taken + len(eligible) <= Course.capacity)
+            .values(seats_taken=Course.seats_taken + len(eligible))
+            .execution_options(synchronize_session=False))
+        if taken.rowcount == 0:
+            # Someone enrolled directly in between; recompute the free seats.
+            db.session.rollback()
+            last_seen = 0
+            continue
+        if eligible:
+            db.session.execute(insert(Enrollment), [
+                {'user_id': entry.user_id, 'course_id': course_id, 'status': 'enrolled'} for entry in eligible])
+        done = [entry.id for entry in eligible + stale]
+        if done:
+            db.session.execute(delete(WaitlistEntry).where(WaitlistEntry.id.in_(done)))
+        db.session.commit()
+        promoted += len(eligible)
+
+
+class PromotionWorker:
+    """Background thread that drains waitlists when seats are freed.
+
+    Courses are queued with ``notify``; repeated notifications for the same
+    course collapse into one pass. Runs in-process, no broker needed.
+    """
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self, course_id):
+        with self._lock:
+            if course_id in self._pending:
+                return
+            self._pending.add(course_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='waitlist-promotion', daemon=True)
+                self._thread.start()
+        self._queue.put(course_id)
+
+    def join(self):
+        """Block until every queued course has been processed."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            course_id = self._queue.get()
+            with self._lock:
+                self._pending.discard(course_id)
+            try:
+                with self.app.app_context():
+                    promote(course_id)
+            except Exception:
+                logger.exception('waitlist promotion for course %s failed; it will be retried on the next notify', course_id)
+            finally:
+                self._queue.task_done()
+
+
+promotion_worker = PromotionWorker(app)
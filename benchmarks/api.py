@@ -0,0 +1,75 @@
+"""Requests per second of the JSON API next to the HTML pages serving the same data.
+
+Seeds a scratch database with ``app.seed`` (or uses ``--database``) and
+requests each HTML page and its ``/api/v1`` counterpart ``--requests``
+times over random courses and students: a catalog page of the active
+term, course detail, a student's schedule and transcript. The catalog
+is also fetched with only three fields. Prints throughput, p50 latency
+and response size per route.
+
+    python -m benchmarks.api --students 5000 --courses 800 --requests 300
+"""
+import argparse
+import random
+
+from benchmarks.common import percentiles, Timer
+from benchmarks.routes import client_for, prepare
+
+
+def pairs(app, ids, rng):
+    """``(data, route, make_request)`` triples, HTML first; ``make_request`` returns ``(client, url)``."""
+    def course(template):
+        return lambda: (client_for(app), template.format(rng.choice(ids['active_courses'] + ids['graded_courses'])))
+
+    def student(url):
+        return lambda: (client_for(app, rng.choice(ids['enrolled_students'])), url)
+
+    return [
+        ('catalog', 'GET /courses', lambda: (client_for(app), '/courses')),
+        ('catalog', 'GET /api/v1/courses', lambda: (client_for(app), '/api/v1/courses?per_page=6')),
+        ('catalog', 'GET /api/v1/courses?fields',
+         lambda: (client_for(app), '/api/v1/courses?per_page=6&fields=id,title,seats_left')),
+        ('detail', 'GET /course/<id>', course('/course/{}')),
+        ('detail', 'GET /api/v1/courses/<id>', course('/api/v1/courses/{}')),
+        ('schedule', 'GET /my_dashboard', student('/my_dashboard')),
+        ('schedule', 'GET /api/v1/me/schedule', student('/api/v1/me/schedule')),
+        ('transcript', 'GET /transcript', student('/transcript')),
+        ('transcript', 'GET /api/v1/me/transcript', student('/api/v1/me/transcript')),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='benchmark this seeded SQLite file instead of a scratch one')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--courses', type=int, default=800)
+    parser.add_argument('--terms', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=300, help='requests per route')
+    args = parser.parse_args()
+
+    app, path, ids = prepare(args.database, terms=args.terms, students=args.students,
+                             instructors=max(1, args.courses // 20), courses=args.courses)
+    from app import db
+    from app.models import Enrollment
+    with app.app_context():
+        ids['enrolled_students'] = [uid for (uid,) in db.session.query(Enrollment.user_id).distinct().limit(5000)]
+
+    print(f'database: {path}\n')
+    print(f'{"data":<12}{"route":<32}{"req/s":>9}{"p50":>10}{"bytes":>9}')
+    for data, route, make_request in pairs(app, ids, random.Random(0)):
+        # Signing clients in is set-up, not part of the request being measured.
+        requests = [make_request() for _ in range(args.requests)]
+        samples, size = [], 0
+        with Timer() as total:
+            for client, url in requests:
+                with Timer() as t:
+                    response = client.get(url)
+                assert response.status_code == 200, f'{url}: {response.status_code}'
+                samples.append(t.elapsed * 1000)
+                size += len(response.data)
+        print(f'{data:<12}{route:<32}{len(requests) / total.elapsed:>9.0f}{percentiles(samples)["p50"]:>8.2f}ms'
+              f'{size // len(requests):>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""End-of-term grading benchmark: one POST per grade versus one bulk POST.
+
+Enrolls a roster of students in a course, then grades every one of them
+through ``grade_enrollment`` (one request and one commit per student)
+and again through the bulk grid on ``bulk_grade``.
+
+    python -m benchmarks.bulk_grading --students 200
+"""
+import argparse
+import random
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, make_students, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=200)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from sqlalchemy import insert
+    from app.models import Enrollment
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        instructor.set_password('bench')
+        course_id = make_course(db, term, instructor, capacity=args.students).id
+        student_ids = make_students(db, args.students)
+        db.session.execute(insert(Enrollment), [{'user_id': uid, 'course_id': course_id, 'status': 'enrolled'} for uid in student_ids])
+        db.session.commit()
+        enrollment_ids = [eid for (eid,) in db.session.query(Enrollment.id).filter_by(course_id=course_id)]
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench-instructor', 'password': 'bench'})
+
+    with Timer() as single:
+        for enrollment_id in enrollment_ids:
+            response = client.post(f'/enrollment/{enrollment_id}/grade', data={'grade': random.randint(0, 20)})
+            assert response.status_code == 302, response.status_code
+
+    grid = {f'grade-{enrollment_id}': str(random.randint(0, 20)) for enrollment_id in enrollment_ids}
+    grid['submit_grid'] = 'submit'
+    with Timer() as bulk:
+        response = client.post(f'/course/{course_id}/grades', data=grid)
+        assert response.status_code == 302, response.status_code
+
+    print(f'database:        {path}')
+    print(f'one at a time:   {single.elapsed:.3f}s for {len(enrollment_ids)} requests')
+    print(f'bulk grid:       {bulk.elapsed:.3f}s for 1 request ({single.elapsed / bulk.elapsed:.1f}x faster)')
+
+
+if __name__ == '__main__':
+    main()
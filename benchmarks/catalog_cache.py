@@ -0,0 +1,59 @@
+"""Catalog and course detail latency with and without the fragment cache.
+
+Requests the first catalog page and a course detail page as an anonymous
+visitor three ways: with the fragment cache emptied before every request,
+with it warm, and as conditional requests answered with 304.
+
+    python -m benchmarks.catalog_cache --requests 300
+"""
+import argparse
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, percentiles, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app.caching import fragments
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        prereq = make_course(db, term, instructor, title='Bench prerequisite')
+        course = make_course(db, term, instructor, title='Bench course', start=dtime(10), end=dtime(12))
+        course.description = 'A long course description. ' * 40
+        course.prereqs = [prereq]
+        db.session.commit()
+        course_id = course.id
+        for i in range(4):
+            make_course(db, term, instructor, title=f'Bench elective {i}', day='Monday')
+
+    client = app.test_client()
+
+    def run(url, cold=False, conditional=False):
+        etag = client.get(url).headers['ETag']
+        headers = {'If-None-Match': etag} if conditional else {}
+        samples = []
+        for _ in range(args.requests):
+            if cold:
+                fragments.clear()
+            with Timer() as t:
+                response = client.get(url, headers=headers)
+            assert response.status_code == (304 if conditional else 200), response.status_code
+            samples.append(t.elapsed * 1000)
+        return percentiles(samples)
+
+    print(f'database: {path}')
+    print(f'{args.requests} anonymous requests per case\n')
+    print(f'{"page":<16}{"case":<14}{"p50":>9}{"p95":>9}{"p99":>9}')
+    for label, url in [('catalog', '/courses'), ('course detail', f'/course/{course_id}')]:
+        for case, options in [('cold cache', {'cold': True}), ('warm cache', {}), ('304', {'conditional': True})]:
+            stats = run(url, **options)
+            print(f'{label:<16}{case:<14}{stats["p50"]:>7.2f}ms{stats["p95"]:>7.2f}ms{stats["p99"]:>7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
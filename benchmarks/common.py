@@ -0,0 +1,93 @@
+"""Shared helpers for the benchmark scripts.
+
+Every benchmark runs against a throwaway SQLite file so it never touches
+``app.db``; the file goes when the run ends. Import ``scratch_app`` before
+anything from ``app``: the application reads ``DATABASE_URL`` once, at
+import time.
+"""
+import atexit
+import os
+import statistics
+import tempfile
+import time
+from datetime import time as dtime
+
+
+def remove_database(path):
+    """Delete a SQLite file with the -wal and -shm files WAL mode leaves beside it."""
+    for name in (path, path + '-wal', path + '-shm'):
+        try:
+            os.unlink(name)
+        except FileNotFoundError:
+            pass
+
+
+def scratch_app(keep=False):
+    """``(app, db, path)`` on a new, empty database, deleted at exit unless ``keep``."""
+    fd, path = tempfile.mkstemp(prefix='course-portal-bench-', suffix='.db')
+    os.close(fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+
+    from app import app, db
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+    if not keep:
+        atexit.register(_cleanup, app, db, path)
+    return app, db, path
+
+
+def _cleanup(app, db, path):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    remove_database(path)
+
+
+def make_term_and_instructor(db, name='Bench term'):
+    from app.models import Term, User
+    term = Term(name=name, is_active=True)
+    instructor = User(username='bench-instructor', email='bench-instructor@example.com', role='instructor')
+    db.session.add_all([term, instructor])
+    db.session.commit()
+    return term, instructor
+
+
+def make_course(db, term, instructor, title='Bench course', capacity=20,
+                day='Saturday', start=dtime(8, 0), end=dtime(10, 0)):
+    from app.models import Course
+    course = Course(title=title, description=title, credits=3, day_of_week=day,
+                    start_time=start, end_time=end, capacity=capacity,
+                    instructor_id=instructor.id, term_id=term.id)
+    db.session.add(course)
+    db.session.commit()
+    return course
+
+
+def make_students(db, count, prefix='student'):
+    from app.models import User
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'{prefix}{i}', 'email': f'{prefix}{i}@example.com', 'role': 'student'}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [uid for (uid,) in db.session.query(User.id).filter(User.username.like(f'{prefix}%')).order_by(User.id)]
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'mean': statistics.fmean(ordered)}
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,80 @@
+"""Full-text and faceted course search over a large multi-term catalog.
+
+Loads courses spread over several terms (only the last one active),
+then times ``CourseSearch`` result pages and facet counts for a mix of
+text-only, text-plus-facet and facet-only searches in the active term.
+
+    python -m benchmarks.course_search --courses 50000 --terms 10
+"""
+import argparse
+import random
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_term_and_instructor, percentiles, Timer
+
+WORDS = ['database', 'systems', 'algorithms', 'networks', 'compilers', 'calculus', 'physics',
+         'statistics', 'programming', 'design', 'security', 'graphics', 'theory', 'advanced',
+         'introduction', 'laboratory', 'seminar', 'distributed', 'machine', 'learning']
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=50_000)
+    parser.add_argument('--terms', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from sqlalchemy import insert, update
+    from app.models import Course, Term
+    from app.search import CourseSearch
+
+    rng = random.Random(7)
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        db.session.execute(insert(Term), [{'name': f'Old term {i}', 'is_active': False} for i in range(args.terms - 1)])
+        term_ids = [term_id for (term_id,) in db.session.query(Term.id)]
+        rows = []
+        for i in range(args.courses):
+            start = rng.choice([8, 10, 13, 15])
+            rows.append({
+                'title': ' '.join(rng.sample(WORDS, 3)).title(),
+                'description': ' '.join(rng.choices(WORDS, k=30)),
+                'credits': rng.randint(1, 4), 'day_of_week': rng.choice(DAYS),
+                'start_time': dtime(start), 'end_time': dtime(start + 2),
+                'capacity': 30, 'seats_taken': rng.randint(0, 30),
+                'instructor_id': instructor.id, 'term_id': term_ids[i % len(term_ids)]})
+        db.session.execute(insert(Course), rows)
+        db.session.execute(update(Term).values(is_active=False))
+        db.session.execute(update(Term).where(Term.id == term.id).values(is_active=True))
+        db.session.commit()
+
+        cases = [
+            ('text', dict(text='database systems')),
+            ('text prefix', dict(text='distrib')),
+            ('text + facets', dict(text='learning', days=['Monday', 'Tuesday'], credits=[3], free_seats=True)),
+            ('facets only', dict(days=['Saturday'], starts_after=dtime(10), ends_before=dtime(16))),
+            ('no filters', dict()),
+        ]
+        print(f'database: {path}')
+        print(f'{args.courses} courses over {args.terms} terms, {args.repeat} runs per case\n')
+        print(f'{"search":<16}{"matches":>9}{"page p50":>11}{"page p95":>11}{"facets p50":>12}{"facets p95":>12}')
+        for label, filters in cases:
+            search = CourseSearch(term.id, **filters)
+            pages, facets = [], []
+            for _ in range(args.repeat):
+                with Timer() as t:
+                    search.results(per_page=12)
+                pages.append(t.elapsed * 1000)
+                with Timer() as t:
+                    counts = search.facets()
+                facets.append(t.elapsed * 1000)
+            matches = sum(counts['days'].get(day, 0) for day in (filters.get('days') or DAYS))
+            page, facet = percentiles(pages), percentiles(facets)
+            print(f'{label:<16}{matches:>9}{page["p50"]:>9.2f}ms{page["p95"]:>9.2f}ms'
+                  f'{facet["p50"]:>10.2f}ms{facet["p95"]:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
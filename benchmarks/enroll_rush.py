@@ -0,0 +1,59 @@
+"""Registration-rush benchmark for ``reserve_seat``.
+
+Fires many parallel enrollments at a single course and checks that the
+number of enrollments never exceeds its capacity.
+
+    python -m benchmarks.enroll_rush --students 500 --capacity 40 --workers 32
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, make_students, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=500)
+    parser.add_argument('--capacity', type=int, default=40)
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app.models import Course, Enrollment
+    from app.registration import EnrollmentError, reserve_seat
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        course_id = make_course(db, term, instructor, capacity=args.capacity).id
+        student_ids = make_students(db, args.students)
+
+    def attempt(user_id):
+        with app.app_context():
+            try:
+                reserve_seat(user_id, course_id)
+                return 'enrolled'
+            except EnrollmentError:
+                return 'refused'
+            finally:
+                db.session.remove()
+
+    with Timer() as t, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        outcomes = list(pool.map(attempt, student_ids))
+
+    with app.app_context():
+        rows = Enrollment.query.filter_by(course_id=course_id).count()
+        counter = db.session.get(Course, course_id).seats_taken
+
+    enrolled = outcomes.count('enrolled')
+    print(f'database:      {path}')
+    print(f'attempts:      {len(outcomes)} with {args.workers} workers')
+    print(f'enrolled:      {enrolled} (capacity {args.capacity})')
+    print(f'rows/counter:  {rows}/{counter}')
+    print(f'elapsed:       {t.elapsed:.3f}s ({len(outcomes) / t.elapsed:.0f} attempts/s)')
+    if rows > args.capacity or rows != counter or enrolled != rows:
+        raise SystemExit('FAIL: seats were oversold or the counter drifted')
+    print('OK: no oversell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Streaming a whole term's enrollments as CSV or XLSX versus building the file in memory.
+
+Loads ``--rows`` enrollments into one term, then downloads the term export
+through the app. Reports throughput and time to first byte from one pass
+and the peak Python memory, traced with ``tracemalloc``, from a second.
+The baseline loads every enrollment with its student and course the way
+the HTML pages do and writes the CSV into a string before returning it;
+``--no-baseline`` skips it, it is slow and large at a million rows.
+
+    python -m benchmarks.export --rows 1000000 --students 50000
+"""
+import argparse
+import csv
+import io
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, make_students, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--no-baseline', action='store_true')
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app.models import Course, Enrollment, User
+    from benchmarks.routes import client_for
+
+    rng = random.Random(0)
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        admin = User(username='bench-admin', email='bench-admin@example.com', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+        term_id, admin_id = term.id, admin.id
+        students = make_students(db, args.students)
+        courses = [make_course(db, term, instructor, title=f'Course {i}', capacity=len(students)).id
+                   for i in range(-(-args.rows // len(students)))]
+        rows = ({'user_id': students[i % len(students)], 'course_id': courses[i // len(students)],
+                 'status': 'enrolled', 'grade': rng.randint(0, 20)} for i in range(args.rows))
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == 50000:
+                db.session.execute(Enrollment.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(Enrollment.__table__.insert(), batch)
+        db.session.commit()
+
+    client = client_for(app, admin_id)
+
+    def streamed():
+        start = time.perf_counter()
+        response = client.get(f'/term/{term_id}/enrollments.{args.format}', buffered=False)
+        first_byte, size = None, 0
+        for chunk in response.response:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            size += len(chunk)
+        response.close()
+        return size, first_byte
+
+    def loaded():
+        with app.app_context():
+            enrollments = Enrollment.query.join(Course).filter(Course.term_id == term_id).options(
+                db.joinedload(Enrollment.student), db.joinedload(Enrollment.course).joinedload(Course.instructor)).all()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['course_id', 'course', 'instructor', 'username', 'email', 'status', 'grade'])
+            for enrollment in enrollments:
+                course = enrollment.course
+                writer.writerow([course.id, course.title, course.instructor.username, enrollment.student.username,
+                                 enrollment.student.email, enrollment.status, enrollment.grade])
+            data = buffer.getvalue().encode('utf-8')
+        return len(data), None
+
+    print(f'database: {path}')
+    print(f'{args.rows} enrollments, {len(students)} students, {len(courses)} courses, format {args.format}\n')
+    print(f'{"strategy":<12}{"total":>10}{"rows/s":>12}{"first byte":>12}{"size":>10}{"peak memory":>14}')
+    strategies = [('streamed', streamed)] + ([] if args.no_baseline or args.format != 'csv' else [('loaded', loaded)])
+    for name, run in strategies:
+        with Timer() as t:
+            size, first_byte = run()
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        first = f'{first_byte * 1000:.0f}ms' if first_byte is not None else '-'
+        print(f'{name:<12}{t.elapsed:>9.1f}s{args.rows / t.elapsed:>12.0f}{first:>12}'
+              f'{size / 2**20:>8.1f}MB{peak / 2**20:>12.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""OFFSET versus keyset pagination on large course and user tables.
+
+Loads 100k courses into one term and 100k users, then times the first
+page and a page deep into each listing both ways: Flask-SQLAlchemy's
+``paginate()`` (OFFSET plus COUNT(*)) and ``keyset_paginate``.
+
+    python -m benchmarks.keyset_pagination --rows 100000
+"""
+import argparse
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_term_and_instructor, Timer
+
+
+def best_of(fn, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        with Timer() as t:
+            fn()
+        timings.append(t.elapsed)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--per-page', type=int, default=20)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from sqlalchemy import insert
+    from app.models import Course, User
+    from app.pagination import encode_cursor, keyset_paginate
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        db.session.execute(insert(Course), [
+            {'title': f'Course {i * 7919 % args.rows:06d}', 'description': '', 'credits': 3,
+             'day_of_week': 'Saturday', 'start_time': dtime(8), 'end_time': dtime(10),
+             'capacity': 30, 'instructor_id': instructor.id, 'term_id': term.id}
+            for i in range(args.rows)])
+        db.session.execute(insert(User), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'role': 'student'} for i in range(args.rows)])
+        db.session.commit()
+
+        deep_page = args.rows // args.per_page - 1
+        deep_offset = deep_page * args.per_page
+        courses = Course.query.filter_by(term_id=term.id)
+        course_order = [(Course.title, False), (Course.id, False)]
+        boundary = courses.order_by(Course.title, Course.id).offset(deep_offset - 1).first()
+        course_cursor = encode_cursor((boundary.title, boundary.id))
+        user_boundary = User.query.order_by(User.id).offset(deep_offset - 1).first()
+        user_cursor = encode_cursor((user_boundary.id,))
+
+        cases = [
+            ('courses, OFFSET', lambda page: courses.order_by(Course.title, Course.id).paginate(
+                page=page, per_page=args.per_page, error_out=False).items, 1, deep_page + 1),
+            ('courses, keyset', lambda cursor: keyset_paginate(
+                courses, course_order, key=lambda c: (c.title, c.id), cursor=cursor, per_page=args.per_page).items,
+             None, course_cursor),
+            ('users, OFFSET', lambda page: User.query.order_by(User.id).paginate(
+                page=page, per_page=args.per_page, error_out=False).items, 1, deep_page + 1),
+            ('users, keyset', lambda cursor: keyset_paginate(
+                User.query, [(User.id, False)], key=lambda u: (u.id,), cursor=cursor, per_page=args.per_page).items,
+             None, user_cursor),
+        ]
+        print(f'database: {path}')
+        print(f'{args.rows} rows, {args.per_page} per page, deep page = page {deep_page + 1}\n')
+        print(f'{"listing":<18}{"first page":>12}{"deep page":>12}')
+        for label, fetch, first, deep in cases:
+            assert fetch(first) and fetch(deep)
+            print(f'{label:<18}{best_of(lambda: fetch(first)):>10.2f}ms{best_of(lambda: fetch(deep)):>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Logins per second, per core, for each password hash method.
+
+For every method, stores hashes made with it for all bench users and
+fires a storm of login POSTs from ``--concurrency`` threads. Reports
+accepted logins per second in total and per CPU, login latency, how many
+were turned away by the verification pool's admission control (503), and
+catalog latency measured while the storm runs.
+
+    python -m benchmarks.login_throughput --logins 200 --concurrency 16
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, make_students, percentiles, Timer
+
+
+METHODS = ['scrypt', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:100000']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--method', action='append', help=f'hash method to test (repeatable; default {METHODS})')
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from sqlalchemy import update
+    from werkzeug.security import generate_password_hash
+    from app.models import User
+    from app.passwords import verifier
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        make_course(db, term, instructor)
+        make_students(db, args.logins)
+
+    cores = os.cpu_count() or 1
+    print(f'database: {path}')
+    print(f'{args.logins} logins from {args.concurrency} threads, {cores} CPUs\n')
+    print(f'{"method":<24}{"logins/s":>10}{"per core":>10}{"p50":>10}{"p95":>10}{"503s":>6}{"catalog p95":>13}')
+    for method in args.method or METHODS:
+        app.config['PASSWORD_HASH_METHOD'] = method
+        with app.app_context():
+            db.session.execute(update(User).values(password_hash=generate_password_hash('bench', method=method)))
+            db.session.commit()
+
+        rejected_before = verifier.rejected
+        done = threading.Event()
+        catalog = []
+
+        def browse():
+            client = app.test_client()
+            while not done.is_set():
+                with Timer() as t:
+                    client.get('/courses')
+                catalog.append(t.elapsed * 1000)
+
+        def login(i):
+            client = app.test_client()
+            with Timer() as t:
+                response = client.post('/login', data={'username': f'student{i}', 'password': 'bench'})
+            return response.status_code, t.elapsed * 1000
+
+        browser = threading.Thread(target=browse)
+        browser.start()
+        with Timer() as storm, ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(login, range(args.logins)))
+        done.set()
+        browser.join()
+
+        accepted = [elapsed for status, elapsed in results if status == 302]
+        stats = percentiles(accepted)
+        rate = len(accepted) / storm.elapsed
+        print(f'{method:<24}{rate:>10.1f}{rate / cores:>10.1f}{stats["p50"]:>8.1f}ms{stats["p95"]:>8.1f}ms'
+              f'{verifier.rejected - rejected_before:>6}{percentiles(catalog)["p95"]:>11.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Overhead of the request metrics: the recording call alone, and a whole request with and without the middleware.
+
+Times ``Registry.observe`` on one thread and across ``--threads`` threads
+at once, each writing to its own shard, and the middleware around a WSGI
+app that does nothing. Then serves ``--requests`` requests to a view that
+returns a constant, alternately through the metrics middleware and the
+bare Flask app, and reports the difference per request. Ends with the time to render ``/admin/metrics`` once
+``--endpoints`` endpoints have been seen.
+
+    python -m benchmarks.metrics --requests 20000 --threads 8
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import scratch_app, percentiles
+
+
+def observe_ns(registry, calls):
+    from app.metrics import RequestMetrics
+    current = RequestMetrics(None)
+    current.endpoint, current.status, current.queries, current.db_seconds = 'courses', 200, 4, 0.001
+    started = time.perf_counter_ns()
+    for i in range(calls):
+        registry.observe('GET', 0.0125, current)
+    return (time.perf_counter_ns() - started) / calls
+
+
+def middleware_ns(registry, calls):
+    """Per-call cost of the middleware around a WSGI app that does nothing, less that app's own cost."""
+    from app.metrics import MetricsMiddleware
+
+    def noop(environ, start_response):
+        start_response('200 OK', [])
+        return [b'ok']
+
+    environ, start_response = {'REQUEST_METHOD': 'GET'}, lambda status, headers, exc_info=None: None
+    timings = []
+    for app in (noop, MetricsMiddleware(noop, registry)):
+        started = time.perf_counter_ns()
+        for _ in range(calls):
+            app(environ, start_response)
+        timings.append((time.perf_counter_ns() - started) / calls)
+    return timings[1] - timings[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--calls', type=int, default=200000, help='observe calls per thread')
+    parser.add_argument('--endpoints', type=int, default=60)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app import metrics
+
+    registry = metrics.Registry()
+    single = observe_ns(registry, args.calls)
+    threads = [threading.Thread(target=observe_ns, args=(registry, args.calls)) for _ in range(args.threads)]
+    started = time.perf_counter_ns()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    threaded = (time.perf_counter_ns() - started) / (args.calls * args.threads)
+    wrapped = middleware_ns(registry, args.calls)
+
+    app.add_url_rule('/bench-noop', 'bench_noop', lambda: 'ok')
+    measured = app.wsgi_app
+    bare = measured.wsgi_app
+    client = app.test_client()
+    samples = {'with metrics': [], 'without': []}
+    for i in range(args.requests):
+        label = 'with metrics' if i % 2 else 'without'
+        app.wsgi_app = measured if i % 2 else bare
+        started = time.perf_counter_ns()
+        client.get('/bench-noop')
+        samples[label].append((time.perf_counter_ns() - started) / 1000)
+    app.wsgi_app = measured
+
+    current = metrics.RequestMetrics(None)
+    for i in range(args.endpoints):
+        current.endpoint = f'endpoint_{i}'
+        registry.observe('GET', i / 1000, current)
+    started = time.perf_counter()
+    text = metrics.prometheus(*registry.collect())
+    render_ms = (time.perf_counter() - started) * 1000
+
+    print(f'database: {path}')
+    print(f'observe: {single:.0f}ns per call on one thread, '
+          f'{threaded:.0f}ns per call overall with {args.threads} threads at once')
+    print(f'middleware: {wrapped:.0f}ns per request around a WSGI app that does nothing\n')
+    print(f'{"request":<16}{"p50":>10}{"p95":>10}{"p99":>10}')
+    stats = {label: percentiles(values) for label, values in samples.items()}
+    for label, values in stats.items():
+        print(f'{label:<16}{values["p50"]:>8.1f}us{values["p95"]:>8.1f}us{values["p99"]:>8.1f}us')
+    print(f'{"overhead":<16}{stats["with metrics"]["p50"] - stats["without"]["p50"]:>8.1f}us')
+    print(f'\n/admin/metrics body for {args.endpoints + 1} endpoints: {len(text)} bytes in {render_ms:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Retention: retiring old terms by set-based delete and archival versus the old course-by-course delete.
+
+Fills ``--terms`` terms with ``--courses`` courses each, prerequisite
+links to the previous term, and ``--students`` students taking
+``--per-term`` graded courses a term. The oldest term is retired the way
+the admin page used to delete a course, once per course (enrollments,
+waitlist and prerequisite links through the ORM, two commits); the next
+one with ``delete_term``, one cascading DELETE; the rest but the newest
+with ``archive_terms``. Prints the time of each and the size of the hot
+tables before and after.
+
+    python -m benchmarks.retention --terms 6 --courses 300 --students 3000
+"""
+import argparse
+import random
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_students, Timer
+
+
+def orm_delete_term(db, term_id):
+    """Delete a term's courses one at a time, as the course delete route did before cascades."""
+    from app import gpa as gpa_stats
+    from app.caching import catalog_changed
+    from app.models import Course, Enrollment, Term, WaitlistEntry
+    from app.prereq_graph import prereqs_changed
+    for course in Course.query.filter_by(term_id=term_id).all():
+        graded = gpa_stats.graded_students(course.id)
+        Enrollment.query.filter_by(course_id=course.id).delete()
+        gpa_stats.rebuild(graded)
+        WaitlistEntry.query.filter_by(course_id=course.id).delete()
+        course.prereqs = []
+        course.is_prereq_for = []
+        prereqs_changed(course.id, None)
+        catalog_changed()
+        db.session.commit()
+        db.session.delete(course)
+        db.session.commit()
+    db.session.delete(db.session.get(Term, term_id))
+    db.session.commit()
+
+
+def hot_rows(db):
+    from app.models import Course, Enrollment
+    return Course.query.count(), Enrollment.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--terms', type=int, default=6)
+    parser.add_argument('--courses', type=int, default=300, help='courses per term')
+    parser.add_argument('--students', type=int, default=3000)
+    parser.add_argument('--per-term', type=int, default=4, help='graded courses each student takes a term')
+    args = parser.parse_args()
+    if args.terms < 4:
+        # The active term's courses need the term before it, which can be archived but not deleted.
+        parser.error('--terms must be at least 4')
+
+    app, db, path = scratch_app()
+    from app import gpa as gpa_stats
+    from app import retention
+    from app.models import Course, Enrollment, Term, User, prerequisites
+
+    rng = random.Random(0)
+    with app.app_context():
+        instructor = User(username='bench-instructor', email='bench-instructor@example.com', role='instructor')
+        terms = [Term(name=f'Term {i:02d}', is_active=i == args.terms - 1) for i in range(args.terms)]
+        db.session.add_all([instructor, *terms])
+        db.session.commit()
+        students = make_students(db, args.students)
+        previous = []
+        for term in terms:
+            db.session.execute(Course.__table__.insert(), [
+                {'title': f'{term.name} course {i}', 'description': '', 'credits': 3, 'day_of_week': 'Saturday',
+                 'start_time': dtime(8), 'end_time': dtime(10), 'capacity': args.students, 'seats_taken': 0,
+                 'instructor_id': instructor.id, 'term_id': term.id} for i in range(args.courses)])
+            ids = [course_id for course_id, in db.session.query(Course.id).filter_by(term_id=term.id)]
+            if previous:
+                db.session.execute(prerequisites.insert(), [
+                    {'course_id': course_id, 'prerequisite_id': rng.choice(previous)} for course_id in ids])
+            if not term.is_active:
+                db.session.execute(Enrollment.__table__.insert(), [
+                    {'user_id': student, 'course_id': course_id, 'status': 'completed', 'grade': rng.randint(5, 20)}
+                    for student in students for course_id in rng.sample(ids, args.per_term)])
+            previous = ids
+        gpa_stats.rebuild()
+        db.session.commit()
+        before = hot_rows(db)
+
+        with Timer() as one_by_one:
+            orm_delete_term(db, terms[0].id)
+        with Timer() as cascade:
+            result = retention.delete_term(terms[1].id)
+            db.session.commit()
+        with Timer() as archive:
+            archived = retention.archive_terms([term.id for term in terms[2:-1]])
+            db.session.commit()
+        after = hot_rows(db)
+
+    print(f'database: {path}')
+    print(f'{args.terms} terms of {args.courses} courses, {args.students} students\n')
+    print(f'{"method":<20}{"courses":>10}{"seconds":>10}')
+    print(f'{"orm, per course":<20}{args.courses:>10}{one_by_one.elapsed:>10.2f}')
+    print(f'{"delete_term":<20}{result.courses:>10}{cascade.elapsed:>10.2f}')
+    print(f'{"archive_terms":<20}{archived.courses:>10}{archive.elapsed:>10.2f}')
+    print(f'\nhot tables: {before[0]} courses, {before[1]} enrollments before; '
+          f'{after[0]} courses, {after[1]} enrollments after; {archived.prerequisites} prerequisites kept')
+
+
+if __name__ == '__main__':
+    main()
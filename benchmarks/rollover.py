@@ -0,0 +1,90 @@
+"""Term rollover: set-based copy of a term's courses and prerequisites versus one ORM object at a time.
+
+Fills a source term with ``--courses`` courses, each needing up to
+``--prereqs`` earlier courses of the same term, then copies it into a new
+term with ``rollover`` (two ``INSERT ... SELECT`` statements) and with a
+loop that builds every copy as an ORM object and remaps its
+prerequisites in Python, as the admin pages would one course at a time.
+Both copies move every instructor and one time slot.
+
+    python -m benchmarks.rollover --courses 5000 --prereqs 2
+"""
+import argparse
+import random
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_term_and_instructor, Timer
+
+
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+STARTS = [dtime(h) for h in (8, 10, 13, 15, 17)]
+
+
+def orm_copy(db, source, name, instructors, slots):
+    """Copy ``source`` course by course, the way a loop over the ORM would."""
+    from app.models import Course, Term
+    term = Term(name=name, is_active=False)
+    db.session.add(term)
+    copies = {}
+    originals = Course.query.filter_by(term_id=source.id).order_by(Course.id).all()
+    for course in originals:
+        day, start = slots.get((course.day_of_week, course.start_time), (course.day_of_week, course.start_time))
+        copies[course.id] = Course(
+            title=course.title, description=course.description, credits=course.credits, day_of_week=day,
+            start_time=start, end_time=dtime(start.hour + course.end_time.hour - course.start_time.hour),
+            capacity=course.capacity, instructor_id=instructors.get(course.instructor_id, course.instructor_id),
+            term=term)
+        db.session.add(copies[course.id])
+    for course in originals:
+        copies[course.id].prereqs = [copies.get(prereq.id, prereq) for prereq in course.prereqs]
+    db.session.commit()
+    return len(copies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--courses', type=int, default=5000)
+    parser.add_argument('--prereqs', type=int, default=2, help='most prerequisites per course')
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app import rollover
+    from app.models import Course, User, prerequisites
+
+    rng = random.Random(0)
+    with app.app_context():
+        source, instructor = make_term_and_instructor(db)
+        successor = User(username='bench-successor', email='bench-successor@example.com', role='instructor')
+        db.session.add(successor)
+        db.session.flush()
+        rows = []
+        for i in range(args.courses):
+            start = rng.choice(STARTS)
+            rows.append({'title': f'Course {i}', 'description': f'Course {i}', 'credits': 3,
+                         'day_of_week': rng.choice(DAYS), 'start_time': start, 'end_time': dtime(start.hour + 2),
+                         'capacity': 40, 'seats_taken': 0, 'instructor_id': instructor.id, 'term_id': source.id})
+        db.session.execute(Course.__table__.insert(), rows)
+        ids = [course_id for course_id, in db.session.query(Course.id).order_by(Course.id)]
+        links = {(ids[i], prereq) for i in range(1, len(ids))
+                 for prereq in rng.sample(ids[:i], min(i, rng.randint(0, args.prereqs)))}
+        db.session.execute(prerequisites.insert(), [{'course_id': a, 'prerequisite_id': b} for a, b in links])
+        db.session.commit()
+
+        mapping = rollover.RolloverMapping(instructors={'bench-instructor': 'bench-successor'},
+                                           slots={('Saturday', dtime(8)): ('Sunday', dtime(10))})
+        with Timer() as set_based:
+            result = rollover.rollover(source.id, 'Set-based copy', mapping)
+            db.session.commit()
+        with Timer() as one_by_one:
+            copied = orm_copy(db, source, 'ORM copy', {instructor.id: successor.id},
+                              {('Saturday', dtime(8)): ('Sunday', dtime(10))})
+
+    print(f'database: {path}')
+    print(f'{args.courses} courses, {len(links)} prerequisites\n')
+    print(f'{"method":<12}{"courses":>10}{"seconds":>10}{"courses/s":>12}')
+    print(f'{"set-based":<12}{result.courses:>10}{set_based.elapsed:>10.2f}{result.courses / set_based.elapsed:>12.0f}')
+    print(f'{"orm":<12}{copied:>10}{one_by_one.elapsed:>10.2f}{copied / one_by_one.elapsed:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Route-level latency and queries per request over a seeded database.
+
+Seeds a scratch database with ``app.seed`` (or uses the one named by
+``--database``, e.g. filled by ``flask seed``) and drives the test client
+through five scenarios: catalog browsing, an enrollment rush on the active
+term, transcripts, roster grading and the admin reports. Prints p50, p95
+and p99 latency and queries per request for every scenario and route.
+
+    python -m benchmarks.routes --students 5000 --courses 800 --requests 200
+"""
+import argparse
+import os
+import random
+import re
+from collections import defaultdict
+
+from benchmarks.common import percentiles, Timer
+
+
+# The pager's "next" link on a catalog page.
+_NEXT_CURSOR = re.compile(r'href="/courses\?cursor=([^"]+)"[^>]*>بعدی')
+
+
+class Recorder:
+    """Latency and query count samples per ``(scenario, route)``."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+
+    def request(self, scenario, route, call):
+        from app.sql_stats import count_queries
+        with count_queries() as stats, Timer() as t:
+            response = call()
+        assert response.status_code < 500, f'{route}: {response.status_code}'
+        self.samples[scenario, route].append(t.elapsed * 1000)
+        self.queries[scenario, route].append(stats.count)
+        return response
+
+    def report(self):
+        print(f'{"scenario":<13}{"route":<26}{"n":>6}{"p50":>10}{"p95":>10}{"p99":>10}{"queries":>9}{"max":>5}')
+        for (scenario, route), samples in self.samples.items():
+            stats = percentiles(samples)
+            queries = self.queries[scenario, route]
+            print(f'{scenario:<13}{route:<26}{len(samples):>6}'
+                  f'{stats["p50"]:>8.2f}ms{stats["p95"]:>8.2f}ms{stats["p99"]:>8.2f}ms'
+                  f'{sum(queries) / len(queries):>9.1f}{max(queries):>5}')
+
+
+def client_for(app, user_id=None):
+    """A test client signed in as ``user_id`` without going through the login form."""
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+
+def catalog(app, ids, record, rng, requests):
+    client = client_for(app)
+    for _ in range(requests):
+        page = record('GET /courses', lambda: client.get('/courses'))
+        for _ in range(rng.randrange(3)):
+            cursor = _NEXT_CURSOR.search(page.get_data(as_text=True))
+            if cursor is None:
+                break
+            page = record('GET /courses?cursor', lambda: client.get(f'/courses?cursor={cursor.group(1)}'))
+        course_id = rng.choice(ids['active_courses'])
+        record('GET /course/<id>', lambda: client.get(f'/course/{course_id}'))
+        word = rng.choice(['math', 'physics', 'design', 'theory', 'lab', 'systems'])
+        record('GET /courses/search', lambda: client.get('/courses/search', query_string={'q': word}))
+
+
+def enroll_rush(app, ids, record, rng, requests):
+    course_ids = rng.sample(ids['active_courses'], min(5, len(ids['active_courses'])))
+    for student_id in rng.sample(ids['students'], min(requests, len(ids['students']))):
+        client = client_for(app, student_id)
+        course_id = rng.choice(course_ids)
+        record('POST /enroll/<id>', lambda: client.post(f'/enroll/{course_id}'))
+
+
+def transcript(app, ids, record, rng, requests):
+    for student_id in rng.sample(ids['students'], min(requests, len(ids['students']))):
+        client = client_for(app, student_id)
+        record('GET /transcript', lambda: client.get('/transcript'))
+        record('GET /my_dashboard', lambda: client.get('/my_dashboard'))
+
+
+def grading(app, ids, record, rng, requests):
+    from app import db
+    from app.models import Course, Enrollment
+    for course_id in rng.sample(ids['graded_courses'], min(max(1, requests // 10), len(ids['graded_courses']))):
+        with app.app_context():
+            instructor_id = db.session.get(Course, course_id).instructor_id
+            enrollment_ids = [eid for (eid,) in db.session.query(Enrollment.id).filter_by(course_id=course_id)]
+        client = client_for(app, instructor_id)
+        record('GET /course/<id>/roster', lambda: client.get(f'/course/{course_id}/roster'))
+        grid = {f'grade-{eid}': str(rng.randint(0, 20)) for eid in enrollment_ids}
+        grid['submit_grid'] = 'submit'
+        record('POST /course/<id>/grades', lambda: client.post(f'/course/{course_id}/grades', data=grid))
+
+
+def reports(app, ids, record, rng, requests):
+    client = client_for(app, ids['admin'])
+    for _ in range(max(1, requests // 10)):
+        record('GET /admin/dashboard', lambda: client.get('/admin/dashboard'))
+        record('GET /admin/reports', lambda: client.get('/admin/reports'))
+        record('GET /admin/rankings', lambda: client.get('/admin/rankings'))
+
+
+SCENARIOS = {'catalog': catalog, 'enroll_rush': enroll_rush, 'transcript': transcript,
+             'grading': grading, 'reports': reports}
+
+
+def prepare(database=None, **seed_options):
+    """The app on ``database``, or on a scratch one seeded with ``seed_options``, and ids to drive it with.
+
+    Returns ``(app, path, ids)``; ``ids`` holds an admin, every student,
+    the active term's courses and the courses of past terms.
+    """
+    if database:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(database)
+        from app import app, db
+        app.config['WTF_CSRF_ENABLED'] = False
+        path = database
+    else:
+        from benchmarks.common import scratch_app
+        app, db, path = scratch_app()
+    from app.models import Course, Term, User
+    from app.seed import seed
+
+    with app.app_context():
+        if not database:
+            with Timer() as seeding:
+                counts = seed(**seed_options)
+            print('seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+                  + f' in {seeding.elapsed:.1f}s')
+        active = db.session.query(Term.id).filter_by(is_active=True).scalar()
+        ids = {
+            'admin': db.session.query(User.id).filter_by(role='admin').limit(1).scalar(),
+            'students': [uid for (uid,) in db.session.query(User.id).filter_by(role='student')],
+            'active_courses': [cid for (cid,) in db.session.query(Course.id).filter_by(term_id=active)],
+            'graded_courses': [cid for (cid,) in db.session.query(Course.id).filter(Course.term_id != active)],
+        }
+    return app, path, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='benchmark this seeded SQLite file instead of a scratch one')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--courses', type=int, default=800)
+    parser.add_argument('--terms', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='iterations per scenario')
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='run only these (repeatable)')
+    args = parser.parse_args()
+
+    app, path, ids = prepare(args.database, terms=args.terms, students=args.students,
+                             instructors=max(1, args.courses // 20), courses=args.courses)
+    rng = random.Random(0)
+    recorder = Recorder()
+    print(f'database: {path}\n')
+    for name in args.scenario or SCENARIOS:
+        SCENARIOS[name](app, ids, lambda route, call: recorder.request(name, route, call), rng, args.requests)
+    recorder.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Student dashboard and calendar export latency with the weekly schedule cache cold and warm.
+
+Signs in as a student with ``--courses`` classes in the active term and
+``--past`` graded courses in earlier terms, then requests the dashboard
+with the schedule cache emptied before every request, with it warm, and
+the ``.ics`` export built from the warm cache.
+
+    python -m benchmarks.schedule --requests 300 --courses 8 --past 40
+"""
+import argparse
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_students, percentiles, Timer
+
+
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--courses', type=int, default=8, help='classes in the active term')
+    parser.add_argument('--past', type=int, default=40, help='graded courses in earlier terms')
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app import schedule
+    from app.models import Course, Enrollment, Term, User
+
+    with app.app_context():
+        instructor = User(username='bench-instructor', email='bench-instructor@example.com', role='instructor')
+        past, term = Term(name='Past term', is_active=False), Term(name='Bench term', is_active=True)
+        db.session.add_all([instructor, past, term])
+        db.session.commit()
+        student, = make_students(db, 1)
+        for count, on_term in [(args.courses, term), (args.past, past)]:
+            db.session.execute(Course.__table__.insert(), [
+                {'title': f'{on_term.name} course {i}', 'description': '', 'credits': 3, 'day_of_week': DAYS[i % 6],
+                 'start_time': dtime(8 + 2 * (i // 6 % 5)), 'end_time': dtime(10 + 2 * (i // 6 % 5)),
+                 'capacity': 40, 'seats_taken': 1, 'instructor_id': instructor.id, 'term_id': on_term.id}
+                for i in range(count)])
+            db.session.execute(Enrollment.__table__.insert(), [
+                {'user_id': student, 'course_id': course_id, 'status': 'enrolled',
+                 'grade': 15 if on_term is past else None}
+                for course_id, in db.session.query(Course.id).filter_by(term_id=on_term.id)])
+        db.session.commit()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(student)
+        session['_fresh'] = True
+
+    def run(url, cold=False):
+        samples = []
+        for _ in range(args.requests):
+            if cold:
+                schedule._schedules.clear()
+            with Timer() as t:
+                response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            samples.append(t.elapsed * 1000)
+        return percentiles(samples)
+
+    print(f'database: {path}')
+    print(f'{args.courses} classes this term, {args.past} past courses, {args.requests} requests per case\n')
+    print(f'{"page":<16}{"case":<14}{"p50":>9}{"p95":>9}{"p99":>9}')
+    for label, url, case, cold in [('dashboard', '/my_dashboard', 'cold cache', True),
+                                   ('dashboard', '/my_dashboard', 'warm cache', False),
+                                   ('calendar', '/my_dashboard.ics', 'warm cache', False)]:
+        stats = run(url, cold)
+        print(f'{label:<16}{case:<14}{stats["p50"]:>7.2f}ms{stats["p95"]:>7.2f}ms{stats["p99"]:>7.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Mixed read/write throughput under SQLite's defaults and the production profile.
+
+Reader processes browse the catalog and course pages anonymously while
+writer processes, each signed in as a different student, enroll in and
+drop courses in a loop, all against one database file, the way several
+server workers would. Every configuration gets a fresh database and fresh
+processes, since the profile is read when the app is imported.
+
+    python -m benchmarks.sqlite_profile --readers 6 --writers 3 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.common import remove_database
+
+
+CONFIGURATIONS = [
+    ('defaults', {'SQLITE_PROFILE': 'default', 'SQLITE_READ_WRITE_SPLIT': '0'}),
+    ('production', {'SQLITE_PROFILE': 'production', 'SQLITE_READ_WRITE_SPLIT': '0'}),
+    ('production + split', {'SQLITE_PROFILE': 'production', 'SQLITE_READ_WRITE_SPLIT': '1'}),
+]
+COURSES = 24
+
+
+def setup(args):
+    from benchmarks.common import scratch_app, make_term_and_instructor, make_course
+
+    # The parent runs the workers against this file, then deletes it.
+    app, db, path = scratch_app(keep=True)
+    from app.models import User
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        days = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+        for i in range(COURSES):
+            make_course(db, term, instructor, title=f'Bench course {i:02d}', capacity=args.writers + 1, day=days[i % 6])
+        writers = [User(username=f'writer{i}', email=f'writer{i}@example.com', role='student') for i in range(args.writers)]
+        for user in writers:
+            user.set_password('bench')
+        db.session.add_all(writers)
+        db.session.commit()
+    return path
+
+
+def work(args):
+    from app import app
+
+    client = app.test_client()
+    if args.role == 'writer':
+        client.post('/login', data={'username': f'writer{args.index}', 'password': 'bench'})
+    samples, errors = [], 0
+    # Start together: the parent releases everyone once all processes are ready.
+    print('ready', flush=True)
+    sys.stdin.readline()
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        course_id = random.randint(1, COURSES)
+        start = time.perf_counter()
+        if args.role == 'writer':
+            ok = client.post(f'/enroll/{course_id}').status_code == 302
+            ok = client.post(f'/unenroll/{course_id}').status_code == 302 and ok
+        else:
+            ok = client.get('/courses' if random.random() < 0.5 else f'/course/{course_id}').status_code == 200
+        if ok:
+            samples.append((time.perf_counter() - start) * 1000)
+        else:
+            errors += 1
+    return {'samples': samples, 'errors': errors}
+
+
+def run_configuration(args, env):
+    def child(*extra):
+        return [sys.executable, '-m', 'benchmarks.sqlite_profile', '--child', *extra,
+                '--readers', str(args.readers), '--writers', str(args.writers), '--seconds', str(args.seconds)]
+
+    env = {**os.environ, **env}
+    path = subprocess.run(child('setup'), env=env, capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+    env['DATABASE_URL'] = 'sqlite:///' + path
+    procs = [(role, subprocess.Popen(child(role, '--index', str(i)), env=env,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True))
+             for role, count in (('reader', args.readers), ('writer', args.writers)) for i in range(count)]
+    for _, proc in procs:
+        proc.stdout.readline()
+    for _, proc in procs:
+        proc.stdin.write('go\n')
+        proc.stdin.flush()
+    results = {'reader': [], 'writer': [], 'errors': 0}
+    for role, proc in procs:
+        out, _ = proc.communicate()
+        result = json.loads(out.strip().splitlines()[-1])
+        results[role] += result['samples']
+        results['errors'] += result['errors']
+    remove_database(path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=6)
+    parser.add_argument('--writers', type=int, default=3)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--child', choices=['setup', 'reader', 'writer'], dest='role', help=argparse.SUPPRESS)
+    parser.add_argument('--index', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == 'setup':
+        print(setup(args))
+        return
+    if args.role is not None:
+        print(json.dumps(work(args)))
+        return
+
+    from benchmarks.common import percentiles
+
+    print(f'{args.readers} reader and {args.writers} writer processes (enroll + drop), {args.seconds:g}s per configuration\n')
+    print(f'{"configuration":<20}{"reads/s":>9}{"read p95":>11}{"writes/s":>10}{"write p95":>11}{"errors":>8}')
+    for label, env in CONFIGURATIONS:
+        results = run_configuration(args, env)
+        reads, writes = percentiles(results['reader']), percentiles(results['writer'])
+        print(f'{label:<20}{len(results["reader"]) / args.seconds:>9.0f}{reads["p95"]:>9.1f}ms'
+              f'{len(results["writer"]) / args.seconds:>10.1f}{writes["p95"]:>9.1f}ms{results["errors"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
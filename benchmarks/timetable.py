@@ -0,0 +1,110 @@
+"""Timetable builder latency for growing wishlists with many sections each.
+
+Fills the active term with ``--subjects`` courses offered as ``--sections``
+sections each at random weekly slots, then asks the builder for the top
+``--top`` schedules from random wishlists of each size. Reports p50/p95 of
+the bitmask search alone and of the whole ``/api/v1/me/timetable``
+request, how often the search finished within its node budget, and, while
+it stays small enough, the time to enumerate every combination with
+pairwise overlap checks instead.
+
+    python -m benchmarks.timetable --subjects 60 --sections 6 --trials 50
+"""
+import argparse
+import itertools
+import random
+from datetime import time as dtime
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_students, percentiles, Timer
+
+
+DAYS = ['Saturday', 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday']
+STARTS = [dtime(h, m) for h in range(8, 18) for m in (0, 30)]
+
+# Largest number of combinations the pairwise enumeration is timed on.
+NAIVE_LIMIT = 200000
+
+
+def naive(groups):
+    """Every combination of one section or none per course, checked pairwise; returns the best credits."""
+    best = 0
+    for combo in itertools.product(*[[None] + group for group in groups]):
+        chosen = [section for section in combo if section is not None]
+        if all(a.day_of_week != b.day_of_week or a.end_time <= b.start_time or b.end_time <= a.start_time
+               for a, b in itertools.combinations(chosen, 2)):
+            best = max(best, sum(section.credits for section in chosen))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subjects', type=int, default=60)
+    parser.add_argument('--sections', type=int, default=6)
+    parser.add_argument('--sizes', default='4,8,12,16,24', help='wishlist sizes, in courses')
+    parser.add_argument('--trials', type=int, default=50, help='wishlists per size')
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from app import timetable
+    from app.models import Course
+    from benchmarks.routes import client_for
+
+    rng = random.Random(0)
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        rows = []
+        for subject in range(args.subjects):
+            credits, hours = rng.choice([1, 2, 3, 3, 4]), rng.choice([1, 2])
+            for _ in range(args.sections):
+                start = rng.choice(STARTS)
+                rows.append({'title': f'Subject {subject}', 'description': '', 'credits': credits,
+                             'day_of_week': rng.choice(DAYS), 'start_time': start,
+                             'end_time': dtime(start.hour + hours, start.minute), 'capacity': 40, 'seats_taken': 0,
+                             'instructor_id': instructor.id, 'term_id': term.id})
+        db.session.execute(Course.__table__.insert(), rows)
+        db.session.commit()
+        student_id = make_students(db, 1)[0]
+        first_sections = {title: course_id for course_id, title in
+                          db.session.query(Course.id, Course.title).order_by(Course.id.desc())}
+        sections = {}
+        for row in db.session.query(Course.id, Course.title, Course.credits, Course.day_of_week,
+                                    Course.start_time, Course.end_time, Course.capacity - Course.seats_taken):
+            sections.setdefault(row.title, []).append(timetable.Section(*row))
+
+    client = client_for(app, student_id)
+    titles = sorted(sections)
+    print(f'database: {path}')
+    print(f'{args.subjects} courses x {args.sections} sections, top {args.top}, {args.trials} wishlists per size\n')
+    print(f'{"wishlist":>8}{"sections":>10}{"search p50":>12}{"p95":>10}{"request p50":>13}{"p95":>10}'
+          f'{"complete":>10}{"pairwise":>11}')
+    for size in [int(size) for size in args.sizes.split(',')]:
+        searched, requested, complete, pairwise = [], [], 0, []
+        for _ in range(args.trials):
+            wished = rng.sample(titles, min(size, len(titles)))
+            groups = [sections[title] for title in wished]
+            with Timer() as t:
+                _, finished = timetable.search(groups, top=args.top)
+            searched.append(t.elapsed * 1000)
+            complete += finished
+            query = ','.join(str(first_sections[title]) for title in wished)
+            with Timer() as t:
+                response = client.get(f'/api/v1/me/timetable?course_ids={query}&top={args.top}')
+            assert response.status_code == 200, response.get_data(as_text=True)
+            requested.append(t.elapsed * 1000)
+            combinations = 1
+            for group in groups:
+                combinations *= len(group) + 1
+            if combinations <= NAIVE_LIMIT:
+                with Timer() as t:
+                    naive(groups)
+                pairwise.append(t.elapsed * 1000)
+        search_stats, request_stats = percentiles(searched), percentiles(requested)
+        naive_p50 = f'{percentiles(pairwise)["p50"]:.1f}ms' if pairwise else '-'
+        print(f'{size:>8}{size * args.sections:>10}{search_stats["p50"]:>10.2f}ms{search_stats["p95"]:>8.2f}ms'
+              f'{request_stats["p50"]:>11.2f}ms{request_stats["p95"]:>8.2f}ms'
+              f'{complete / args.trials:>9.0%} {naive_p50:>10}')
+
+
+if __name__ == '__main__':
+    main()
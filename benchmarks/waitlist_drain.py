@@ -0,0 +1,75 @@
+"""Waitlist drain benchmark for the promotion worker.
+
+Fills a course and queues as many students on its waitlist, then:
+
+1. drops every enrollment one request at a time, notifying the worker
+   after each drop as ``unenroll`` does, and reports how far the worker
+   lags behind the last drop;
+2. repeats with every seat freed in one transaction and a single
+   notification, which isolates the raw drain rate.
+
+    python -m benchmarks.waitlist_drain --drops 500
+"""
+import argparse
+
+from benchmarks.common import scratch_app, make_term_and_instructor, make_course, make_students, Timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--drops', type=int, default=500)
+    args = parser.parse_args()
+
+    app, db, path = scratch_app()
+    from sqlalchemy import insert
+    from app.models import Course, Enrollment, WaitlistEntry
+    from app.registration import release_seat
+    from app.waitlist import promotion_worker
+
+    with app.app_context():
+        term, instructor = make_term_and_instructor(db)
+        course_id = make_course(db, term, instructor, capacity=args.drops).id
+
+    def fill(round_no):
+        holders = make_students(db, args.drops, prefix=f'r{round_no}-holder')
+        waiting = make_students(db, args.drops, prefix=f'r{round_no}-waiting')
+        db.session.execute(insert(Enrollment), [{'user_id': uid, 'course_id': course_id, 'status': 'enrolled'} for uid in holders])
+        db.session.execute(insert(WaitlistEntry), [{'user_id': uid, 'course_id': course_id} for uid in waiting])
+        db.session.get(Course, course_id).seats_taken = args.drops
+        db.session.commit()
+        return holders, waiting
+
+    def check(waiting):
+        left = WaitlistEntry.query.filter_by(course_id=course_id).count()
+        promoted = Enrollment.query.filter(Enrollment.course_id == course_id, Enrollment.user_id.in_(waiting)).count()
+        if promoted != args.drops or left or db.session.get(Course, course_id).seats_taken != args.drops:
+            raise SystemExit(f'FAIL: the waitlist was not fully drained ({promoted} promoted, {left} left)')
+
+    with app.app_context():
+        holders, waiting = fill(1)
+        with Timer() as burst:
+            for enrollment in Enrollment.query.filter(Enrollment.user_id.in_(holders)).all():
+                release_seat(enrollment)
+                db.session.commit()
+                promotion_worker.notify(course_id)
+        with Timer() as lag:
+            promotion_worker.join()
+        check(waiting)
+
+        holders, waiting = fill(2)
+        db.session.query(Enrollment).filter(Enrollment.course_id == course_id).delete()
+        db.session.get(Course, course_id).seats_taken = 0
+        db.session.commit()
+        with Timer() as drain:
+            promotion_worker.notify(course_id)
+            promotion_worker.join()
+        check(waiting)
+
+    print(f'database:              {path}')
+    print(f'burst of {args.drops} drops:     {burst.elapsed:.3f}s, queue empty {lag.elapsed * 1000:.1f}ms after the last drop')
+    print(f'single-pass drain:     {drain.elapsed * 1000:.1f}ms ({args.drops / drain.elapsed:.0f} promotions/s)')
+    print('OK: waitlist fully drained')
+
+
+if __name__ == '__main__':
+    main()
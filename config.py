@@ -14,4 +14,62 @@ class Config:
                               'sqlite:///' + os.path.join(basedir, 'app.db')
 
 
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+
+    # Per-request SQL instrumentation (app/sql_stats.py).
+    SQL_STATS_HEADERS = os.environ.get('SQL_STATS_HEADERS', '').lower() in ('1', 'true', 'yes')
+    SQL_STATS_REPEAT_THRESHOLD = 5
+    SQL_STATS_ENFORCE_BUDGETS = False
+
+
+    # Entries kept in the rendered course fragment cache (app/caching.py).
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2048))
+
+
+    # Signed-in user identities cached per process (app/user_cache.py).
+    # Other workers' changes show up within USER_CACHE_CHECK_INTERVAL
+    # seconds; entries are reloaded after USER_CACHE_TTL seconds regardless.
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    USER_CACHE_CHECK_INTERVAL = float(os.environ.get('USER_CACHE_CHECK_INTERVAL', 5))
+
+
+    # Students' weekly schedules cached per process (app/schedule.py), and
+    # how many weeks each class repeats in the calendar export.
+    SCHEDULE_CACHE_SIZE = int(os.environ.get('SCHEDULE_CACHE_SIZE', 10000))
+    SCHEDULE_ICS_WEEKS = int(os.environ.get('SCHEDULE_ICS_WEEKS', 16))
+
+
+    # Request metrics served at /admin/metrics (app/metrics.py). With
+    # several worker processes, point METRICS_DIR at a directory they all
+    # share; each writes its totals there every METRICS_FLUSH_INTERVAL
+    # seconds. METRICS_TOKEN lets a scraper in with a bearer token.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+    # SQLite tuning (app/sqlite_profile.py). 'production' turns on WAL,
+    # busy_timeout, synchronous=NORMAL, mmap and a larger page cache;
+    # SQLITE_PRAGMAS overrides single values on top of the profile.
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+    SQLITE_PRAGMAS = {}
+    # Serve @read_only views from a separate pool of query_only connections
+    # and keep the default engine to a single writer connection.
+    SQLITE_READ_WRITE_SPLIT = os.environ.get('SQLITE_READ_WRITE_SPLIT', '').lower() in ('1', 'true', 'yes')
+    SQLITE_WRITER_POOL_SIZE = int(os.environ.get('SQLITE_WRITER_POOL_SIZE', 1))
+    SQLITE_READER_POOL_SIZE = 8
+
+
+    # Password hashing (app/passwords.py). Any Werkzeug method string, e.g.
+    # 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'; stored hashes made with
+    # another method or cost are upgraded when their owner next logs in.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    # Worker processes for hashing passwords in bulk; 0 starts one per CPU.
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    # Threads verifying login passwords (0: one per CPU), and how many more
+    # logins may wait for one before the rest are turned away with a 503.
+    PASSWORD_VERIFY_WORKERS = int(os.environ.get('PASSWORD_VERIFY_WORKERS', 0))
+    PASSWORD_VERIFY_QUEUE = int(os.environ.get('PASSWORD_VERIFY_QUEUE', 16))
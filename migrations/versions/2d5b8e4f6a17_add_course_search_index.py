@@ -0,0 +1,48 @@
+"""Add FTS5 course search index
+
+Revision ID: 2d5b8e4f6a17
+Revises: 9a3c5f1e7b20
+Create Date: 2026-10-18 17:35:02.418276
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2d5b8e4f6a17'
+down_revision = '9a3c5f1e7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same statements as app.search.SCHEMA.
+    op.execute(
+        "CREATE VIRTUAL TABLE course_fts USING fts5("
+        "title, description, content='course', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER course_fts_ai AFTER INSERT ON course BEGIN "
+        "INSERT INTO course_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER course_fts_ad AFTER DELETE ON course BEGIN "
+        "INSERT INTO course_fts (course_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END"
+    )
+    op.execute(
+        "CREATE TRIGGER course_fts_au AFTER UPDATE OF title, description ON course BEGIN "
+        "INSERT INTO course_fts (course_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO course_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END"
+    )
+    # Index the existing courses; `flask rebuild-search-index` does the same later on.
+    op.execute("INSERT INTO course_fts (course_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute('DROP TRIGGER course_fts_au')
+    op.execute('DROP TRIGGER course_fts_ad')
+    op.execute('DROP TRIGGER course_fts_ai')
+    op.execute('DROP TABLE course_fts')
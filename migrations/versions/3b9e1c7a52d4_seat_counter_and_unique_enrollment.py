@@ -0,0 +1,42 @@
+"""Add course seat counter and unique enrollment per student
+
+Revision ID: 3b9e1c7a52d4
+Revises: 67d49fd12745
+Create Date: 2026-10-18 09:12:41.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9e1c7a52d4'
+down_revision = '67d49fd12745'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('seats_taken', sa.Integer(), server_default='0', nullable=False))
+
+    # Duplicate rows would violate the new constraint; keep the oldest one.
+    op.execute(
+        'DELETE FROM enrollment WHERE id NOT IN '
+        '(SELECT MIN(id) FROM enrollment GROUP BY user_id, course_id)'
+    )
+    op.execute(
+        'UPDATE course SET seats_taken = '
+        '(SELECT COUNT(*) FROM enrollment WHERE enrollment.course_id = course.id)'
+    )
+
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_enrollment_user_course', ['user_id', 'course_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_enrollment_user_course', type_='unique')
+
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_column('seats_taken')
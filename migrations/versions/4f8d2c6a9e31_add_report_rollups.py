@@ -0,0 +1,106 @@
+"""Add report rollup tables and the triggers that mark them stale
+
+Revision ID: 4f8d2c6a9e31
+Revises: 71c4e2b9d5a8
+Create Date: 2026-10-18 22:06:51.204718
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f8d2c6a9e31'
+down_revision = '71c4e2b9d5a8'
+branch_labels = None
+depends_on = None
+
+
+def _totals():
+    names = ['enrolled', 'capacity', 'graded', 'passed', 'grade_total', 'drops',
+             'band_0', 'band_1', 'band_2', 'band_3', 'band_4']
+    return [sa.Column(name, sa.Integer(), nullable=False) for name in names]
+
+
+def upgrade():
+    op.create_table('course_rollup',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('instructor_id', sa.Integer(), nullable=True),
+    sa.Column('day_of_week', sa.String(length=20), nullable=True),
+    sa.Column('start_time', sa.Time(), nullable=True),
+    *_totals(),
+    sa.PrimaryKeyConstraint('course_id')
+    )
+    with op.batch_alter_table('course_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_course_rollup_term_enrolled', ['term_id', 'enrolled'], unique=False)
+
+    op.create_table('instructor_rollup',
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('instructor_id', sa.Integer(), nullable=False),
+    sa.Column('courses', sa.Integer(), nullable=False),
+    *_totals(),
+    sa.PrimaryKeyConstraint('term_id', 'instructor_id')
+    )
+    op.create_table('slot_rollup',
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('day_of_week', sa.String(length=20), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('courses', sa.Integer(), nullable=False),
+    *_totals(),
+    sa.PrimaryKeyConstraint('term_id', 'day_of_week', 'start_time')
+    )
+    op.create_table('term_rollup',
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('courses', sa.Integer(), nullable=False),
+    *_totals(),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('term_id')
+    )
+    op.create_table('rollup_stale',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('course_id')
+    )
+
+    # Same statements as app.reports.SCHEMA.
+    op.execute(
+        "CREATE TRIGGER rollup_enrollment_ai AFTER INSERT ON enrollment BEGIN "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.course_id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER rollup_enrollment_ad AFTER DELETE ON enrollment BEGIN "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.course_id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER rollup_enrollment_au AFTER UPDATE OF grade, course_id ON enrollment BEGIN "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.course_id); "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.course_id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER rollup_course_ai AFTER INSERT ON course BEGIN "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER rollup_course_ad AFTER DELETE ON course BEGIN "
+        "INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (old.id); END"
+    )
+    op.execute(
+        "CREATE TRIGGER rollup_course_au AFTER UPDATE OF term_id, instructor_id, capacity, day_of_week, start_time "
+        "ON course BEGIN INSERT OR IGNORE INTO rollup_stale (course_id) VALUES (new.id); END"
+    )
+    # Mark every course stale; `flask refresh-reports` fills the rollups in.
+    op.execute('INSERT INTO rollup_stale (course_id) SELECT id FROM course')
+
+
+def downgrade():
+    for trigger in ('rollup_course_au', 'rollup_course_ad', 'rollup_course_ai',
+                    'rollup_enrollment_au', 'rollup_enrollment_ad', 'rollup_enrollment_ai'):
+        op.execute(f'DROP TRIGGER {trigger}')
+    op.drop_table('rollup_stale')
+    op.drop_table('term_rollup')
+    op.drop_table('slot_rollup')
+    op.drop_table('instructor_rollup')
+    with op.batch_alter_table('course_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_rollup_term_enrolled')
+
+    op.drop_table('course_rollup')
@@ -0,0 +1,67 @@
+"""Add materialized student GPA aggregates
+
+Revision ID: 5e07b3f4d8a1
+Revises: c41d7e9b2a06
+Create Date: 2026-10-18 14:22:19.804112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e07b3f4d8a1'
+down_revision = 'c41d7e9b2a06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('student_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_credits', sa.Integer(), nullable=False),
+    sa.Column('grade_points', sa.Integer(), nullable=False),
+    sa.Column('gpa', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_student_stats_gpa'), ['gpa'], unique=False)
+
+    op.create_table('student_term_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('total_credits', sa.Integer(), nullable=False),
+    sa.Column('grade_points', sa.Integer(), nullable=False),
+    sa.Column('gpa', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['term_id'], ['term.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'term_id')
+    )
+    with op.batch_alter_table('student_term_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_student_term_stats_term_gpa', ['term_id', 'gpa'], unique=False)
+
+    # Backfill from existing grades; `flask rebuild-gpa` does the same later on.
+    op.execute(
+        'INSERT INTO student_term_stats (user_id, term_id, total_credits, grade_points, gpa) '
+        'SELECT e.user_id, c.term_id, SUM(c.credits), SUM(e.grade * c.credits), '
+        'SUM(e.grade * c.credits) * 1.0 / SUM(c.credits) '
+        'FROM enrollment e JOIN course c ON c.id = e.course_id '
+        'WHERE e.grade IS NOT NULL GROUP BY e.user_id, c.term_id'
+    )
+    op.execute(
+        'INSERT INTO student_stats (user_id, total_credits, grade_points, gpa) '
+        'SELECT user_id, SUM(total_credits), SUM(grade_points), SUM(grade_points) * 1.0 / SUM(total_credits) '
+        'FROM student_term_stats GROUP BY user_id'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('student_term_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_student_term_stats_term_gpa')
+
+    op.drop_table('student_term_stats')
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_student_stats_gpa'))
+
+    op.drop_table('student_stats')
@@ -0,0 +1,47 @@
+"""Add indexes for enrollment by course, course by instructor, users by role and reverse prerequisites
+
+Revision ID: 71c4e2b9d5a8
+Revises: e83a1c6d0f42
+Create Date: 2026-10-18 20:14:07.532981
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71c4e2b9d5a8'
+down_revision = 'e83a1c6d0f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.create_index('ix_enrollment_course_user', ['course_id', 'user_id'], unique=False)
+
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.create_index('ix_course_instructor_term_title', ['instructor_id', sa.text('term_id DESC'), 'title', 'id'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_role'), ['role'], unique=False)
+
+    with op.batch_alter_table('prerequisites', schema=None) as batch_op:
+        batch_op.create_index('ix_prerequisites_prerequisite_id', ['prerequisite_id'], unique=False)
+
+    # Give the planner row counts for the new indexes.
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    with op.batch_alter_table('prerequisites', schema=None) as batch_op:
+        batch_op.drop_index('ix_prerequisites_prerequisite_id')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_role'))
+
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_instructor_term_title')
+
+    with op.batch_alter_table('enrollment', schema=None) as batch_op:
+        batch_op.drop_index('ix_enrollment_course_user')
@@ -0,0 +1,28 @@
+"""Add cache version stamps
+
+Revision ID: 8f2a6d0c1e93
+Revises: 3b9e1c7a52d4
+Create Date: 2026-10-18 11:40:07.524816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f2a6d0c1e93'
+down_revision = '3b9e1c7a52d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,26 @@
+"""Add course index for keyset pagination
+
+Revision ID: 9a3c5f1e7b20
+Revises: 5e07b3f4d8a1
+Create Date: 2026-10-18 16:48:33.671920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3c5f1e7b20'
+down_revision = '5e07b3f4d8a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.create_index('ix_course_term_title', [sa.text('term_id DESC'), 'title', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('course', schema=None) as batch_op:
+        batch_op.drop_index('ix_course_term_title')
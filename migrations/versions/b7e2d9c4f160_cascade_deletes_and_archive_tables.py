@@ -0,0 +1,133 @@
+"""Add ON DELETE CASCADE foreign keys and the term archive tables
+
+Revision ID: b7e2d9c4f160
+Revises: 4f8d2c6a9e31
+Create Date: 2026-10-19 09:12:37.518204
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d9c4f160'
+down_revision = '4f8d2c6a9e31'
+branch_labels = None
+depends_on = None
+
+
+# (table, column, referenced table) of every foreign key that cascades.
+CASCADES = [
+    ('course', 'term_id', 'term'),
+    ('enrollment', 'course_id', 'course'),
+    ('waitlist_entry', 'course_id', 'course'),
+    ('prerequisites', 'course_id', 'course'),
+    ('prerequisites', 'prerequisite_id', 'course'),
+    ('student_term_stats', 'term_id', 'term'),
+]
+
+# Archived rows keep their ids, so these never hand out an id twice.
+AUTOINCREMENT = ['course', 'enrollment']
+
+_ROWID = re.compile(r'\bid INTEGER NOT NULL,(.*?)PRIMARY KEY \(id\),\s*', re.DOTALL)
+_ROWID_AUTOINCREMENT = re.compile(r'\bid INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,(.*?)(\s*)(CONSTRAINT |FOREIGN KEY)',
+                                  re.DOTALL)
+
+
+def _foreign_key(column, referenced):
+    return re.compile(rf'(FOREIGN KEY\s*\(\s*"?{column}"?\s*\)\s*REFERENCES\s*"?{referenced}"?\s*\(\s*"?id"?\s*\))'
+                      r'( ON DELETE CASCADE)?', re.IGNORECASE)
+
+
+def _rebuild(table, cascade):
+    """Recreate ``table`` from its own CREATE statement with or without the cascades; rows, indexes and triggers stay.
+
+    SQLite cannot change a foreign key in place, so this is its documented
+    table rebuild. It needs foreign key enforcement off, which
+    migrations/env.py sees to; the triggers on `course` and `enrollment`
+    (search index, report rollups) are dropped with the old table and
+    created again from their stored SQL.
+    """
+    bind = op.get_bind()
+    create = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                          {'name': table}).scalar_one()
+    dependents = [sql for (sql,) in bind.execute(sa.text(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = :name AND type IN ('index', 'trigger') AND sql IS NOT NULL "
+        "ORDER BY type, name"), {'name': table})]
+    for name, column, referenced in CASCADES:
+        if name == table:
+            create, found = _foreign_key(column, referenced).subn(
+                r'\1 ON DELETE CASCADE' if cascade else r'\1', create)
+            if found != 1:
+                raise RuntimeError(f'foreign key {table}.{column} not found in: {create}')
+    if table in AUTOINCREMENT:
+        if cascade:
+            create, found = _ROWID.subn(r'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,\1', create)
+        else:
+            create, found = _ROWID_AUTOINCREMENT.subn(r'id INTEGER NOT NULL,\1\2PRIMARY KEY (id),\2\3', create)
+        if found != 1:
+            raise RuntimeError(f'primary key of {table} not found in: {create}')
+    create = re.sub(rf'^CREATE TABLE "?{table}"?', f'CREATE TABLE _rebuild_{table}', create)
+    op.execute(create)
+    op.execute(f'INSERT INTO _rebuild_{table} SELECT * FROM "{table}"')
+    op.execute(f'DROP TABLE "{table}"')
+    op.execute(f'ALTER TABLE _rebuild_{table} RENAME TO "{table}"')
+    for statement in dependents:
+        op.execute(statement)
+
+
+def upgrade():
+    for table in dict.fromkeys(table for table, _, _ in CASCADES):
+        _rebuild(table, cascade=True)
+
+    op.add_column('term', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_table('archived_course',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('term_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=140), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('credits', sa.Integer(), nullable=False),
+    sa.Column('day_of_week', sa.String(length=20), nullable=False),
+    sa.Column('start_time', sa.Time(), nullable=False),
+    sa.Column('end_time', sa.Time(), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=True),
+    sa.Column('instructor_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['instructor_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['term_id'], ['term.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_course', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_course_term_id'), ['term_id'], unique=False)
+
+    op.create_table('archived_enrollment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('grade', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['course_id'], ['archived_course.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_enrollment', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_enrollment_course_id'), ['course_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_archived_enrollment_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_enrollment', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_enrollment_user_id'))
+        batch_op.drop_index(batch_op.f('ix_archived_enrollment_course_id'))
+
+    op.drop_table('archived_enrollment')
+    with op.batch_alter_table('archived_course', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_course_term_id'))
+
+    op.drop_table('archived_course')
+    with op.batch_alter_table('term', schema=None) as batch_op:
+        batch_op.drop_column('archived_at')
+
+    for table in dict.fromkeys(table for table, _, _ in CASCADES):
+        _rebuild(table, cascade=False)
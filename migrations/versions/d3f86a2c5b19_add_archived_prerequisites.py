@@ -0,0 +1,35 @@
+"""Add archived prerequisite links
+
+Revision ID: d3f86a2c5b19
+Revises: b7e2d9c4f160
+Create Date: 2026-10-20 10:41:08.226913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f86a2c5b19'
+down_revision = 'b7e2d9c4f160'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_prerequisites',
+    sa.Column('course_id', sa.Integer(), nullable=False),
+    sa.Column('prerequisite_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['course_id'], ['course.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['prerequisite_id'], ['archived_course.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('course_id', 'prerequisite_id')
+    )
+    with op.batch_alter_table('archived_prerequisites', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_prerequisites_prerequisite_id', ['prerequisite_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_prerequisites', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_prerequisites_prerequisite_id')
+
+    op.drop_table('archived_prerequisites')
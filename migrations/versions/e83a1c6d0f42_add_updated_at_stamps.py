@@ -0,0 +1,33 @@
+"""Add updated_at to course and cache_version
+
+Revision ID: e83a1c6d0f42
+Revises: 2d5b8e4f6a17
+Create Date: 2026-10-18 18:52:40.115630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e83a1c6d0f42'
+down_revision = '2d5b8e4f6a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Plain ALTER TABLE ADD COLUMN: a batch table rebuild would drop the
+    # course_fts triggers on `course`.
+    op.add_column('course', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('cache_version', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE course SET updated_at = CURRENT_TIMESTAMP')
+    op.execute('UPDATE cache_version SET updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    with op.batch_alter_table('cache_version', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    # SQLite 3.35+ drops the column in place, keeping the course_fts triggers.
+    op.execute('ALTER TABLE course DROP COLUMN updated_at')
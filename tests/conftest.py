@@ -0,0 +1,57 @@
+"""Fixtures for the test suite.
+
+The tests run against a throwaway SQLite file filled by ``app.seed`` with a
+small university, never against ``app.db``. The application reads
+``DATABASE_URL`` once, at import time, so it is set here before anything
+from ``app`` is imported.
+"""
+import os
+import tempfile
+
+import pytest
+
+_fd, DATABASE = tempfile.mkstemp(prefix='course-portal-test-', suffix='.db')
+os.close(_fd)
+os.environ['DATABASE_URL'] = 'sqlite:///' + DATABASE
+
+from flask_login import FlaskLoginClient  # noqa: E402
+
+from app import app as flask_app, db, prereq_graph, schedule, user_cache  # noqa: E402
+from app.caching import fragments  # noqa: E402
+from app.models import User  # noqa: E402
+from app.seed import seed  # noqa: E402
+
+
+def clear_caches():
+    """Empty every in-process cache, so the next request runs as the first one after a start."""
+    fragments.clear()
+    schedule._schedules.clear()
+    prereq_graph._graph = None
+    users = user_cache.users
+    users.entries.clear()
+    users.version = None
+    users.checked_at = None
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SQL_STATS_ENFORCE_BUDGETS=True)
+    flask_app.test_client_class = FlaskLoginClient
+    with flask_app.app_context():
+        db.create_all()
+        seed(terms=4, students=60, instructors=5, courses=24, courses_per_term=2, terms_per_student=2)
+    yield flask_app
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    for name in (DATABASE, DATABASE + '-wal', DATABASE + '-shm'):
+        if os.path.exists(name):
+            os.unlink(name)
+
+
+@pytest.fixture(scope='session')
+def users(app):
+    """One user of each role, by role name."""
+    with app.app_context():
+        return {role: User.query.filter_by(role=role).order_by(User.id).first() for role in
+                ('student', 'instructor', 'admin')}
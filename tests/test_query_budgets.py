@@ -0,0 +1,75 @@
+"""Every view with a ``@query_budget`` stays within it, on a cold start and once caches are warm."""
+import pytest
+from sqlalchemy import func
+
+from app import db
+from app.models import Course, Enrollment, Term
+from app.sql_stats import assert_max_queries
+from tests.conftest import clear_caches
+
+# (endpoint, visitor role, URL arguments); ``None`` arguments come from the seeded data.
+BUDGETED = [
+    ('courses', None, {}),
+    ('courses', 'student', {}),
+    ('course_search', 'student', {'q': 'level'}),
+    ('course_detail', None, {'course_id': None}),
+    ('course_detail', 'student', {'course_id': None}),
+    ('my_dashboard', 'student', {}),
+    ('export_schedule', 'student', {}),
+    ('transcript', 'student', {}),
+    ('export_transcript', 'student', {'fmt': 'csv'}),
+    ('export_term_enrollments', 'admin', {'term_id': None, 'fmt': 'csv'}),
+    ('manage_courses', 'instructor', {}),
+    ('course_roster', 'instructor', {'course_id': None}),
+    ('export_roster', 'instructor', {'course_id': None, 'fmt': 'csv'}),
+    ('admin_reports', 'admin', {}),
+    ('admin_metrics', 'admin', {}),
+    ('api.courses', 'student', {}),
+    ('api.course_detail', 'student', {'course_id': None}),
+    ('api.schedule', 'student', {}),
+    ('api.transcript', 'student', {}),
+    ('api.plan_timetable', 'student', {'course_ids': None}),
+]
+
+
+@pytest.fixture(scope='module')
+def samples(app, users):
+    """Ids the budgeted URLs need: one of the instructor's courses, the active term, the student's wishlist."""
+    with app.app_context():
+        term_id = db.session.query(Term.id).filter_by(is_active=True).scalar()
+        course_id = db.session.query(func.min(Course.id)).filter_by(instructor_id=users['instructor'].id).scalar()
+        wishlist = [course_id for (course_id,) in db.session.query(Course.id).filter_by(term_id=term_id).outerjoin(
+            Enrollment, (Enrollment.course_id == Course.id) & (Enrollment.user_id == users['student'].id)).filter(
+            Enrollment.id.is_(None)).order_by(Course.id).limit(4)]
+    return {'course_id': course_id, 'term_id': term_id, 'course_ids': ','.join(map(str, wishlist))}
+
+
+def _get(app, users, samples, endpoint, role, arguments):
+    """Request the URL and read the whole body, so streamed exports run their queries here too."""
+    user = users[role] if role is not None else None
+    client = app.test_client(user=user) if user is not None else app.test_client()
+    values = {name: samples[name] if value is None else value for name, value in arguments.items()}
+    with app.test_request_context():
+        url = app.url_for(endpoint, **values)
+    response = client.get(url)
+    response.get_data()
+    response.close()
+    return response
+
+
+def test_every_budgeted_view_is_covered(app):
+    covered = {endpoint for endpoint, _, _ in BUDGETED}
+    budgeted = {endpoint for endpoint, view in app.view_functions.items() if hasattr(view, 'query_budget')}
+    assert budgeted == covered
+
+
+@pytest.mark.parametrize('endpoint, role, arguments', BUDGETED, ids=lambda value: value if isinstance(value, str) else '')
+def test_query_budget(app, users, samples, endpoint, role, arguments):
+    budget = app.view_functions[endpoint].query_budget
+    clear_caches()
+    with assert_max_queries(budget):
+        cold = _get(app, users, samples, endpoint, role, arguments)
+    assert cold.status_code < 500
+    with assert_max_queries(budget):
+        warm = _get(app, users, samples, endpoint, role, arguments)
+    assert warm.status_code == cold.status_code
@@ -0,0 +1,21 @@
+"""No query a page runs reads a large table without an index (``flask explain-queries --strict``)."""
+import pytest
+
+from app import query_plans
+
+
+@pytest.fixture(scope='module')
+def plans(app):
+    with app.app_context():
+        return query_plans.collect_plans()
+
+
+def test_pages_are_explained(plans):
+    explained = set().union(*(plan.endpoints for plan in plans.values()))
+    assert {'courses', 'course_detail', 'transcript', 'course_roster', 'admin_reports', 'api.courses'} <= explained
+
+
+def test_no_full_table_scans(plans):
+    scans = [f'{", ".join(plan.full_scans)} in {", ".join(sorted(plan.endpoints))}:\n  {plan.statement}'
+             for plan in plans.values() if plan.full_scans]
+    assert not scans, '\n'.join(scans)